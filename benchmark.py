@@ -0,0 +1,303 @@
+"""Headless benchmark harness for the delivery agent's search algorithms.
+
+Generates seeded maps over a grid of parameters (size, terrain mix, obstacle
+density, maze structure, dynamic obstacle count), runs every requested
+planner on the same start/goal queries and records wall time, nodes
+expanded, peak memory and path cost to CSV. --queues bucket heap runs UCS
+and A* on both open lists to measure the bucket queue's speedup. Comparison plots use the
+pandas/matplotlib from requirements.txt, and a previous CSV can be passed as
+a baseline to flag timing regressions. --batch times BatchPlanner on the same
+maps with each given number of workers.
+
+Example:
+    python benchmark.py --sizes 50 100 200 --densities 0 0.2 --maze --plot plots
+"""
+import argparse
+import csv
+import itertools
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+from deliveryagent import ALGORITHMS, BATCH_ALGORITHMS, BatchPlanner, DeliveryAgent, FleetPlanner, Grid, Terrain
+
+TERRAIN_MIXES: Dict[str, Dict[Terrain, float]] = {
+    'uniform': {Terrain.ROAD: 1.0},
+    'roads': {Terrain.ROAD: 0.8, Terrain.GRASS: 0.15, Terrain.WATER: 0.05},
+    'mixed': {Terrain.ROAD: 0.4, Terrain.GRASS: 0.3, Terrain.WATER: 0.2, Terrain.MOUNTAIN: 0.1},
+}
+
+FIELDS = ['size', 'terrain', 'density', 'maze', 'dynamic', 'seed', 'algorithm', 'queue', 'query',
+          'found', 'cost', 'path_length', 'nodes_expanded', 'seconds', 'peak_bytes', 'bound']
+
+FLEET_FIELDS = ['size', 'terrain', 'density', 'maze', 'dynamic', 'seed', 'agents', 'window', 'agent',
+                'found', 'cost', 'path_length', 'nodes_expanded', 'seconds', 'rounds', 'conflicts']
+
+def generate_map(size: int, terrain: str = 'mixed', density: float = 0.0, maze: bool = False,
+                 dynamic: int = 0, seed: int = 0) -> Grid:
+    """Build a seeded size x size map.
+
+    maze carves a random depth-first maze between the even cells and walls
+    off everything it did not carve; density then adds scattered obstacles
+    on top; dynamic adds obstacles patrolling back and forth along an axis.
+    """
+    rng = random.Random(seed)
+    grid = Grid(size, size)
+    terrains, weights = zip(*TERRAIN_MIXES[terrain].items())
+    for y in range(size):
+        for x in range(size):
+            grid.set_terrain(x, y, rng.choices(terrains, weights)[0])
+
+    if maze:
+        stack = [(0, 0)]
+        passages = {(0, 0)}
+        while stack:
+            x, y = stack[-1]
+            options = [(x + dx, y + dy, dx, dy) for dx, dy in ((2, 0), (-2, 0), (0, 2), (0, -2))
+                       if 0 <= x + dx < size and 0 <= y + dy < size and (x + dx, y + dy) not in passages]
+            if not options:
+                stack.pop()
+                continue
+            nx, ny, dx, dy = rng.choice(options)
+            passages.update(((x + dx // 2, y + dy // 2), (nx, ny)))
+            stack.append((nx, ny))
+        for y in range(size):
+            for x in range(size):
+                if (x, y) not in passages:
+                    grid.set_obstacle(x, y)
+
+    for y in range(size):
+        for x in range(size):
+            if rng.random() < density:
+                grid.set_obstacle(x, y)
+
+    for _ in range(dynamic):
+        length = rng.randint(1, 4)
+        dx, dy = rng.choice(((1, 0), (0, 1)))
+        pattern = [(dx, dy)] * length + [(-dx, -dy)] * length
+        grid.add_dynamic_obstacle(rng.randrange(size), rng.randrange(size), pattern)
+    return grid
+
+def pick_queries(grid: Grid, count: int, seed: int) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+    """Seeded (start, goal) pairs drawn from open cells"""
+    rng = random.Random(seed)
+    open_cells = [(x, y) for y in range(grid.height) for x in range(grid.width)
+                  if grid.is_valid_position(x, y)]
+    if len(open_cells) < 2:
+        return []
+    return [tuple(rng.sample(open_cells, 2)) for _ in range(count)]
+
+def run_scenario(size: int, terrain: str, density: float, maze: bool, dynamic: int, seed: int,
+                 algorithms: List[str], queries: int, measure_memory: bool,
+                 deadline: Optional[float] = None, node_budget: Optional[int] = None,
+                 queues: List[str] = ('bucket',)) -> List[Dict]:
+    rows = []
+    for algorithm, queue in itertools.product(algorithms, queues):
+        # Every algorithm gets its own copy of the map and the same queries
+        grid = generate_map(size, terrain, density, maze, dynamic, seed)
+        agent = DeliveryAgent(grid)
+        agent.deadline, agent.node_budget = deadline, node_budget
+        agent.bucket_queue = queue == 'bucket'
+        random.seed(seed)
+        for query, (start, goal) in enumerate(pick_queries(grid, queries, seed)):
+            if measure_memory:
+                tracemalloc.start()
+            started = time.perf_counter()
+            path = agent.plan_route(start, goal, algorithm)
+            seconds = time.perf_counter() - started
+            peak = ''
+            if measure_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            if algorithm == 'spacetime':
+                cost = agent.calculate_timed_path_cost(path) if path else ''
+            else:
+                cost = agent.calculate_path_cost(path) if path else ''
+            rows.append({
+                'size': size, 'terrain': terrain, 'density': density, 'maze': int(maze),
+                'dynamic': dynamic, 'seed': seed, 'algorithm': algorithm, 'queue': queue, 'query': query,
+                'found': int(bool(path)), 'cost': cost, 'path_length': len(path) if path else '',
+                'nodes_expanded': agent.nodes_expanded, 'seconds': f"{seconds:.6f}", 'peak_bytes': peak,
+                'bound': agent.suboptimality_bound if algorithm in ('weighted', 'anytime') else '',
+            })
+            if grid.obstacle_x:
+                grid.update_dynamic_obstacles()
+    return rows
+
+def run_fleet_scenario(size: int, terrain: str, density: float, maze: bool, dynamic: int, seed: int,
+                       agents: int, window: Optional[int]) -> List[Dict]:
+    """Cooperatively plan a fleet of agents with distinct starts and goals"""
+    grid = generate_map(size, terrain, density, maze, dynamic, seed)
+    rng = random.Random(seed)
+    open_cells = [(x, y) for y in range(grid.height) for x in range(grid.width)
+                  if grid.is_valid_position(x, y)]
+    agents = min(agents, len(open_cells) // 2)
+    cells = rng.sample(open_cells, 2 * agents)
+    deliveries = list(zip(cells[:agents], cells[agents:]))
+    plan = FleetPlanner(grid, window).plan(deliveries)
+    agent = DeliveryAgent(grid)
+    rows = []
+    for agent_id, path in enumerate(plan.paths):
+        rows.append({
+            'size': size, 'terrain': terrain, 'density': density, 'maze': int(maze),
+            'dynamic': dynamic, 'seed': seed, 'agents': agents, 'window': window or '', 'agent': agent_id,
+            'found': int(bool(path)), 'cost': agent.calculate_timed_path_cost(path) if path else '',
+            'path_length': len(path) if path else '', 'nodes_expanded': plan.nodes_expanded[agent_id],
+            'seconds': f"{plan.seconds[agent_id]:.6f}", 'rounds': plan.rounds, 'conflicts': len(plan.conflicts),
+        })
+    return rows
+
+def run_batch_scenario(size: int, terrain: str, density: float, maze: bool, seed: int,
+                       workers: int, deliveries: int, algorithm: str) -> Tuple[float, int]:
+    """Seconds BatchPlanner takes to plan a batch of deliveries, and how many it routed"""
+    grid = generate_map(size, terrain, density, maze, 0, seed)
+    batch = pick_queries(grid, deliveries, seed)
+    with BatchPlanner(grid, workers) as planner:
+        started = time.perf_counter()
+        results = planner.plan(batch, algorithm)
+        seconds = time.perf_counter() - started
+    return seconds, sum(1 for result in results if result.path)
+
+def write_csv(rows: List[Dict], path: str, fields: List[str] = FIELDS):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def compare_to_baseline(rows: List[Dict], baseline_path: str, tolerance: float) -> List[str]:
+    """Scenario/algorithm pairs whose median time grew by more than tolerance"""
+    def medians(records) -> Dict[Tuple, float]:
+        groups: Dict[Tuple, List[float]] = {}
+        for row in records:
+            key = tuple(str(row[field]) for field in ('size', 'terrain', 'density', 'maze',
+                                                     'dynamic', 'seed', 'algorithm'))
+            # CSVs from before the queue column were all heap-based
+            key += (row.get('queue') or 'heap',)
+            groups.setdefault(key, []).append(float(row['seconds']))
+        return {key: statistics.median(times) for key, times in groups.items()}
+
+    with open(baseline_path, newline='') as f:
+        baseline = medians(csv.DictReader(f))
+    regressions = []
+    for key, current in medians(rows).items():
+        before = baseline.get(key)
+        if before and current > before * (1 + tolerance):
+            regressions.append(f"{'/'.join(key)}: {before:.6f}s -> {current:.6f}s")
+    return regressions
+
+def plot_results(csv_path: str, out_dir: str):
+    """Per-algorithm time, nodes-expanded and memory plots against map size"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
+    os.makedirs(out_dir, exist_ok=True)
+    df = pd.read_csv(csv_path)
+    if 'queue' in df and df['queue'].nunique() > 1:
+        df['algorithm'] = df['algorithm'] + '/' + df['queue']
+    for metric in ('seconds', 'nodes_expanded', 'peak_bytes'):
+        if df[metric].isna().all():
+            continue
+        for (terrain, density, maze, dynamic), group in df.groupby(['terrain', 'density', 'maze', 'dynamic']):
+            table = group.groupby(['size', 'algorithm'])[metric].median().unstack()
+            ax = table.plot(marker='o', logy=True, title=f"{metric}: {terrain}, density {density}, "
+                                                           f"maze {maze}, dynamic {dynamic}")
+            ax.set_xlabel('map size')
+            ax.set_ylabel(f"median {metric}")
+            name = f"{metric}_{terrain}_d{density}_m{maze}_n{dynamic}.png"
+            ax.figure.savefig(os.path.join(out_dir, name), bbox_inches='tight')
+            plt.close(ax.figure)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the delivery agent's search algorithms")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[25, 50, 100])
+    parser.add_argument('--terrain', nargs='+', default=['uniform', 'mixed'], choices=sorted(TERRAIN_MIXES))
+    parser.add_argument('--densities', type=float, nargs='+', default=[0.0, 0.2])
+    parser.add_argument('--maze', action='store_true', help="also run maze variants of every map")
+    parser.add_argument('--dynamic', type=int, nargs='+', default=[0], help="dynamic obstacle counts")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0])
+    parser.add_argument('--algorithms', nargs='+', default=['bfs', 'ucs', 'astar', 'replan'],
+                        choices=ALGORITHMS)
+    parser.add_argument('--queries', type=int, default=5, help="start/goal pairs per map")
+    parser.add_argument('--queues', nargs='+', default=['bucket'], choices=['bucket', 'heap'],
+                        help="open lists to run UCS and A* with; bucket falls back to heap where it cannot apply")
+    parser.add_argument('--deadline', type=float, help="seconds the anytime planner may spend per query")
+    parser.add_argument('--node-budget', type=int, help="expansions the anytime planner may spend per query")
+    parser.add_argument('--memory', action='store_true',
+                        help="record peak memory with tracemalloc (slows every search)")
+    parser.add_argument('--out', default='benchmark_results.csv')
+    parser.add_argument('--plot', metavar='DIR', help="write comparison plots to DIR")
+    parser.add_argument('--baseline', help="earlier CSV to check for timing regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed relative slowdown against the baseline")
+    parser.add_argument('--fleet', type=int, nargs='+', metavar='AGENTS',
+                        help="also plan fleets of these sizes cooperatively on every map")
+    parser.add_argument('--window', type=int, help="reservation window for fleet planning")
+    parser.add_argument('--fleet-out', default='fleet_results.csv')
+    parser.add_argument('--batch', type=int, nargs='+', metavar='WORKERS',
+                        help="also time BatchPlanner on every map with these worker counts")
+    parser.add_argument('--batch-size', type=int, default=500, help="deliveries per batch")
+    parser.add_argument('--batch-algorithm', default='astar', choices=BATCH_ALGORITHMS)
+    args = parser.parse_args(argv)
+
+    rows = []
+    mazes = [False, True] if args.maze else [False]
+    for size, terrain, density, maze, dynamic, seed in itertools.product(
+            args.sizes, args.terrain, args.densities, mazes, args.dynamic, args.seeds):
+        scenario = run_scenario(size, terrain, density, maze, dynamic, seed,
+                                args.algorithms, args.queries, args.memory, args.deadline, args.node_budget,
+                                args.queues)
+        rows.extend(scenario)
+        for algorithm, queue in itertools.product(args.algorithms, args.queues):
+            times = [float(r['seconds']) for r in scenario if (r['algorithm'], r['queue']) == (algorithm, queue)]
+            nodes = [r['nodes_expanded'] for r in scenario if (r['algorithm'], r['queue']) == (algorithm, queue)]
+            label = f"{algorithm}/{queue}" if len(args.queues) > 1 else algorithm
+            if times:
+                print(f"{size:>5} {terrain:>8} d={density:<4} maze={int(maze)} dyn={dynamic:<4} "
+                      f"{label:>12}: {statistics.median(times):.4f}s, {statistics.median(nodes)} nodes")
+
+    write_csv(rows, args.out)
+    print(f"Wrote {len(rows)} rows to {args.out}")
+
+    if args.fleet:
+        fleet_rows = []
+        for size, terrain, density, maze, dynamic, seed in itertools.product(
+                args.sizes, args.terrain, args.densities, mazes, args.dynamic, args.seeds):
+            for agents in args.fleet:
+                scenario = run_fleet_scenario(size, terrain, density, maze, dynamic, seed, agents, args.window)
+                fleet_rows.extend(scenario)
+                times = [float(r['seconds']) for r in scenario]
+                if times:
+                    print(f"{size:>5} {terrain:>8} d={density:<4} maze={int(maze)} dyn={dynamic:<4} "
+                          f"fleet {len(times):>4}: {statistics.mean(times) * 1000:.2f} ms/agent, "
+                          f"{sum(times):.3f}s total, {sum(r['found'] for r in scenario)} routed, "
+                          f"{scenario[0]['rounds']} round(s), {scenario[0]['conflicts']} conflicts")
+        write_csv(fleet_rows, args.fleet_out, FLEET_FIELDS)
+        print(f"Wrote {len(fleet_rows)} rows to {args.fleet_out}")
+    if args.batch:
+        for size, terrain, density, maze, seed in itertools.product(
+                args.sizes, args.terrain, args.densities, mazes, args.seeds):
+            single = None
+            for workers in args.batch:
+                seconds, routed = run_batch_scenario(size, terrain, density, maze, seed, workers,
+                                                     args.batch_size, args.batch_algorithm)
+                single = single or seconds
+                print(f"{size:>5} {terrain:>8} d={density:<4} maze={int(maze)} "
+                      f"batch x{workers:<3}: {seconds:.3f}s, {args.batch_size / seconds:.0f} routes/s, "
+                      f"{single / seconds:.2f}x vs x{args.batch[0]}, {routed} routed")
+    if args.plot:
+        plot_results(args.out, args.plot)
+        print(f"Plots written to {args.plot}")
+    if args.baseline:
+        regressions = compare_to_baseline(rows, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,20 @@
 import heapq
+import json
+import mmap
+import multiprocessing
+import os
 import time
 import random
+import struct
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from enum import Enum
-from typing import List, Tuple, Dict, Set, Optional
+from math import gcd
+from multiprocessing import shared_memory
+from typing import Callable, List, NamedTuple, Tuple, Dict, Set, Optional
 import copy
-import pygame
+import argparse
 import sys
 
 class Terrain(Enum):
@@ -23,82 +33,1109 @@ class Cell:
     def get_cost(self):
         return self.cost if not self.is_obstacle else float('inf')
 
+# pygame is only imported once visualization is requested, so headless runs
+# start fast and work on machines without a display or pygame installed
+pygame = None
+
+def load_pygame():
+    global pygame
+    if pygame is None:
+        import pygame as pygame_module
+        pygame = pygame_module
+    return pygame
+
+INF = float('inf')
+
+TERRAIN_BY_VALUE = {terrain.value: terrain for terrain in Terrain}
+MIN_STEP_COST = min(terrain.value for terrain in Terrain)
+
+# On-disk map format: header, then the padded costs, blocked and dynamic
+# planes exactly as Grid stores them, then the dynamic obstacles
+MAP_MAGIC = b'DAGR'
+MAP_FORMAT_VERSION = 1
+MAP_HEADER = struct.Struct('<4sHHIIqII')  # magic, version, flags, width, height, time_step, obstacles, patterns
+MAP_HAS_LANDMARKS = 1  # flag: landmark tables follow the obstacles
+
+# Cells of the '#'-style text maps; multi-character tokens need whitespace-separated rows
+TEXT_CELLS = {'.': Terrain.ROAD, 'R': Terrain.ROAD, 'G': Terrain.GRASS, 'W': Terrain.WATER, 'M': Terrain.MOUNTAIN,
+              **{str(terrain.value): terrain for terrain in Terrain}}
+
+# animate_path moves the dynamic obstacles once every this many agent steps
+MOVES_PER_OBSTACLE_UPDATE = 3
+
+ALGORITHMS = ("bfs", "ucs", "astar", "replan", "field", "dstar", "spacetime", "hpa", "weighted", "anytime", "alt",
+              "jps", "jps+", "jps-bfs")
+
+# ALT heuristics: landmarks per grid, how many of them a single search
+# consults, and how many cost increases are tolerated before a rebuild
+LANDMARK_COUNT = 8
+ACTIVE_LANDMARKS = 4
+LANDMARK_REBUILD_MIN = 64
+LANDMARK_UNREACHABLE = {'H': 0xFFFF, 'I': 0xFFFFFFFF}
+
+# Heuristic weights: weighted A* uses a fixed one; anytime A* starts high and
+# lowers it by the step each round until it reaches 1
+WEIGHTED_ASTAR_WEIGHT = 2.0
+ANYTIME_INITIAL_WEIGHT = 3.0
+ANYTIME_WEIGHT_STEP = 0.5
+
+# Ring of per-f buckets for the bucket queue: wide enough for one step of a
+# one-byte terrain cost plus a heuristic change of at most another such step
+BUCKET_QUEUE_SPAN = 512
+
+# Cells' worth of goal fields an agent keeps cached (16 bytes each), so at
+# least one field but fewer of them on bigger grids
+GOAL_FIELD_CACHE_CELLS = 1 << 22
+
+# Deterministic planners whose routes can be reused from the RouteCache
+CACHEABLE_ALGORITHMS = ("bfs", "ucs", "astar", "field", "hpa", "alt", "jps", "jps+")
+
+class CellView:
+    """Cell-compatible view of one position in a Grid's flat arrays"""
+    __slots__ = ('_grid', '_index')
+    
+    def __init__(self, grid: 'Grid', index: int):
+        self._grid = grid
+        self._index = index
+    
+    @property
+    def terrain(self) -> Terrain:
+        return TERRAIN_BY_VALUE[self._grid.costs[self._index]]
+    
+    @terrain.setter
+    def terrain(self, terrain: Terrain):
+        self._grid.costs[self._index] = terrain.value
+        self._grid.mark_dirty((self._index,))
+    
+    @property
+    def cost(self) -> int:
+        return self._grid.costs[self._index]
+    
+    @property
+    def is_obstacle(self) -> bool:
+        return bool(self._grid.blocked[self._index])
+    
+    @is_obstacle.setter
+    def is_obstacle(self, value: bool):
+        self._grid.blocked[self._index] = 1 if value else 0
+        self._grid.mark_dirty((self._index,))
+    
+    @property
+    def dynamic_obstacle(self) -> bool:
+        return bool(self._grid.dynamic[self._index])
+    
+    @dynamic_obstacle.setter
+    def dynamic_obstacle(self, value: bool):
+        self._grid.dynamic[self._index] = 1 if value else 0
+    
+    def get_cost(self):
+        return self.cost if not self.is_obstacle else float('inf')
+
+class GridRowView:
+    """Row of CellViews so that grid.grid[y][x] keeps working"""
+    __slots__ = ('_grid', '_y')
+    
+    def __init__(self, grid: 'Grid', y: int):
+        self._grid = grid
+        self._y = y
+    
+    def __len__(self):
+        return self._grid.width
+    
+    def __getitem__(self, x: int) -> CellView:
+        if not 0 <= x < self._grid.width:
+            raise IndexError("grid column out of range")
+        return CellView(self._grid, self._grid.index(x, self._y))
+
+class GridRowsView:
+    """Row-major view over a Grid, mirroring the old list of Cell rows"""
+    __slots__ = ('_grid',)
+    
+    def __init__(self, grid: 'Grid'):
+        self._grid = grid
+    
+    def __len__(self):
+        return self._grid.height
+    
+    def __getitem__(self, y: int) -> GridRowView:
+        if not 0 <= y < self._grid.height:
+            raise IndexError("grid row out of range")
+        return GridRowView(self._grid, y)
+
+class OccupancyTable:
+    """Dynamic obstacle occupancy over a full cycle of their patterns.
+    
+    Built once from Grid.dynamic_occupancy_cycle, it answers "is cell i held by
+    a dynamic obstacle at time step t" in O(1) for any t from the time step it
+    was built at onwards, without stepping the simulation.
+    """
+    
+    def __init__(self, grid: 'Grid'):
+        self.occupancy, self.cycle_start = grid.dynamic_occupancy_cycle()
+        self.period = len(self.occupancy) - self.cycle_start
+        self.base_time = grid.time_step
+        self.generation = grid.obstacle_generation
+    
+    def slot(self, time_step: int) -> int:
+        k = time_step - self.base_time
+        if k >= len(self.occupancy):
+            k = self.cycle_start + (k - self.cycle_start) % self.period
+        return k
+    
+    def cells_at(self, time_step: int) -> frozenset:
+        return self.occupancy[self.slot(time_step)]
+    
+    def is_occupied(self, index: int, time_step: int) -> bool:
+        return index in self.occupancy[self.slot(time_step)]
+
+def _landmark_unreachable(table) -> int:
+    """Marker for unreachable cells in an array or memoryview landmark table"""
+    return LANDMARK_UNREACHABLE[getattr(table, 'typecode', None) or table.format]
+
+class LandmarkTables:
+    """ALT landmark distance tables for one Grid.
+    
+    Each table holds the cost of the cheapest route from its landmark L to
+    every cell. Entering a cell costs its terrain, so the reverse cost is
+    d(v, L) = d(L, v) - cost(v) + cost(L), and one table gives both triangle
+    bounds d(v, t) >= d(L, t) - d(L, v) and d(v, t) >= d(v, L) - d(t, L).
+    Tables use the smallest unsigned array type that fits their distances.
+    
+    The tables describe a relaxed copy of the map (self.costs, self.blocked)
+    that is never costlier than the real one: cells held by dynamic obstacles
+    count as open, so moving obstacles never invalidate them. sync() repairs
+    the tables in place when terrain gets cheaper or cells open up. Cost
+    increases and new walls leave the bounds admissible, only looser, so the
+    relaxed copy keeps its old values and the tables are rebuilt once enough
+    of those have piled up.
+    """
+    
+    def __init__(self, grid: 'Grid', count: int = LANDMARK_COUNT):
+        self.grid = grid
+        self.count = count
+        self.build()
+    
+    @classmethod
+    def from_tables(cls, grid: 'Grid', landmarks: List[int], tables: list) -> 'LandmarkTables':
+        """Tables loaded from disk; they must match grid's current state"""
+        landmark_tables = cls.__new__(cls)
+        landmark_tables.grid = grid
+        landmark_tables.count = len(landmarks)
+        landmark_tables.landmarks = list(landmarks)
+        landmark_tables.tables = tables
+        landmark_tables._snapshot()
+        return landmark_tables
+    
+    def _snapshot(self):
+        grid = self.grid
+        self.costs = bytearray(grid.costs)
+        self.blocked = bytearray(grid.blocked)
+        for i in grid._obstacle_indices(grid.obstacle_x, grid.obstacle_y):
+            self.blocked[i] = 0
+        self.version = grid.version
+        self.loosened = 0
+    
+    def _distances(self, source: int) -> array:
+        costs, blocked, offsets = self.costs, self.blocked, self.grid.offsets
+        distance = array('d', [INF]) * len(costs)
+        distance[source] = 0
+        priority_queue = [(0, source)]
+        while priority_queue:
+            current_d, current = heapq.heappop(priority_queue)
+            if current_d > distance[current]:
+                continue
+            for offset in offsets:
+                n = current + offset
+                if blocked[n]:
+                    continue
+                step = current_d + costs[n]
+                if step < distance[n]:
+                    distance[n] = step
+                    heapq.heappush(priority_queue, (step, n))
+        return distance
+    
+    def _largest_area_cell(self) -> Optional[int]:
+        """A cell of the largest connected open area, so that landmark
+        selection does not start in a small walled-off pocket"""
+        blocked, offsets = self.blocked, self.grid.offsets
+        seen = bytearray(blocked)
+        best_size, best_cell = 0, None
+        cell = seen.find(0)
+        while cell >= 0:
+            seen[cell] = 1
+            stack = [cell]
+            size = 0
+            while stack:
+                current = stack.pop()
+                size += 1
+                for offset in offsets:
+                    n = current + offset
+                    if not seen[n]:
+                        seen[n] = 1
+                        stack.append(n)
+            if size > best_size:
+                best_size, best_cell = size, cell
+            cell = seen.find(0, cell)
+        return best_cell
+    
+    def build(self):
+        """Choose landmarks by farthest-point selection and compute their tables"""
+        self._snapshot()
+        grid = self.grid
+        self.landmarks = []
+        self.tables = []
+        seed = self._largest_area_cell()
+        if seed is None:
+            return
+        # Each landmark is the reachable cell farthest from all those before it
+        nearest = self._distances(seed)
+        for _ in range(self.count):
+            candidate = max((d, i) for i, d in enumerate(nearest) if d < INF)
+            if candidate[0] == 0 and self.landmarks:
+                break
+            landmark = candidate[1]
+            distance = self._distances(landmark)
+            self.landmarks.append(landmark)
+            self.tables.append(self._compact(distance))
+            nearest = array('d', map(min, nearest, distance)) if len(self.landmarks) > 1 else distance
+        self.version = grid.version
+    
+    @staticmethod
+    def _compact(distance: array) -> array:
+        longest = max((d for d in distance if d < INF), default=0)
+        typecode = 'H' if longest < 0xFFFF else 'I'
+        unreachable = LANDMARK_UNREACHABLE[typecode]
+        return array(typecode, [int(d) if d < INF else unreachable for d in distance])
+    
+    def sync(self) -> bool:
+        """Bring the tables up to date with the grid; returns True if they changed"""
+        grid = self.grid
+        if self.version == grid.version:
+            return False
+        changed = grid.changed_since(self.version)
+        self.version = grid.version
+        dynamic = grid._obstacle_indices(grid.obstacle_x, grid.obstacle_y)
+        cheaper = []
+        for i in changed:
+            blocked = grid.blocked[i] and i not in dynamic
+            cost = grid.costs[i]
+            if self.blocked[i]:
+                self.costs[i] = cost
+                if not blocked:
+                    self.blocked[i] = 0
+                    cheaper.append(i)
+            elif blocked or cost > self.costs[i]:
+                self.loosened += 1
+            elif cost < self.costs[i]:
+                self.costs[i] = cost
+                cheaper.append(i)
+        
+        if self.loosened > max(LANDMARK_REBUILD_MIN, len(self.costs) // 100):
+            self.build()
+            return True
+        if cheaper:
+            for table in self.tables:
+                self._repair(table, cheaper)
+        return bool(cheaper)
+    
+    def _repair(self, table, cheaper: List[int]):
+        """Lower a table's distances after the given cells got cheaper or opened"""
+        costs, blocked, offsets = self.costs, self.blocked, self.grid.offsets
+        unreachable = _landmark_unreachable(table)
+        priority_queue = []
+        for i in cheaper:
+            if blocked[i]:
+                continue
+            best = table[i]
+            for offset in offsets:
+                d = table[i + offset]
+                if not blocked[i + offset] and d != unreachable and d + costs[i] < best:
+                    best = d + costs[i]
+            if best < table[i]:
+                table[i] = best
+                priority_queue.append((best, i))
+        heapq.heapify(priority_queue)
+        while priority_queue:
+            current_d, current = heapq.heappop(priority_queue)
+            if current_d > table[current]:
+                continue
+            for offset in offsets:
+                n = current + offset
+                if blocked[n]:
+                    continue
+                step = current_d + costs[n]
+                # Never above the unreachable marker, so values always fit the table
+                if step < table[n]:
+                    table[n] = step
+                    heapq.heappush(priority_queue, (step, n))
+    
+    def heuristic(self, start: Tuple[int, int], goal: Tuple[int, int],
+                  active: int = ACTIVE_LANDMARKS) -> Callable[[int], float]:
+        """Admissible ALT heuristic towards goal, as a function of grid index.
+        
+        Only the active landmarks giving the strongest bounds at start are
+        consulted, and the result is never below the Manhattan bound.
+        """
+        grid = self.grid
+        costs = self.costs
+        start_i, goal_i = grid.index(*start), grid.index(*goal)
+        stride = grid.stride
+        goal_y, goal_x = divmod(goal_i, stride)
+        goal_cost = costs[goal_i]
+        
+        terms = []
+        for table in self.tables:
+            unreachable = _landmark_unreachable(table)
+            to_goal = table[goal_i]
+            if to_goal == unreachable:
+                continue
+            terms.append((table, to_goal, to_goal - goal_cost, unreachable))
+        
+        def bound(term, i: int) -> float:
+            table, to_goal, from_goal, unreachable = term
+            d = table[i]
+            if d == unreachable:
+                return 0
+            return max(to_goal - d, d - costs[i] - from_goal)
+        
+        if len(terms) > active:
+            terms.sort(key=lambda term: bound(term, start_i), reverse=True)
+            terms = terms[:active]
+        
+        def heuristic(index: int) -> float:
+            y, x = divmod(index, stride)
+            best = (abs(x - goal_x) + abs(y - goal_y)) * MIN_STEP_COST
+            for table, to_goal, from_goal, unreachable in terms:
+                d = table[index]
+                if d != unreachable:
+                    h = to_goal - d
+                    if h > best:
+                        best = h
+                    h = d - costs[index] - from_goal
+                    if h > best:
+                        best = h
+            return best
+        
+        return heuristic
+
+def _uniform_cell(costs, blocked, offsets, n: int) -> bool:
+    """Whether every open neighbour of cell n costs the same to enter as n"""
+    cost = costs[n]
+    for offset in offsets:
+        m = n + offset
+        if not blocked[m] and costs[m] != cost:
+            return False
+    return True
+
+def _jump_direction(current: int, parent: int, stride: int) -> int:
+    """Offset of the straight jump that led from parent to current"""
+    if current // stride == parent // stride:
+        return 1 if current > parent else -1
+    return stride if current > parent else -stride
+
+class JumpTables:
+    """JPS+ jump distances for one Grid.
+    
+    For every open cell and each of the four directions, a table holds k > 0
+    when a jump from the cell stops at a jump point k cells away, or -k when
+    it runs through k open cells into a wall without stopping. A jump stops
+    where JPS would: next to a forced neighbour, at a cell where the terrain
+    cost changes (unless ignore_costs), and, moving vertically, at any cell
+    from which a horizontal jump stops. Cells of other terrain count as walls
+    when looking for forced neighbours. Jumps then take constant time, apart
+    from a check for the goal. The tables describe the grid as of self.version
+    and are rebuilt whole when it changes, so they suit static maps.
+    """
+    
+    def __init__(self, grid: 'Grid', ignore_costs: bool = False):
+        self.grid = grid
+        self.ignore_costs = ignore_costs
+        self.build()
+    
+    def build(self):
+        grid = self.grid
+        blocked, offsets, stride = grid.blocked, grid.offsets, grid.stride
+        size = len(blocked)
+        costs = bytes(size) if self.ignore_costs else grid.costs
+        self.version = grid.version
+        interior = self.interior = bytearray(size)
+        for n in range(size):
+            if not blocked[n] and _uniform_cell(costs, blocked, offsets, n):
+                interior[n] = 1
+        
+        rows = [range(grid.index(0, y), grid.index(grid.width - 1, y) + 1) for y in range(grid.height)]
+        columns = [range(grid.index(x, 0), grid.index(x, grid.height - 1) + 1, stride) for x in range(grid.width)]
+        self.right, self.left = array('i', [0]) * size, array('i', [0]) * size
+        for d, table in ((1, self.right), (-1, self.left)):
+            for row in rows:
+                for n in (reversed(row) if d > 0 else row):
+                    m = n + d
+                    if blocked[n] or blocked[m]:
+                        continue
+                    cost = costs[m]
+                    if (not interior[m]
+                            or (not blocked[m - stride] and (blocked[n - stride] or costs[n - stride] != cost))
+                            or (not blocked[m + stride] and (blocked[n + stride] or costs[n + stride] != cost))):
+                        table[n] = 1
+                    else:
+                        k = table[m]
+                        table[n] = k + 1 if k > 0 else k - 1
+        right, left = self.right, self.left
+        self.down, self.up = array('i', [0]) * size, array('i', [0]) * size
+        for d, table in ((stride, self.down), (-stride, self.up)):
+            for column in columns:
+                for n in (reversed(column) if d > 0 else column):
+                    m = n + d
+                    if blocked[n] or blocked[m]:
+                        continue
+                    cost = costs[m]
+                    if (not interior[m] or right[m] > 0 or left[m] > 0
+                            or (not blocked[m - 1] and (blocked[n - 1] or costs[n - 1] != cost))
+                            or (not blocked[m + 1] and (blocked[n + 1] or costs[n + 1] != cost))):
+                        table[n] = 1
+                    else:
+                        k = table[m]
+                        table[n] = k + 1 if k > 0 else k - 1
+    
+    def jumper(self, goal: int) -> Callable[[int, int], int]:
+        """jump(current, d): where a jump from current in direction d stops
+        on the way to goal, or -1 if it does not"""
+        stride = self.grid.stride
+        right, left = self.right, self.left
+        tables = {1: right, -1: left, stride: self.down, -stride: self.up}
+        goal_y, goal_x = divmod(goal, stride)
+        
+        def jump(current: int, d: int) -> int:
+            k = tables[d][current]
+            reach = k if k > 0 else -k
+            y, x = divmod(current, stride)
+            if d == 1 or d == -1:
+                if y == goal_y and 0 < (goal_x - x) * d <= reach:
+                    return goal
+            else:
+                rows = goal_y - y if d > 0 else y - goal_y
+                if 0 < rows <= reach and (rows < reach or k <= 0):
+                    # The goal's row is crossed before the jump stops: stop
+                    # there if a horizontal jump would run into the goal
+                    m = current + rows * d
+                    if goal_x == x:
+                        return m
+                    across = right[m] if goal_x > x else left[m]
+                    if abs(goal_x - x) <= -across:
+                        return m
+            return current + k * d if k > 0 else -1
+        
+        return jump
+
 class Grid:
+    """Grid world stored as flat arrays.
+    
+    Cells are indexed row-major with a one-cell blocked border around the map,
+    so index(x, y) = (y + 1) * stride + (x + 1) and the four neighbours of a
+    cell are always at the fixed offsets in self.offsets, with no bounds checks.
+    Terrain values double as step costs, so self.costs is both the cost array
+    and the terrain code array.
+    """
+    
     def __init__(self, width: int, height: int):
+        stride = width + 2
+        size = stride * (height + 2)
+        costs = bytearray([Terrain.ROAD.value]) * size
+        blocked = bytearray([1]) * size
+        for y in range(height):
+            row_start = (y + 1) * stride + 1
+            blocked[row_start:row_start + width] = bytes(width)
+        self._init_storage(width, height, costs, blocked, bytearray(size))
+    
+    @classmethod
+    def from_buffers(cls, width: int, height: int, costs, blocked, dynamic=None) -> 'Grid':
+        """Grid over existing flat buffers laid out like Grid's own.
+        
+        costs and blocked can be any writable byte buffers of the padded size,
+        such as shared or memory-mapped memory; they are used, not copied.
+        """
+        grid = cls.__new__(cls)
+        grid._init_storage(width, height, costs, blocked,
+                           dynamic if dynamic is not None else bytearray(len(costs)))
+        return grid
+    
+    @classmethod
+    def load(cls, path: str, memory_map: bool = True) -> 'Grid':
+        """Open a map written by save().
+        
+        With memory_map the file is mapped copy-on-write and the grid's
+        arrays are views into the mapping, so opening takes constant time and
+        only the pages a search touches are read from disk. Changes to the
+        grid stay in memory and never reach the file.
+        """
+        with open(path, 'rb') as f:
+            _, _, flags, width, height, time_step, obstacle_count, pattern_count = _read_map_header(f, path)
+            size = (width + 2) * (height + 2)
+            view = None
+            if memory_map:
+                view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY))
+                planes = [view[MAP_HEADER.size + k * size:MAP_HEADER.size + (k + 1) * size] for k in range(3)]
+                f.seek(MAP_HEADER.size + 3 * size)
+            else:
+                planes = [bytearray(f.read(size)) for _ in range(3)]
+            grid = cls.from_buffers(width, height, *planes)
+            grid._set_obstacles(*_read_obstacles(f, obstacle_count, pattern_count))
+            grid.time_step = time_step
+            if flags & MAP_HAS_LANDMARKS:
+                landmarks, tables = _read_landmark_tables(f, size, view)
+                grid.landmarks = LandmarkTables.from_tables(grid, landmarks, tables)
+        return grid
+    
+    @classmethod
+    def load_region(cls, path: str, x: int, y: int, width: int, height: int) -> 'Grid':
+        """Read one rectangular tile of a saved map as a Grid of its own.
+        
+        Only the tile's rows are read from the file. Dynamic obstacles inside
+        the tile are kept, moved into the tile's coordinates.
+        """
+        with open(path, 'rb') as f:
+            _, _, _, map_width, map_height, time_step, obstacle_count, pattern_count = _read_map_header(f, path)
+            if x < 0 or y < 0 or width <= 0 or height <= 0 or x + width > map_width or y + height > map_height:
+                raise ValueError(f"Region {width}x{height} at ({x}, {y}) is outside the {map_width}x{map_height} map")
+            grid = cls(width, height)
+            map_stride = map_width + 2
+            size = map_stride * (map_height + 2)
+            for plane, target in enumerate((grid.costs, grid.blocked, grid.dynamic)):
+                for row in range(height):
+                    f.seek(MAP_HEADER.size + plane * size + (y + row + 1) * map_stride + x + 1)
+                    start = grid.index(0, row)
+                    target[start:start + width] = f.read(width)
+            f.seek(MAP_HEADER.size + 3 * size)
+            xs, ys, pids, patterns = _read_obstacles(f, obstacle_count, pattern_count)
+        for ox, oy, pid in zip(xs, ys, pids):
+            if x <= ox < x + width and y <= oy < y + height:
+                grid.obstacle_x.append(ox - x)
+                grid.obstacle_y.append(oy - y)
+                grid.obstacle_pattern.append(grid._pattern_id(patterns[pid]))
+        grid.time_step = time_step
+        return grid
+    
+    @classmethod
+    def from_text(cls, path: str) -> 'Grid':
+        """Build a Grid from a '#'-style text map (see read_text_map).
+        
+        The file is streamed twice, once to size the map and once to fill it,
+        so it is never held in memory whole.
+        """
+        width, height, obstacles = _scan_text_map(path)
+        grid = cls(width, height)
+        for y, (costs, blocked) in enumerate(_text_map_rows(path, width)):
+            start = grid.index(0, y)
+            grid.costs[start:start + width] = costs
+            grid.blocked[start:start + width] = blocked
+        for (x, y), pattern in obstacles.items():
+            grid.add_dynamic_obstacle(x, y, pattern)
+        return grid
+    
+    def save(self, path: str):
+        """Write the map in the compact binary format read by load().
+        
+        Landmark tables are saved with it when they are in use, so a loaded
+        map does not have to rebuild them.
+        """
+        landmarks = self.landmarks
+        if landmarks is not None:
+            landmarks.sync()
+        with open(path, 'wb') as f:
+            flags = MAP_HAS_LANDMARKS if landmarks is not None else 0
+            f.write(MAP_HEADER.pack(MAP_MAGIC, MAP_FORMAT_VERSION, flags, self.width, self.height, self.time_step,
+                                    len(self.obstacle_x), len(self.patterns)))
+            f.write(_as_buffer(self.costs))
+            f.write(_as_buffer(self.blocked))
+            f.write(_as_buffer(self.dynamic))
+            _write_obstacles(f, self.obstacle_x, self.obstacle_y, self.obstacle_pattern, self.patterns)
+            if landmarks is not None:
+                _write_landmark_tables(f, landmarks)
+    
+    def _set_obstacles(self, xs: array, ys: array, pids: array, patterns: List[Tuple[Tuple[int, int], ...]]):
+        self.obstacle_x, self.obstacle_y, self.obstacle_pattern = xs, ys, pids
+        self.patterns = patterns
+        self.pattern_ids = {pattern: pid for pid, pattern in enumerate(patterns)}
+        self.obstacle_generation += 1
+    
+    def __deepcopy__(self, memo) -> 'Grid':
+        # Copies own their arrays even when these are views into mapped or shared memory
+        grid = self.__class__.__new__(self.__class__)
+        memo[id(self)] = grid
+        for name, value in self.__dict__.items():
+            if name == 'landmarks':
+                # Rebuilt for the copy if it ever needs them
+                value = None
+            elif name == 'jump_tables_by_mode':
+                value = {}
+            setattr(grid, name, bytearray(value) if isinstance(value, memoryview) else copy.deepcopy(value, memo))
+        return grid
+    
+    def _init_storage(self, width: int, height: int, costs, blocked, dynamic):
         self.width = width
         self.height = height
-        self.grid = [[Cell(Terrain.ROAD) for _ in range(width)] for _ in range(height)]
-        self.dynamic_obstacles = {}  # pos -> movement pattern
+        self.stride = width + 2
+        self.costs = costs
+        self.blocked = blocked
+        self.dynamic = dynamic
+        # Same order as the old direction list: (0, 1), (1, 0), (0, -1), (-1, 0)
+        self.offsets = (self.stride, 1, -self.stride, -1)
+        self.directions = ((0, 1), (1, 0), (0, -1), (-1, 0))
+        # Dynamic obstacles as parallel arrays; patterns are shared by id
+        self.obstacle_x = array('i')
+        self.obstacle_y = array('i')
+        self.obstacle_pattern = array('i')
+        self.patterns: List[Tuple[Tuple[int, int], ...]] = []
+        self.pattern_ids: Dict[Tuple[Tuple[int, int], ...], int] = {}
+        self.obstacle_generation = 0  # bumped when obstacles are added or replaced
+        # (x, y) -> slot in the obstacle arrays, for the arrays it was built from
+        self._obstacle_slots: Dict[Tuple[int, int], int] = {}
+        self._obstacle_slots_of: Optional[array] = None
+        self._occupancy_table: Optional['OccupancyTable'] = None
+        self.landmarks: Optional[LandmarkTables] = None
+        self.jump_tables_by_mode: Dict[bool, JumpTables] = {}  # ignore_costs -> JPS+ tables
         self.time_step = 0
+        self.version = 0  # bumped on every cost or obstacle change
+        self.cell_versions: Dict[int, int] = {}  # index -> version it last changed at, oldest first
+    
+    @property
+    def grid(self) -> GridRowsView:
+        """Backwards-compatible grid[y][x] access to cells"""
+        return GridRowsView(self)
+    
+    def index(self, x: int, y: int) -> int:
+        return (y + 1) * self.stride + x + 1
+    
+    def coords(self, index: int) -> Tuple[int, int]:
+        y, x = divmod(index, self.stride)
+        return (x - 1, y - 1)
+    
+    def mark_dirty(self, indices):
+        """Bump the grid version and record the given cells as changed at it"""
+        if not indices:
+            return
+        self.version += 1
+        cell_versions = self.cell_versions
+        for i in indices:
+            # Re-insert so the dict stays ordered by version
+            cell_versions.pop(i, None)
+            cell_versions[i] = self.version
+    
+    def changed_since(self, version: int) -> List[int]:
+        """Indices of cells whose cost or obstacle state changed after version"""
+        changed = []
+        cell_versions = self.cell_versions
+        for i in reversed(cell_versions):
+            if cell_versions[i] <= version:
+                break
+            changed.append(i)
+        return changed
+    
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+    
+    def get_terrain(self, x: int, y: int) -> Terrain:
+        return TERRAIN_BY_VALUE[self.costs[self.index(x, y)]]
     
     def set_terrain(self, x: int, y: int, terrain: Terrain):
         if 0 <= x < self.width and 0 <= y < self.height:
-            self.grid[y][x].terrain = terrain
-            self.grid[y][x].cost = terrain.value
+            i = self.index(x, y)
+            if self.costs[i] != terrain.value:
+                self.costs[i] = terrain.value
+                self.mark_dirty((i,))
     
     def set_obstacle(self, x: int, y: int, permanent: bool = True):
         if 0 <= x < self.width and 0 <= y < self.height:
-            self.grid[y][x].is_obstacle = permanent
-            self.grid[y][x].dynamic_obstacle = not permanent
+            i = self.index(x, y)
+            was_blocked = self.blocked[i]
+            self.blocked[i] = 1 if permanent else 0
+            self.dynamic[i] = 0 if permanent else 1
+            if self.blocked[i] != was_blocked:
+                self.mark_dirty((i,))
+    
+    @property
+    def dynamic_obstacles(self) -> Dict[Tuple[int, int], List[Tuple[int, int]]]:
+        """pos -> movement pattern, built from the obstacle arrays"""
+        return {(x, y): list(self.patterns[pid])
+                for x, y, pid in zip(self.obstacle_x, self.obstacle_y, self.obstacle_pattern)}
+    
+    @dynamic_obstacles.setter
+    def dynamic_obstacles(self, obstacles: Dict[Tuple[int, int], List[Tuple[int, int]]]):
+        self.obstacle_x = array('i', [x for x, _ in obstacles])
+        self.obstacle_y = array('i', [y for _, y in obstacles])
+        self.obstacle_pattern = array('i', [self._pattern_id(p) for p in obstacles.values()])
+        self.obstacle_generation += 1
+    
+    def _pattern_id(self, pattern: List[Tuple[int, int]]) -> int:
+        key = tuple(tuple(move) for move in pattern)
+        pid = self.pattern_ids.get(key)
+        if pid is None:
+            pid = self.pattern_ids[key] = len(self.patterns)
+            self.patterns.append(key)
+        return pid
+    
+    def _obstacle_slot_index(self) -> Dict[Tuple[int, int], int]:
+        """(x, y) -> obstacle slot, rebuilt only after the arrays are replaced or appended to elsewhere"""
+        slots, xs = self._obstacle_slots, self.obstacle_x
+        if self._obstacle_slots_of is not xs or len(slots) != len(xs):
+            slots = self._obstacle_slots = {pos: slot for slot, pos in enumerate(zip(xs, self.obstacle_y))}
+            self._obstacle_slots_of = xs
+        return slots
     
     def add_dynamic_obstacle(self, x: int, y: int, pattern: List[Tuple[int, int]]):
         """Add a dynamic obstacle with a movement pattern"""
-        self.dynamic_obstacles[(x, y)] = pattern
+        pid = self._pattern_id(pattern)
+        slots = self._obstacle_slot_index()
+        slot = slots.get((x, y))
+        if slot is not None:
+            self.obstacle_pattern[slot] = pid
+        else:
+            slots[(x, y)] = len(self.obstacle_x)
+            self.obstacle_x.append(x)
+            self.obstacle_y.append(y)
+            self.obstacle_pattern.append(pid)
+        self.obstacle_generation += 1
         self.set_obstacle(x, y, permanent=False)
     
+    def _step_obstacles(self, xs: array, ys: array, pids: array, time_step: int) -> Tuple[array, array, array]:
+        """Move obstacles to their positions at time_step.
+        
+        Each pattern's move is looked up once per tick rather than once per
+        obstacle. Obstacles leaving the map are dropped, and obstacles landing
+        on the same cell merge, keeping the first one's slot and the last
+        one's pattern, as the old pos -> pattern dict did.
+        """
+        moves = [pattern[time_step % len(pattern)] for pattern in self.patterns]
+        width, height = self.width, self.height
+        new_x, new_y, new_p = array('i'), array('i'), array('i')
+        slots = {}
+        for x, y, pid in zip(xs, ys, pids):
+            dx, dy = moves[pid]
+            x += dx
+            y += dy
+            if 0 <= x < width and 0 <= y < height:
+                key = y * width + x
+                slot = slots.get(key)
+                if slot is None:
+                    slots[key] = len(new_x)
+                    new_x.append(x)
+                    new_y.append(y)
+                    new_p.append(pid)
+                else:
+                    new_p[slot] = pid
+        return new_x, new_y, new_p
+    
+    def _obstacle_indices(self, xs: array, ys: array) -> Set[int]:
+        stride = self.stride
+        width, height = self.width, self.height
+        return {(y + 1) * stride + x + 1 for x, y in zip(xs, ys) if 0 <= x < width and 0 <= y < height}
+    
     def update_dynamic_obstacles(self):
         """Update positions of dynamic obstacles"""
         self.time_step += 1
-        new_obstacles = {}
-        
-        # Clear current dynamic obstacles
-        for pos in self.dynamic_obstacles.keys():
-            x, y = pos
-            if 0 <= x < self.width and 0 <= y < self.height:
-                self.grid[y][x].is_obstacle = False
-        
-        # Move to new positions
-        for pos, pattern in self.dynamic_obstacles.items():
-            x, y = pos
-            pattern_index = self.time_step % len(pattern)
-            dx, dy = pattern[pattern_index]
-            new_x, new_y = x + dx, y + dy
-            
-            # Ensure new position is within bounds
-            if 0 <= new_x < self.width and 0 <= new_y < self.height:
-                new_obstacles[(new_x, new_y)] = pattern
-                self.grid[new_y][new_x].is_obstacle = True
+        blocked = self.blocked
+        old_cells = self._obstacle_indices(self.obstacle_x, self.obstacle_y)
+        self.obstacle_x, self.obstacle_y, self.obstacle_pattern = self._step_obstacles(
+            self.obstacle_x, self.obstacle_y, self.obstacle_pattern, self.time_step)
+        new_cells = self._obstacle_indices(self.obstacle_x, self.obstacle_y)
+        
+        # Vacated cells are cleared and newly occupied ones set; only cells
+        # whose flag actually flips count as changed
+        changed = []
+        for i in old_cells - new_cells:
+            if blocked[i]:
+                blocked[i] = 0
+                changed.append(i)
+        for i in new_cells:
+            if not blocked[i]:
+                blocked[i] = 1
+                changed.append(i)
+        self.mark_dirty(changed)
+    
+    def dynamic_occupancy_cycle(self) -> Tuple[List[frozenset], int]:
+        """Predict the cells held by dynamic obstacles on future ticks.
         
-        self.dynamic_obstacles = new_obstacles
+        Replays update_dynamic_obstacles on copies of the obstacle arrays until
+        their state repeats, which it must because every pattern is periodic.
+        Returns (occupancy, cycle_start): occupancy[k] is the frozenset of
+        indices occupied k ticks from now, and for k >= len(occupancy) the
+        occupancy is occupancy[cycle_start + (k - cycle_start) % period]
+        with period = len(occupancy) - cycle_start.
+        """
+        hyperperiod = 1
+        for pattern in self.patterns:
+            hyperperiod = hyperperiod * len(pattern) // gcd(hyperperiod, len(pattern))
+        
+        xs, ys, pids = self.obstacle_x, self.obstacle_y, self.obstacle_pattern
+        time_step = self.time_step
+        occupancy = []
+        seen = {}
+        while True:
+            state = (time_step % hyperperiod, xs.tobytes(), ys.tobytes(), pids.tobytes())
+            if state in seen:
+                return occupancy, seen[state]
+            seen[state] = len(occupancy)
+            occupancy.append(frozenset(self._obstacle_indices(xs, ys)))
+            time_step += 1
+            xs, ys, pids = self._step_obstacles(xs, ys, pids, time_step)
+    
+    def occupancy_table(self) -> 'OccupancyTable':
+        """Precomputed dynamic occupancy, rebuilt only when obstacles are added"""
+        table = self._occupancy_table
+        if table is None or table.generation != self.obstacle_generation or table.base_time > self.time_step:
+            table = self._occupancy_table = OccupancyTable(self)
+        return table
+    
+    def landmark_tables(self) -> LandmarkTables:
+        """ALT tables for this grid, built on first use and kept in sync after"""
+        if self.landmarks is None:
+            self.landmarks = LandmarkTables(self)
+        else:
+            self.landmarks.sync()
+        return self.landmarks
+    
+    def jump_tables(self, ignore_costs: bool = False) -> JumpTables:
+        """JPS+ tables for this grid, rebuilt whenever the grid has changed"""
+        tables = self.jump_tables_by_mode.get(ignore_costs)
+        if tables is None or tables.version != self.version:
+            tables = self.jump_tables_by_mode[ignore_costs] = JumpTables(self, ignore_costs)
+        return tables
     
     def is_valid_position(self, x: int, y: int) -> bool:
         return (0 <= x < self.width and 0 <= y < self.height and 
-                not self.grid[y][x].is_obstacle)
+                not self.blocked[self.index(x, y)])
     
     def get_cost(self, x: int, y: int) -> float:
         if 0 <= x < self.width and 0 <= y < self.height:
-            return self.grid[y][x].get_cost()
+            i = self.index(x, y)
+            return self.costs[i] if not self.blocked[i] else float('inf')
         return float('inf')
     
     def get_neighbors(self, x: int, y: int) -> List[Tuple[int, int, float]]:
+        i = self.index(x, y)
+        costs, blocked = self.costs, self.blocked
         neighbors = []
-        directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]  # 4-connected
-        
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            if self.is_valid_position(nx, ny):
-                cost = self.get_cost(nx, ny)
-                neighbors.append((nx, ny, cost))
-        
+        for (dx, dy), offset in zip(self.directions, self.offsets):
+            n = i + offset
+            if not blocked[n]:
+                neighbors.append((x + dx, y + dy, costs[n]))
         return neighbors
+    
+    def overlay(self) -> 'GridOverlay':
+        """A copy-on-write view of this grid for trying out changes; see GridOverlay"""
+        return GridOverlay(self)
+
+class OverlayPlane:
+    """One of a GridOverlay's cost, blocked or dynamic planes, read through to the base.
+    
+    Indexing looks in the overlay's changes first and falls back to the
+    base's plane, so nothing is copied; writes are recorded as overlay
+    changes. bytes() flattens it for code that needs a real buffer.
+    """
+    __slots__ = ('overlay', 'changes', 'base', 'field')
+    
+    def __init__(self, overlay: 'GridOverlay', base, field: int):
+        self.overlay = overlay
+        self.changes = overlay.changes
+        self.base = base
+        self.field = field
+    
+    def __getitem__(self, i):
+        try:
+            change = self.changes.get(i)
+        except TypeError:
+            # A slice
+            return bytes(self[k] for k in range(*i.indices(len(self))))
+        return self.base[i] if change is None else change[self.field]
+    
+    def __setitem__(self, i: int, value: int):
+        cell = list(self.overlay._cell(i))
+        cell[self.field] = value
+        self.overlay._record(i, *cell)
+    
+    def __len__(self) -> int:
+        return len(self.base)
+    
+    def __iter__(self):
+        return iter(bytes(self))
+    
+    def __bytes__(self) -> bytes:
+        data = bytearray(self.base)
+        field = self.field
+        for i, change in self.changes.items():
+            data[i] = change[field]
+        return bytes(data)
+
+def _as_buffer(plane):
+    """A plane as a bytes-like object; overlay planes are flattened"""
+    return bytes(plane) if isinstance(plane, OverlayPlane) else plane
+
+class GridOverlay(Grid):
+    """Copy-on-write view of a Grid for what-if planning.
+    
+    Terrain and obstacle changes made through the overlay, including writes
+    through overlay.grid[y][x], are kept per cell in self.changes and never
+    reach the base grid, which stays shared and is never copied. costs,
+    blocked and dynamic are OverlayPlanes that read the overlay's change
+    first and the base's value otherwise, so base changes show through at
+    once and the overlay's own changes win over them. An overlay is
+    therefore almost free to create, discard and stack; the price is that
+    every cell read goes through the change dict, so searches on an overlay
+    run slower than on a plain grid.
+    
+    Dynamic obstacles and the time step are the base's and change only with
+    it: adding, replacing or moving obstacles, or setting time_step, through
+    the overlay raises TypeError.
+    """
+    
+    def __init__(self, base: Grid):
+        self.base = base
+        self.width, self.height, self.stride = base.width, base.height, base.stride
+        self.offsets, self.directions = base.offsets, base.directions
+        self.changes: Dict[int, Tuple[int, int, int]] = {}  # index -> (cost, blocked, dynamic)
+        self.landmarks: Optional[LandmarkTables] = None
+        self.jump_tables_by_mode: Dict[bool, JumpTables] = {}
+        self.cell_versions: Dict[int, int] = {}
+        self._version = 0
+        self._base_version = base.version
+        self.costs = OverlayPlane(self, base.costs, 0)
+        self.blocked = OverlayPlane(self, base.blocked, 1)
+        self.dynamic = OverlayPlane(self, base.dynamic, 2)
+    
+    def _sync_base(self):
+        """Mark the cells the base changed since the overlay last looked as changed here too"""
+        base = self.base
+        if base.version == self._base_version:
+            return
+        changed = [i for i in base.changed_since(self._base_version) if i not in self.changes]
+        self._base_version = base.version
+        self.mark_dirty(changed)
+    
+    @property
+    def version(self) -> int:
+        self._sync_base()
+        return self._version
+    
+    @version.setter
+    def version(self, version: int):
+        self._version = version
+    
+    def changed_since(self, version: int) -> List[int]:
+        self._sync_base()
+        return super().changed_since(version)
+    
+    def _cell(self, i: int) -> Tuple[int, int, int]:
+        self._sync_base()
+        change = self.changes.get(i)
+        if change is not None:
+            return change
+        base = self.base
+        return base.costs[i], base.blocked[i], base.dynamic[i]
+    
+    def _record(self, i: int, cost: int, blocked: int, dynamic: int):
+        self.changes[i] = (cost, blocked, dynamic)
+    
+    def set_terrain(self, x: int, y: int, terrain: Terrain):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            i = self.index(x, y)
+            cost, blocked, dynamic = self._cell(i)
+            if cost != terrain.value:
+                self._record(i, terrain.value, blocked, dynamic)
+                self.mark_dirty((i,))
+    
+    def set_obstacle(self, x: int, y: int, permanent: bool = True):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            i = self.index(x, y)
+            cost, was_blocked, _ = self._cell(i)
+            self._record(i, cost, 1 if permanent else 0, 0 if permanent else 1)
+            if bool(permanent) != bool(was_blocked):
+                self.mark_dirty((i,))
+    
+    def discard_changes(self):
+        """Drop every change made through the overlay, back to a plain view of the base"""
+        self._sync_base()
+        changed = list(self.changes)
+        self.changes.clear()
+        self.mark_dirty(changed)
+    
+    # Dynamic obstacles and time are read from the base
+    @property
+    def obstacle_x(self) -> array:
+        return self.base.obstacle_x
+    
+    @property
+    def obstacle_y(self) -> array:
+        return self.base.obstacle_y
+    
+    @property
+    def obstacle_pattern(self) -> array:
+        return self.base.obstacle_pattern
+    
+    @property
+    def patterns(self) -> List[Tuple[Tuple[int, int], ...]]:
+        return self.base.patterns
+    
+    @property
+    def pattern_ids(self) -> Dict[Tuple[Tuple[int, int], ...], int]:
+        return self.base.pattern_ids
+    
+    @property
+    def obstacle_generation(self) -> int:
+        return self.base.obstacle_generation
+    
+    @property
+    def time_step(self) -> int:
+        return self.base.time_step
+    
+    @time_step.setter
+    def time_step(self, time_step: int):
+        self._refuse_obstacle_change("advance time")
+    
+    @property
+    def dynamic_obstacles(self) -> Dict[Tuple[int, int], List[Tuple[int, int]]]:
+        return self.base.dynamic_obstacles
+    
+    @dynamic_obstacles.setter
+    def dynamic_obstacles(self, obstacles: Dict[Tuple[int, int], List[Tuple[int, int]]]):
+        self._refuse_obstacle_change("replace dynamic obstacles")
+    
+    def occupancy_table(self) -> 'OccupancyTable':
+        return self.base.occupancy_table()
+    
+    def _refuse_obstacle_change(self, action: str):
+        raise TypeError(f"GridOverlay cannot {action}; dynamic obstacles and time belong to the base grid")
+    
+    def _set_obstacles(self, xs: array, ys: array, pids: array, patterns: List[Tuple[Tuple[int, int], ...]]):
+        self._refuse_obstacle_change("replace dynamic obstacles")
+    
+    def add_dynamic_obstacle(self, x: int, y: int, pattern: List[Tuple[int, int]]):
+        self._refuse_obstacle_change("add dynamic obstacles")
+    
+    def update_dynamic_obstacles(self):
+        self._refuse_obstacle_change("move dynamic obstacles")
 
 class PygameVisualizer:
-    def __init__(self, grid, cell_size=60):
+    """Pygame renderer with a cached static layer and dirty-rect updates.
+    
+    Terrain, obstacles, grid lines and cost labels for the cells in view are
+    rendered once into static_layer, and scene adds the current path on top.
+    Each frame only restores the rectangles under last frame's agent, goal
+    and info text plus any cells the grid reports as changed, then redraws
+    the sprites and pushes just those rectangles to the display. Maps larger
+    than max_window are shown through a viewport that follows the agent;
+    arrow keys pan and +/- zoom during animation.
+    """
+    
+    MIN_CELL_SIZE = 4
+    MAX_CELL_SIZE = 120
+    
+    def __init__(self, grid, cell_size=60, max_window=(1280, 800)):
         self.grid = grid
         self.cell_size = cell_size
-        self.width = grid.width * cell_size
-        self.height = grid.height * cell_size
+        self.width = min(grid.width * cell_size, max_window[0])
+        self.height = min(grid.height * cell_size, max_window[1])
         
+        load_pygame()
         pygame.init()
         self.screen = pygame.display.set_mode((self.width, self.height))
         pygame.display.set_caption("Delivery Agent Simulation")
@@ -118,78 +1155,212 @@ class PygameVisualizer:
             'grid_line': (100, 100, 100)        # Dark gray
         }
         
-        # Font for displaying costs
+        # Fonts are created once; rendered labels are cached by text and color
         self.font = pygame.font.Font(None, 20)
+        self.info_font = pygame.font.Font(None, 24)
+        self.labels = {}
+        
+        self.view_x = 0
+        self.view_y = 0
+        self.static_layer = None
+        self.scene = None
+        self.layer_version = -1
+        self.scene_path = None
+        self.path_steps = {}  # cell -> indices of that cell in scene_path
+        self.sprite_rects = []
+        self.frame_times = deque(maxlen=60)
     
-    def draw_grid(self, agent_pos=None, goal_pos=None, path=None, info_text=""):
-        self.screen.fill((0, 0, 0))  # Black background
+    @property
+    def view_cols(self) -> int:
+        return min(-(-self.width // self.cell_size), self.grid.width - self.view_x)
+    
+    @property
+    def view_rows(self) -> int:
+        return min(-(-self.height // self.cell_size), self.grid.height - self.view_y)
+    
+    @property
+    def frame_ms(self) -> float:
+        """Average time of the recent draw_grid calls in milliseconds"""
+        return sum(self.frame_times) / len(self.frame_times) * 1000 if self.frame_times else 0.0
+    
+    def _in_view(self, x, y) -> bool:
+        return (self.view_x <= x < self.view_x + self.view_cols and
+                self.view_y <= y < self.view_y + self.view_rows)
+    
+    def _cell_rect(self, x, y):
+        return pygame.Rect((x - self.view_x) * self.cell_size, (y - self.view_y) * self.cell_size,
+                           self.cell_size, self.cell_size)
+    
+    def _cell_center(self, x, y):
+        return ((x - self.view_x) * self.cell_size + self.cell_size // 2,
+                (y - self.view_y) * self.cell_size + self.cell_size // 2)
+    
+    def _label(self, text, color, font=None):
+        key = (text, color, font is not None)
+        surface = self.labels.get(key)
+        if surface is None:
+            surface = self.labels[key] = (font or self.font).render(text, True, color)
+        return surface
+    
+    def _draw_cell(self, surface, x, y):
+        rect = self._cell_rect(x, y)
+        cell = self.grid.grid[y][x]
         
-        # Draw cells
-        for y in range(self.grid.height):
-            for x in range(self.grid.width):
-                rect = pygame.Rect(x * self.cell_size, y * self.cell_size, 
-                                 self.cell_size, self.cell_size)
-                
-                if self.grid.grid[y][x].is_obstacle:
-                    color = self.colors['obstacle']
-                else:
-                    color = self.colors[self.grid.grid[y][x].terrain]
-                
-                pygame.draw.rect(self.screen, color, rect)
-                
-                # Draw grid lines
-                pygame.draw.rect(self.screen, self.colors['grid_line'], rect, 1)
-                
-                # Draw cost numbers
-                if not self.grid.grid[y][x].is_obstacle:
-                    cost_text = self.font.render(str(self.grid.grid[y][x].get_cost()), 
-                                               True, self.colors['text'])
-                    text_rect = cost_text.get_rect(center=(x * self.cell_size + self.cell_size // 2, 
-                                                         y * self.cell_size + self.cell_size // 2))
-                    self.screen.blit(cost_text, text_rect)
-        
-        # Draw path
-        if path:
-            for i in range(len(path) - 1):
-                start_pos = (path[i][0] * self.cell_size + self.cell_size // 2,
-                           path[i][1] * self.cell_size + self.cell_size // 2)
-                end_pos = (path[i+1][0] * self.cell_size + self.cell_size // 2,
-                         path[i+1][1] * self.cell_size + self.cell_size // 2)
-                pygame.draw.line(self.screen, self.colors['path'], start_pos, end_pos, 3)
-            
-            for x, y in path:
-                center = (x * self.cell_size + self.cell_size // 2, 
-                         y * self.cell_size + self.cell_size // 2)
-                pygame.draw.circle(self.screen, self.colors['path'], center, 5)
-        
-        # Draw goal
-        if goal_pos:
-            x, y = goal_pos
-            center = (x * self.cell_size + self.cell_size // 2, 
-                     y * self.cell_size + self.cell_size // 2)
-            pygame.draw.circle(self.screen, self.colors['goal'], center, 15)
-            # Add "G" label
-            goal_text = self.font.render("G", True, (255, 255, 255))
-            text_rect = goal_text.get_rect(center=center)
-            self.screen.blit(goal_text, text_rect)
-        
-        # Draw agent
+        if cell.is_obstacle:
+            color = self.colors['obstacle']
+        else:
+            color = self.colors[cell.terrain]
+        
+        pygame.draw.rect(surface, color, rect)
+        
+        # Draw grid lines
+        pygame.draw.rect(surface, self.colors['grid_line'], rect, 1)
+        
+        # Draw cost numbers when the cells are big enough to read them
+        if not cell.is_obstacle and self.cell_size >= 20:
+            cost_text = self._label(str(cell.get_cost()), self.colors['text'])
+            surface.blit(cost_text, cost_text.get_rect(center=rect.center))
+    
+    def _draw_path_step(self, surface, i):
+        """Draw path cell i's dot and its segment to the next cell"""
+        path = self.scene_path
+        width = max(1, self.cell_size // 20)
+        if i + 1 < len(path) and (self._in_view(*path[i]) or self._in_view(*path[i + 1])):
+            pygame.draw.line(surface, self.colors['path'], self._cell_center(*path[i]),
+                             self._cell_center(*path[i + 1]), width)
+        if self._in_view(*path[i]):
+            pygame.draw.circle(surface, self.colors['path'], self._cell_center(*path[i]),
+                               max(1, self.cell_size // 12))
+    
+    def _rebuild_static(self):
+        self.static_layer = pygame.Surface((self.width, self.height))
+        self.static_layer.fill((0, 0, 0))  # Black background
+        for y in range(self.view_y, self.view_y + self.view_rows):
+            for x in range(self.view_x, self.view_x + self.view_cols):
+                self._draw_cell(self.static_layer, x, y)
+        self.layer_version = self.grid.version
+        self.scene = None
+    
+    def _rebuild_scene(self, path):
+        self.scene = self.static_layer.copy()
+        self.scene_path = path
+        self.path_steps = {}
+        for i, pos in enumerate(path):
+            self.path_steps.setdefault(pos, []).append(i)
+            self._draw_path_step(self.scene, i)
+    
+    def _refresh_changed_cells(self):
+        """Redraw cells changed since the layers were drawn; returns their rects"""
+        changed = self.grid.changed_since(self.layer_version)
+        self.layer_version = self.grid.version
+        rects = []
+        for i in changed:
+            x, y = self.grid.coords(i)
+            if not self._in_view(x, y):
+                continue
+            rect = self._cell_rect(x, y)
+            self._draw_cell(self.static_layer, x, y)
+            self.scene.blit(self.static_layer, rect, rect)
+            # Segments into this cell from its path neighbours are redrawn too
+            for step in self.path_steps.get((x, y), ()):
+                for j in (step - 1, step):
+                    if 0 <= j < len(self.scene_path):
+                        self._draw_path_step(self.scene, j)
+            rects.append(rect)
+        return rects
+    
+    def set_view(self, x, y) -> bool:
+        """Move the viewport's top-left cell; returns True if it moved"""
+        cols = -(-self.width // self.cell_size)
+        rows = -(-self.height // self.cell_size)
+        x = max(0, min(x, self.grid.width - cols))
+        y = max(0, min(y, self.grid.height - rows))
+        if (x, y) == (self.view_x, self.view_y):
+            return False
+        self.view_x, self.view_y = x, y
+        self.static_layer = None
+        return True
+    
+    def follow(self, pos) -> bool:
+        """Recentre the viewport if pos is within a cell of its edge"""
+        x, y = pos
+        cols, rows = self.view_cols, self.view_rows
+        if (self.view_x < x < self.view_x + cols - 1 or cols >= self.grid.width) and \
+                (self.view_y < y < self.view_y + rows - 1 or rows >= self.grid.height):
+            return False
+        return self.set_view(x - cols // 2, y - rows // 2)
+    
+    def zoom(self, factor):
+        cell_size = max(self.MIN_CELL_SIZE, min(self.MAX_CELL_SIZE, int(self.cell_size * factor)))
+        if cell_size != self.cell_size:
+            center_x = self.view_x + self.view_cols // 2
+            center_y = self.view_y + self.view_rows // 2
+            self.cell_size = cell_size
+            self.labels.clear()
+            self.static_layer = None
+            self.set_view(center_x - self.width // cell_size // 2, center_y - self.height // cell_size // 2)
+    
+    def handle_view_key(self, key):
+        step = max(1, self.view_cols // 4)
+        if key == pygame.K_LEFT:
+            self.set_view(self.view_x - step, self.view_y)
+        elif key == pygame.K_RIGHT:
+            self.set_view(self.view_x + step, self.view_y)
+        elif key == pygame.K_UP:
+            self.set_view(self.view_x, self.view_y - step)
+        elif key == pygame.K_DOWN:
+            self.set_view(self.view_x, self.view_y + step)
+        elif key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+            self.zoom(1.5)
+        elif key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+            self.zoom(1 / 1.5)
+    
+    def _draw_marker(self, pos, color, radius, letter):
+        if not self._in_view(*pos):
+            return None
+        center = self._cell_center(*pos)
+        radius = max(2, radius * self.cell_size // 60)
+        pygame.draw.circle(self.screen, color, center, radius)
+        if self.cell_size >= 20:
+            text = self._label(letter, (255, 255, 255))
+            self.screen.blit(text, text.get_rect(center=center))
+        return pygame.Rect(center[0] - radius, center[1] - radius, 2 * radius + 1, 2 * radius + 1)
+    
+    def draw_grid(self, agent_pos=None, goal_pos=None, path=None, info_text=""):
+        started = time.perf_counter()
         if agent_pos:
-            x, y = agent_pos
-            center = (x * self.cell_size + self.cell_size // 2, 
-                     y * self.cell_size + self.cell_size // 2)
-            pygame.draw.circle(self.screen, self.colors['agent'], center, 12)
-            # Add "A" label
-            agent_text = self.font.render("A", True, (255, 255, 255))
-            text_rect = agent_text.get_rect(center=center)
-            self.screen.blit(agent_text, text_rect)
+            self.follow(agent_pos)
+        full_redraw = self.static_layer is None
+        if full_redraw:
+            self._rebuild_static()
+        
+        path = tuple(path) if path else ()
+        if self.scene is None or path != self.scene_path:
+            self._rebuild_scene(path)
+            full_redraw = True
+        
+        dirty = self._refresh_changed_cells() + self.sprite_rects
+        if full_redraw:
+            self.screen.blit(self.scene, (0, 0))
+        else:
+            for rect in dirty:
+                self.screen.blit(self.scene, rect, rect)
+        
+        sprites = [self._draw_marker(goal_pos, self.colors['goal'], 15, "G") if goal_pos else None,
+                   self._draw_marker(agent_pos, self.colors['agent'], 12, "A") if agent_pos else None]
         
         # Draw info text
         if info_text:
-            info_surface = pygame.font.Font(None, 24).render(info_text, True, (255, 255, 255))
-            self.screen.blit(info_surface, (10, 10))
+            info_surface = self.info_font.render(f"{info_text} - {self.frame_ms:.1f} ms/frame",
+                                                 True, (255, 255, 255))
+            sprites.append(self.screen.blit(info_surface, (10, 10)))
         
-        pygame.display.flip()
+        self.sprite_rects = [rect for rect in sprites if rect is not None]
+        if full_redraw:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty + self.sprite_rects)
+        self.frame_times.append(time.perf_counter() - started)
     
     def animate_path(self, agent, goal, path, algorithm_name="", delay=500):
         """Animate the agent following the path"""
@@ -209,12 +1380,13 @@ class PygameVisualizer:
                     if event.key == pygame.K_ESCAPE:
                         pygame.quit()
                         sys.exit()
+                    self.handle_view_key(event.key)
             
             # Update agent position
             agent.position = pos
             
             # Update dynamic obstacles periodically
-            if step > 0 and step % 3 == 0 and hasattr(self.grid, 'dynamic_obstacles'):
+            if step > 0 and step % MOVES_PER_OBSTACLE_UPDATE == 0 and hasattr(self.grid, 'dynamic_obstacles'):
                 if self.grid.dynamic_obstacles:
                     self.grid.update_dynamic_obstacles()
                     # Re-draw the grid to show updated obstacles
@@ -226,29 +1398,764 @@ class PygameVisualizer:
             
             pygame.time.delay(delay)  # Delay in milliseconds
         
-        # Show final state for a bit longer
-        final_info = f"Algorithm: {algorithm_name} - DELIVERY COMPLETE! - Total cost: {agent.total_cost}"
-        self.draw_grid(agent.position, goal, path, final_info)
-        pygame.time.delay(2000)
+        # Show final state for a bit longer
+        final_info = f"Algorithm: {algorithm_name} - DELIVERY COMPLETE! - Total cost: {agent.total_cost}"
+        self.draw_grid(agent.position, goal, path, final_info)
+        print(f"Average frame time: {self.frame_ms:.2f} ms")
+        pygame.time.delay(2000)
+        
+        # Wait for user to close window; the view can still be panned and zoomed
+        waiting = True
+        while waiting:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    waiting = False
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_ESCAPE:
+                        waiting = False
+                    else:
+                        self.handle_view_key(event.key)
+                        self.draw_grid(agent.position, goal, path, final_info)
+            self.clock.tick(60)
+        pygame.quit()
+
+class CostToGoField:
+    """Cost-to-go and next-hop field rooted at a single goal.
+    
+    Built with one reverse Dijkstra over the whole grid, after which the
+    cheapest route from any start is found by following next_hop to the goal.
+    The field remembers the grid version it was built against and must be
+    rebuilt once the grid has changed.
+    """
+    
+    def __init__(self, grid: Grid, goal: Tuple[int, int]):
+        self.goal = goal
+        self.version = grid.version
+        size = len(grid.costs)
+        self.distance = array('d', [INF]) * size
+        self.next_hop = array('q', [-1]) * size
+        self.nodes_expanded = 0
+        self._build(grid)
+    
+    def _build(self, grid: Grid):
+        costs, blocked, offsets = grid.costs, grid.blocked, grid.offsets
+        distance, next_hop = self.distance, self.next_hop
+        goal_i = grid.index(*self.goal)
+        distance[goal_i] = 0
+        next_hop[goal_i] = goal_i
+        if blocked[goal_i]:
+            # Forward searches can never enter a blocked goal
+            return
+        
+        closed = bytearray(len(costs))
+        priority_queue = [(0, goal_i)]
+        while priority_queue:
+            current_d, current = heapq.heappop(priority_queue)
+            if closed[current]:
+                continue
+            closed[current] = 1
+            self.nodes_expanded += 1
+            
+            # Stepping from a neighbour into current costs current's terrain
+            step = current_d + costs[current]
+            for offset in offsets:
+                n = current + offset
+                if blocked[n] or closed[n]:
+                    continue
+                if step < distance[n]:
+                    distance[n] = step
+                    next_hop[n] = current
+                    heapq.heappush(priority_queue, (step, n))
+    
+    def is_current(self, grid: Grid) -> bool:
+        return self.version == grid.version
+    
+    def cost_to_go(self, grid: Grid, x: int, y: int) -> float:
+        return self.distance[grid.index(x, y)]
+    
+    def cost_from(self, grid: Grid, start: Tuple[int, int]) -> float:
+        """Route cost from start to the goal, stepping off a blocked start like path_from"""
+        distance = self.distance
+        i = grid.index(*start)
+        if self.next_hop[i] >= 0:
+            return distance[i]
+        return min((grid.costs[i + offset] + distance[i + offset] for offset in grid.offsets
+                    if not grid.blocked[i + offset]), default=INF)
+    
+    def path_from(self, grid: Grid, start: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        """Follow next hops from start to the goal in O(path length)"""
+        distance, next_hop = self.distance, self.next_hop
+        i = grid.index(*start)
+        path = [start]
+        if next_hop[i] < 0:
+            # A blocked start (e.g. a dynamic obstacle) can still be left
+            best, best_n = INF, -1
+            for offset in grid.offsets:
+                n = i + offset
+                if not grid.blocked[n] and grid.costs[n] + distance[n] < best:
+                    best, best_n = grid.costs[n] + distance[n], n
+            if best_n < 0:
+                return None
+            i = best_n
+            path.append(grid.coords(i))
+        while next_hop[i] != i:
+            i = next_hop[i]
+            path.append(grid.coords(i))
+        return path
+
+class RouteCache:
+    """LRU-bounded cache of planned routes keyed by (start, goal, algorithm).
+    
+    The cache remembers the grid version it last synced with. On each lookup
+    it asks the grid which cells changed since then and evicts only the
+    routes those changes could affect: routes that pass through a changed
+    cell, and routes cheap enough that a detour through the changed cell
+    could beat them (every step costs at least MIN_STEP_COST, so a cell
+    outside that Manhattan ellipse around start and goal cannot help).
+    """
+    
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.entries: 'OrderedDict[Tuple, Tuple[List[Tuple[int, int]], frozenset, float]]' = OrderedDict()
+        self.grid = None
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lru_evictions = 0
+    
+    def _sync(self, grid: Grid):
+        if grid is not self.grid:
+            self.entries.clear()
+            self.grid = grid
+            self.version = grid.version
+            return
+        if grid.version == self.version:
+            return
+        changed = [grid.coords(i) for i in grid.changed_since(self.version)]
+        self.version = grid.version
+        stale = []
+        for key, (path, cells, bound) in self.entries.items():
+            (sx, sy), (gx, gy) = key[0], key[1]
+            for cx, cy in changed:
+                if ((cx, cy) in cells or
+                        (abs(sx - cx) + abs(sy - cy) + abs(cx - gx) + abs(cy - gy)) * MIN_STEP_COST < bound):
+                    stale.append(key)
+                    break
+        for key in stale:
+            del self.entries[key]
+        self.invalidations += len(stale)
+    
+    def get(self, grid: Grid, start: Tuple[int, int], goal: Tuple[int, int],
+            algorithm: str) -> Optional[List[Tuple[int, int]]]:
+        self._sync(grid)
+        key = (start, goal, algorithm)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return list(entry[0])
+    
+    def put(self, grid: Grid, start: Tuple[int, int], goal: Tuple[int, int],
+            algorithm: str, path: List[Tuple[int, int]], bound: float):
+        """Store a route; bound is the value a better route would have to beat"""
+        self._sync(grid)
+        key = (start, goal, algorithm)
+        self.entries[key] = (list(path), frozenset(path), bound)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.lru_evictions += 1
+    
+    def clear(self):
+        self.entries.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'lru_evictions': self.lru_evictions,
+        }
+
+class DStarLite:
+    """D* Lite incremental planner for one goal on a Grid.
+    
+    Searches backwards from the goal and keeps its g/rhs values and open
+    list between calls. Each replan pulls the cells that changed since the
+    last plan from the grid, re-evaluates only the vertices next to them,
+    and repairs the search from there. nodes_expanded is the work done by
+    the most recent replan.
+    """
+    
+    def __init__(self, grid: Grid, goal: Tuple[int, int]):
+        self.grid = grid
+        self.goal = goal
+        self.goal_index = grid.index(*goal)
+        self.version = grid.version
+        size = len(grid.costs)
+        self.g = array('d', [INF]) * size
+        self.rhs = array('d', [INF]) * size
+        self.rhs[self.goal_index] = 0
+        self.open_keys: Dict[int, Tuple[float, float]] = {}
+        self.open_list: List[Tuple[float, float, int]] = []
+        self.start_index = -1
+        self.km = 0
+        self.nodes_expanded = 0
+        self._push(self.goal_index)
+    
+    def _h(self, a: int, b: int) -> float:
+        ay, ax = divmod(a, self.grid.stride)
+        by, bx = divmod(b, self.grid.stride)
+        return (abs(ax - bx) + abs(ay - by)) * MIN_STEP_COST
+    
+    def _key(self, s: int) -> Tuple[float, float]:
+        m = min(self.g[s], self.rhs[s])
+        return (m + self._h(self.start_index, s) + self.km, m)
+    
+    def _push(self, s: int):
+        key = self._key(s)
+        self.open_keys[s] = key
+        heapq.heappush(self.open_list, (key[0], key[1], s))
+    
+    def _is_node(self, s: int) -> bool:
+        # Blocked cells cannot be entered, so only the start may be one
+        return not self.grid.blocked[s] or s == self.start_index
+    
+    def _update_vertex(self, u: int):
+        grid = self.grid
+        if u != self.goal_index:
+            costs, blocked, g = grid.costs, grid.blocked, self.g
+            best = INF
+            for offset in grid.offsets:
+                n = u + offset
+                if not blocked[n] and costs[n] + g[n] < best:
+                    best = costs[n] + g[n]
+            self.rhs[u] = best
+        if self.g[u] != self.rhs[u]:
+            self._push(u)
+        else:
+            self.open_keys.pop(u, None)
+    
+    def _update_predecessors(self, s: int):
+        for offset in self.grid.offsets:
+            p = s + offset
+            if self._is_node(p):
+                self._update_vertex(p)
+    
+    def _compute_shortest_path(self):
+        g, rhs, open_keys, open_list = self.g, self.rhs, self.open_keys, self.open_list
+        start = self.start_index
+        while open_list:
+            k1, k2, u = open_list[0]
+            if open_keys.get(u) != (k1, k2):
+                heapq.heappop(open_list)
+                continue
+            start_key = self._key(start)
+            if (k1, k2) >= start_key and rhs[start] <= g[start]:
+                break
+            heapq.heappop(open_list)
+            self.nodes_expanded += 1
+            new_key = self._key(u)
+            if (k1, k2) < new_key:
+                self._push(u)
+            elif g[u] > rhs[u]:
+                g[u] = rhs[u]
+                del open_keys[u]
+                self._update_predecessors(u)
+            else:
+                g[u] = INF
+                self._update_vertex(u)
+                self._update_predecessors(u)
+    
+    def replan(self, start: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        """Repair the search for the current grid and return a path from start"""
+        grid = self.grid
+        self.nodes_expanded = 0
+        start_i = grid.index(*start)
+        if self.start_index >= 0:
+            self.km += self._h(self.start_index, start_i)
+        self.start_index = start_i
+        
+        # Entering a changed cell got cheaper or dearer for all its neighbours
+        changed = grid.changed_since(self.version)
+        self.version = grid.version
+        for v in changed:
+            if self._is_node(v):
+                self._update_vertex(v)
+            self._update_predecessors(v)
+        # The start may be a blocked cell the previous plan never considered
+        self._update_vertex(start_i)
+        
+        self._compute_shortest_path()
+        return self._extract_path(start_i)
+    
+    def _extract_path(self, start_i: int) -> Optional[List[Tuple[int, int]]]:
+        grid = self.grid
+        costs, blocked, g = grid.costs, grid.blocked, self.g
+        if self.rhs[start_i] == INF:
+            return None
+        path = [grid.coords(start_i)]
+        s = start_i
+        for _ in range(len(costs)):
+            if s == self.goal_index:
+                return path
+            best, best_n = INF, -1
+            for offset in grid.offsets:
+                n = s + offset
+                if not blocked[n] and costs[n] + g[n] < best:
+                    best, best_n = costs[n] + g[n], n
+            if best_n < 0:
+                return None
+            s = best_n
+            path.append(grid.coords(s))
+        return None
+
+class HierarchicalPlanner:
+    """HPA* over a Grid split into cluster_size x cluster_size clusters.
+    
+    Abstract nodes are the cells on either side of each entrance between
+    neighbouring clusters (one transition per entrance, or one at each end
+    for entrances of ENTRANCE_SPLIT cells or more). Transitions give
+    inter-cluster edges, and one Dijkstra per node inside its cluster gives
+    the intra-cluster edges. A query links start and goal into their
+    clusters, searches the abstract graph, then refines each abstract edge
+    with a search confined to one cluster. Paths are near-optimal, not
+    optimal. Changed cells only rebuild the borders and clusters they touch.
+    """
+    
+    ENTRANCE_SPLIT = 6
+    
+    def __init__(self, grid: Grid, cluster_size: int = 10):
+        self.grid = grid
+        self.cluster_size = cluster_size
+        self.clusters_x = (grid.width + cluster_size - 1) // cluster_size
+        self.clusters_y = (grid.height + cluster_size - 1) // cluster_size
+        # (cluster, right or lower neighbour) -> [(cell in first, cell in second), ...]
+        self.borders: Dict[Tuple[Tuple[int, int], Tuple[int, int]], List[Tuple[int, int]]] = {}
+        self.inter: Dict[int, Set[int]] = {}
+        self.intra: Dict[Tuple[int, int], Dict[int, List[Tuple[int, float]]]] = {}
+        self.nodes_expanded = 0
+        self.version = grid.version
+        
+        started = time.perf_counter()
+        for cy in range(self.clusters_y):
+            for cx in range(self.clusters_x):
+                if cx + 1 < self.clusters_x:
+                    self._build_border((cx, cy), (cx + 1, cy))
+                if cy + 1 < self.clusters_y:
+                    self._build_border((cx, cy), (cx, cy + 1))
+        for cy in range(self.clusters_y):
+            for cx in range(self.clusters_x):
+                self._build_cluster((cx, cy))
+        self.build_seconds = time.perf_counter() - started
+    
+    def cluster_of(self, index: int) -> Tuple[int, int]:
+        x, y = self.grid.coords(index)
+        return (x // self.cluster_size, y // self.cluster_size)
+    
+    def _bounds(self, cluster: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        cx, cy = cluster
+        size = self.cluster_size
+        return (cx * size, cy * size,
+                min((cx + 1) * size, self.grid.width), min((cy + 1) * size, self.grid.height))
+    
+    def _build_border(self, first: Tuple[int, int], second: Tuple[int, int]):
+        grid = self.grid
+        blocked = grid.blocked
+        x0, y0, x1, y1 = self._bounds(first)
+        if second[0] != first[0]:
+            pairs = [(grid.index(x1 - 1, y), grid.index(x1, y)) for y in range(y0, y1)]
+        else:
+            pairs = [(grid.index(x, y1 - 1), grid.index(x, y1)) for x in range(x0, x1)]
+        
+        for a, b in self.borders.get((first, second), []):
+            for u, v in ((a, b), (b, a)):
+                self.inter[u].discard(v)
+                if not self.inter[u]:
+                    # No longer a transition on any border
+                    del self.inter[u]
+        
+        transitions = []
+        run = []
+        for a, b in pairs + [(None, None)]:
+            if a is not None and not blocked[a] and not blocked[b]:
+                run.append((a, b))
+                continue
+            if len(run) >= self.ENTRANCE_SPLIT:
+                transitions.extend((run[0], run[-1]))
+            elif run:
+                transitions.append(run[len(run) // 2])
+            run = []
+        for a, b in transitions:
+            self.inter.setdefault(a, set()).add(b)
+            self.inter.setdefault(b, set()).add(a)
+        self.borders[(first, second)] = transitions
+    
+    def _cluster_nodes(self, cluster: Tuple[int, int]) -> Set[int]:
+        cx, cy = cluster
+        nodes = set()
+        for a, _ in self.borders.get((cluster, (cx + 1, cy)), []) + self.borders.get((cluster, (cx, cy + 1)), []):
+            nodes.add(a)
+        for _, b in self.borders.get(((cx - 1, cy), cluster), []) + self.borders.get(((cx, cy - 1), cluster), []):
+            nodes.add(b)
+        return nodes
+    
+    def _build_cluster(self, cluster: Tuple[int, int]):
+        nodes = self._cluster_nodes(cluster)
+        edges = {}
+        for u in nodes:
+            distance, _ = self._cluster_search(u, cluster)
+            edges[u] = [(v, distance[v]) for v in nodes if v != u and v in distance]
+        self.intra[cluster] = edges
+    
+    def _cluster_search(self, source: int, cluster: Tuple[int, int], target: int = -1,
+                        reverse: bool = False) -> Tuple[Dict[int, float], Dict[int, int]]:
+        """Dijkstra from source confined to one cluster.
+        
+        With reverse=True distances are costs of reaching source from each
+        cell rather than of reaching each cell from source.
+        """
+        grid = self.grid
+        costs, blocked, offsets, stride = grid.costs, grid.blocked, grid.offsets, grid.stride
+        x0, y0, x1, y1 = self._bounds(cluster)
+        distance = {source: 0}
+        parent = {source: source}
+        closed = set()
+        priority_queue = [(0, source)]
+        while priority_queue:
+            current_d, current = heapq.heappop(priority_queue)
+            if current in closed:
+                continue
+            closed.add(current)
+            self.nodes_expanded += 1
+            if current == target:
+                break
+            reverse_d = current_d + costs[current]
+            for offset in offsets:
+                n = current + offset
+                if blocked[n] or n in closed:
+                    continue
+                ny, nx = divmod(n, stride)
+                if not (x0 < nx <= x1 and y0 < ny <= y1):
+                    continue
+                new_d = reverse_d if reverse else current_d + costs[n]
+                if new_d < distance.get(n, INF):
+                    distance[n] = new_d
+                    parent[n] = current
+                    heapq.heappush(priority_queue, (new_d, n))
+        return distance, parent
+    
+    def sync(self):
+        """Rebuild the borders and clusters touched by cells changed since the last sync"""
+        grid = self.grid
+        changed = grid.changed_since(self.version)
+        self.version = grid.version
+        if not changed:
+            return
+        size = self.cluster_size
+        dirty_borders = set()
+        dirty_clusters = set()
+        for i in changed:
+            x, y = grid.coords(i)
+            cx, cy = x // size, y // size
+            dirty_clusters.add((cx, cy))
+            x0, y0, x1, y1 = self._bounds((cx, cy))
+            if x == x1 - 1 and cx + 1 < self.clusters_x:
+                dirty_borders.add(((cx, cy), (cx + 1, cy)))
+            if x == x0 and cx > 0:
+                dirty_borders.add(((cx - 1, cy), (cx, cy)))
+            if y == y1 - 1 and cy + 1 < self.clusters_y:
+                dirty_borders.add(((cx, cy), (cx, cy + 1)))
+            if y == y0 and cy > 0:
+                dirty_borders.add(((cx, cy - 1), (cx, cy)))
+        for first, second in dirty_borders:
+            self._build_border(first, second)
+            dirty_clusters.update((first, second))
+        for cluster in dirty_clusters:
+            self._build_cluster(cluster)
+    
+    def search(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        grid = self.grid
+        self.sync()
+        self.nodes_expanded = 0
+        if start == goal:
+            return [start]
+        start_i, goal_i = grid.index(*start), grid.index(*goal)
+        if grid.blocked[goal_i]:
+            return None
+        start_cluster, goal_cluster = self.cluster_of(start_i), self.cluster_of(goal_i)
+        
+        # Link start and goal into the abstract graph of their clusters
+        from_start, _ = self._cluster_search(start_i, start_cluster)
+        start_edges = [(v, from_start[v]) for v in self._cluster_nodes(start_cluster) if v in from_start]
+        if goal_i in from_start:
+            start_edges.append((goal_i, from_start[goal_i]))
+        to_goal, _ = self._cluster_search(goal_i, goal_cluster, reverse=True)
+        goal_edges = {u: to_goal[u] for u in self._cluster_nodes(goal_cluster) if u in to_goal}
+        
+        abstract = self._abstract_search(start_i, goal_i, start_edges, goal_edges)
+        if abstract is None:
+            return None
+        
+        path = [start]
+        for u, v in zip(abstract, abstract[1:]):
+            cluster = self.cluster_of(u)
+            if cluster != self.cluster_of(v):
+                path.append(grid.coords(v))
+                continue
+            _, parent = self._cluster_search(u, cluster, target=v)
+            leg = []
+            i = v
+            while i != u:
+                leg.append(grid.coords(i))
+                i = parent[i]
+            path.extend(reversed(leg))
+        return path
+    
+    def _abstract_search(self, start_i: int, goal_i: int, start_edges: List[Tuple[int, float]],
+                         goal_edges: Dict[int, float]) -> Optional[List[int]]:
+        grid = self.grid
+        costs, stride = grid.costs, grid.stride
+        goal_y, goal_x = divmod(goal_i, stride)
+        
+        def heuristic(index: int) -> float:
+            y, x = divmod(index, stride)
+            return (abs(x - goal_x) + abs(y - goal_y)) * MIN_STEP_COST
+        
+        g_cost = {start_i: 0}
+        parent = {start_i: start_i}
+        closed = set()
+        priority_queue = [(heuristic(start_i), 0, start_i)]
+        while priority_queue:
+            current_f, current_g, current = heapq.heappop(priority_queue)
+            self.nodes_expanded += 1
+            if current == goal_i:
+                path = [goal_i]
+                while parent[path[-1]] != path[-1]:
+                    path.append(parent[path[-1]])
+                path.reverse()
+                return path
+            if current in closed:
+                continue
+            closed.add(current)
+            
+            edges = list(start_edges) if current == start_i else []
+            edges.extend(self.intra[self.cluster_of(current)].get(current, ()))
+            edges.extend((n, costs[n]) for n in self.inter.get(current, ()))
+            if current in goal_edges:
+                edges.append((goal_i, goal_edges[current]))
+            for n, cost in edges:
+                if n in closed:
+                    continue
+                new_g = current_g + cost
+                if new_g < g_cost.get(n, INF):
+                    g_cost[n] = new_g
+                    parent[n] = current
+                    heapq.heappush(priority_queue, (new_g + heuristic(n), new_g, n))
+        return None
+
+class SearchStats:
+    """Counters and perf_counter phase timings for one search"""
+    
+    COUNTERS = ('pushes', 'pops', 'stale_pops', 'closed', 'heuristic_evals')
+    
+    def __init__(self, algorithm: str = ""):
+        self.algorithm = algorithm
+        self.found = False
+        self.pushes = 0
+        self.pops = 0
+        self.stale_pops = 0
+        self.peak_open = 0
+        self.closed = 0
+        self.heuristic_evals = 0
+        self.phases: Dict[str, float] = {}
+    
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+    
+    def finish(self, pops: int, pushes: int, peak_open: int, found: bool,
+               stale_pops: int = 0, heuristic_evals: int = 0) -> int:
+        """Store a search loop's final counts; returns the nodes expanded"""
+        self.pops = pops
+        self.pushes = pushes
+        self.stale_pops = stale_pops
+        self.peak_open = peak_open
+        self.closed = pops - stale_pops - found
+        self.heuristic_evals = heuristic_evals
+        self.found = found
+        return pops
+    
+    def add(self, other: 'SearchStats'):
+        """Fold another search's counts into this one"""
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.peak_open = max(self.peak_open, other.peak_open)
+        for name, seconds in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+    
+    def to_dict(self) -> Dict:
+        result = {'algorithm': self.algorithm, 'found': self.found, 'peak_open': self.peak_open}
+        for name in self.COUNTERS:
+            result[name] = getattr(self, name)
+        result['phases'] = dict(self.phases)
+        return result
+
+class MetricsRegistry:
+    """Per-algorithm aggregate of SearchStats, dumpable as JSON"""
+    
+    def __init__(self):
+        self.algorithms: Dict[str, Dict] = {}
+    
+    def record(self, stats: SearchStats):
+        entry = self.algorithms.get(stats.algorithm)
+        if entry is None:
+            entry = self.algorithms[stats.algorithm] = {
+                'searches': 0, 'found': 0, 'peak_open': 0, 'phases': {}, 'max_phases': {},
+                **{name: 0 for name in SearchStats.COUNTERS}}
+        entry['searches'] += 1
+        entry['found'] += int(stats.found)
+        entry['peak_open'] = max(entry['peak_open'], stats.peak_open)
+        for name in SearchStats.COUNTERS:
+            entry[name] += getattr(stats, name)
+        for name, seconds in stats.phases.items():
+            entry['phases'][name] = entry['phases'].get(name, 0.0) + seconds
+            entry['max_phases'][name] = max(entry['max_phases'].get(name, 0.0), seconds)
+    
+    def snapshot(self) -> Dict[str, Dict]:
+        return copy.deepcopy(self.algorithms)
+    
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.algorithms, indent=indent, sort_keys=True)
+    
+    def dump(self, path: str):
+        with open(path, 'w') as f:
+            f.write(self.to_json())
+    
+    def reset(self):
+        self.algorithms.clear()
+
+class AnytimeSolution(NamedTuple):
+    cost: float
+    bound: float          # cost is at most bound times the optimum
+    seconds: float        # since the search started
+    nodes_expanded: int   # so far, over every round
+
+class MultiStopRoute(NamedTuple):
+    path: List[Tuple[int, int]]
+    order: List[int]          # indices into the stops, in visiting order
+    cost: float
+    unreachable: List[int]    # stops left out because no route reaches them
+
+def _tour_cost(matrix: List[List[float]], tour: List[int]) -> float:
+    return sum(matrix[a][b] for a, b in zip(tour, tour[1:]))
+
+def order_stops(matrix: List[List[float]], stops: List[int], return_to_start: bool = False,
+                max_passes: int = 100) -> List[int]:
+    """Visiting order for stops, which index matrix rows; row 0 is the start.
+    
+    Builds a nearest-neighbour tour from the start, then improves it with
+    2-opt segment reversals and Or-opt moves of one to three stops until no
+    move helps. The matrix may be asymmetric: reversal costs are summed in
+    the reversed direction using prefix sums.
+    """
+    remaining = set(stops)
+    tour = [0]
+    while remaining:
+        last = tour[-1]
+        nearest = min(remaining, key=lambda stop: (matrix[last][stop], stop))
+        tour.append(nearest)
+        remaining.remove(nearest)
+    if return_to_start:
+        tour.append(0)
+    # The start, and the return to it, stay fixed at the ends
+    last_movable = len(tour) - 2 if return_to_start else len(tour) - 1
+    
+    def edge(a: int, b: int) -> float:
+        return matrix[tour[a]][tour[b]] if b < len(tour) else 0
+    
+    for _ in range(max_passes):
+        improved = False
+        forward = [0.0]
+        backward = [0.0]
+        for a, b in zip(tour, tour[1:]):
+            forward.append(forward[-1] + matrix[a][b])
+            backward.append(backward[-1] + matrix[b][a])
+        
+        # 2-opt: reverse tour[i..j]
+        for i in range(1, last_movable):
+            for j in range(i + 1, last_movable + 1):
+                before = edge(i - 1, i) + forward[j] - forward[i] + edge(j, j + 1)
+                after = (matrix[tour[i - 1]][tour[j]] + backward[j] - backward[i] +
+                         (matrix[tour[i]][tour[j + 1]] if j + 1 < len(tour) else 0))
+                if after < before - 1e-9:
+                    tour[i:j + 1] = reversed(tour[i:j + 1])
+                    improved = True
+                    break
+            if improved:
+                break
+        if improved:
+            continue
         
-        # Wait for user to close window
-        waiting = True
-        while waiting:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    waiting = False
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        waiting = False
-        pygame.quit()
+        # Or-opt: move tour[i..e] to sit between tour[k] and tour[k + 1]
+        for length in (1, 2, 3):
+            for i in range(1, last_movable - length + 2):
+                e = i + length - 1
+                removed = edge(i - 1, i) + edge(e, e + 1) - edge(i - 1, e + 1)
+                for k in range(0, last_movable + 1):
+                    if i - 1 <= k <= e:
+                        continue
+                    added = matrix[tour[k]][tour[i]] + edge(e, k + 1) - edge(k, k + 1)
+                    if added < removed - 1e-9:
+                        segment = tour[i:e + 1]
+                        del tour[i:e + 1]
+                        k = k if k < i else k - length
+                        tour[k + 1:k + 1] = segment
+                        improved = True
+                        break
+                if improved:
+                    break
+            if improved:
+                break
+        if not improved:
+            break
+    
+    return tour[1:last_movable + 1]
 
 class DeliveryAgent:
-    def __init__(self, grid: Grid):
+    def __init__(self, grid: Grid, metrics: Optional[MetricsRegistry] = None):
         self.grid = grid
         self.position = (0, 0)
         self.path = []
         self.nodes_expanded = 0
         self.total_cost = 0
+        self.goal_fields: 'OrderedDict[Tuple[int, int], CostToGoField]' = OrderedDict()
+        self.route_cache = RouteCache()
+        self.dstar: Optional[DStarLite] = None
+        self.hpa: Optional[HierarchicalPlanner] = None
+        # Limits for the anytime planner, and the bound of the last
+        # weighted or anytime route
+        self.deadline: Optional[float] = None
+        self.node_budget: Optional[int] = None
+        self.suboptimality_bound = 1.0
+        self.anytime_solutions: List[AnytimeSolution] = []
+        # UCS and A* use a bucket queue instead of a heap where costs allow
+        self.bucket_queue = True
+        # Instrumentation: stats of the last search, aggregates over every
+        # planned route, and optional hooks called with (x, y) on expand/push
+        self.stats = SearchStats()
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.on_expand: Optional[Callable[[Tuple[int, int]], None]] = None
+        self.on_push: Optional[Callable[[Tuple[int, int]], None]] = None
     
     def set_position(self, x: int, y: int):
         if self.grid.is_valid_position(x, y):
@@ -257,101 +2164,847 @@ class DeliveryAgent:
     def manhattan_distance(self, pos1: Tuple[int, int], pos2: Tuple[int, int]) -> int:
         return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
     
+    def _reconstruct_path(self, parent: array, goal_index: int) -> List[Tuple[int, int]]:
+        """Walk predecessor indices back from the goal; the start is its own parent"""
+        coords = self.grid.coords
+        path = [coords(goal_index)]
+        i = goal_index
+        while parent[i] != i:
+            i = parent[i]
+            path.append(coords(i))
+        path.reverse()
+        return path
+    
+    def _best_first_search(self, start: Tuple[int, int], goal: Tuple[int, int],
+                           heuristic: Optional[Callable[[int], float]] = None,
+                           algorithm: str = "ucs", integral: bool = False) -> Optional[List[Tuple[int, int]]]:
+        """Shared UCS / A* core over grid indices.
+        
+        Queue entries are (f, g, index) and predecessors live in a flat array,
+        so nothing proportional to the path length is copied per push. A
+        node is pushed again only when its g-cost improves; the stale entries
+        this leaves behind are skipped on pop but still count as expansions.
+        
+        integral says the heuristic is consistent and returns integers; with
+        it (or no heuristic) the search runs on a bucket queue instead, see
+        _bucket_search. Step costs are one-byte terrain values, so always
+        integers; weighted heuristics are what keep a search on the heap.
+        """
+        if self.bucket_queue and (integral or heuristic is None):
+            return self._bucket_search(start, goal, heuristic, algorithm)
+        stats = self.stats = SearchStats(algorithm)
+        grid = self.grid
+        costs, blocked, offsets, coords = grid.costs, grid.blocked, grid.offsets, grid.coords
+        on_expand, on_push = self.on_expand, self.on_push
+        
+        with stats.phase('setup'):
+            size = len(costs)
+            start_i, goal_i = grid.index(*start), grid.index(*goal)
+            g_cost = array('d', [INF]) * size
+            parent = array('q', [-1]) * size
+            closed = bytearray(size)
+            g_cost[start_i] = 0
+            parent[start_i] = start_i
+            priority_queue = [(heuristic(start_i) if heuristic else 0, 0, start_i)]
+        
+        found = False
+        pops = pushes = stale_pops = 0
+        peak_open = 1
+        with stats.phase('search'):
+            while priority_queue:
+                current_f, current_g, current = heapq.heappop(priority_queue)
+                pops += 1
+                
+                if current == goal_i:
+                    found = True
+                    break
+                
+                if closed[current]:
+                    stale_pops += 1
+                    continue
+                closed[current] = 1
+                if on_expand is not None:
+                    on_expand(coords(current))
+                
+                for offset in offsets:
+                    n = current + offset
+                    if blocked[n] or closed[n]:
+                        continue
+                    new_g = current_g + costs[n]
+                    
+                    if new_g < g_cost[n]:
+                        g_cost[n] = new_g
+                        parent[n] = current
+                        f = new_g + heuristic(n) if heuristic else new_g
+                        heapq.heappush(priority_queue, (f, new_g, n))
+                        pushes += 1
+                        if on_push is not None:
+                            on_push(coords(n))
+                if len(priority_queue) > peak_open:
+                    peak_open = len(priority_queue)
+        
+        self.nodes_expanded = stats.finish(pops, pushes, peak_open, found, stale_pops,
+                                           pushes + 1 if heuristic else 0)
+        if not found:
+            return None
+        with stats.phase('reconstruct'):
+            return self._reconstruct_path(parent, goal_i)
+    
+    def _bucket_search(self, start: Tuple[int, int], goal: Tuple[int, int],
+                       heuristic: Optional[Callable[[int], int]], algorithm: str) -> Optional[List[Tuple[int, int]]]:
+        """_best_first_search over a monotone bucket queue (Dial's algorithm).
+        
+        With integer step costs and a consistent integer heuristic, f never
+        decreases from one pop to the next and grows by less than
+        BUCKET_QUEUE_SPAN in a step, so the open list can be a ring of lists
+        indexed by f: a push is an append, a pop takes from the lowest
+        non-empty bucket, and no entries are ever compared. Ties on f pop
+        newest first rather than by g, so among equal-cost routes the one
+        returned may differ from the heap's.
+        """
+        stats = self.stats = SearchStats(algorithm)
+        grid = self.grid
+        costs, blocked, offsets, coords = grid.costs, grid.blocked, grid.offsets, grid.coords
+        on_expand, on_push = self.on_expand, self.on_push
+        mask = BUCKET_QUEUE_SPAN - 1
+        
+        with stats.phase('setup'):
+            size = len(costs)
+            start_i, goal_i = grid.index(*start), grid.index(*goal)
+            unreached = 1 << 62
+            g_cost = array('q', [unreached]) * size
+            parent = array('q', [-1]) * size
+            closed = bytearray(size)
+            g_cost[start_i] = 0
+            parent[start_i] = start_i
+            buckets: List[List[int]] = [[] for _ in range(BUCKET_QUEUE_SPAN)]
+            current_f = heuristic(start_i) if heuristic else 0
+            buckets[current_f & mask].append(start_i)
+            open_count = 1
+        
+        found = False
+        pops = pushes = stale_pops = 0
+        peak_open = 1
+        with stats.phase('search'):
+            while open_count:
+                bucket = buckets[current_f & mask]
+                while not bucket:
+                    current_f += 1
+                    bucket = buckets[current_f & mask]
+                current = bucket.pop()
+                open_count -= 1
+                pops += 1
+                
+                if current == goal_i:
+                    found = True
+                    break
+                
+                if closed[current]:
+                    stale_pops += 1
+                    continue
+                closed[current] = 1
+                if on_expand is not None:
+                    on_expand(coords(current))
+                
+                current_g = g_cost[current]
+                for offset in offsets:
+                    n = current + offset
+                    if blocked[n] or closed[n]:
+                        continue
+                    new_g = current_g + costs[n]
+                    
+                    if new_g < g_cost[n]:
+                        g_cost[n] = new_g
+                        parent[n] = current
+                        f = new_g + heuristic(n) if heuristic else new_g
+                        if f < current_f:
+                            # Only an inconsistent heuristic gets here; expand it next
+                            f = current_f
+                        buckets[f & mask].append(n)
+                        open_count += 1
+                        pushes += 1
+                        if on_push is not None:
+                            on_push(coords(n))
+                if open_count > peak_open:
+                    peak_open = open_count
+        
+        self.nodes_expanded = stats.finish(pops, pushes, peak_open, found, stale_pops,
+                                           pushes + 1 if heuristic else 0)
+        if not found:
+            return None
+        with stats.phase('reconstruct'):
+            return self._reconstruct_path(parent, goal_i)
+    
+    def _manhattan_heuristic(self, goal: Tuple[int, int]) -> Callable[[int], int]:
+        """Manhattan distance to goal as a function of grid index"""
+        stride = self.grid.stride
+        goal_y, goal_x = divmod(self.grid.index(*goal), stride)
+        
+        def heuristic(index: int) -> int:
+            y, x = divmod(index, stride)
+            return abs(x - goal_x) + abs(y - goal_y)
+        
+        return heuristic
+    
     def bfs(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
         """Breadth-First Search"""
         if start == goal:
             return [start]
         
-        queue = [(start, [start])]
-        visited = set([start])
-        self.nodes_expanded = 0
+        stats = self.stats = SearchStats("bfs")
+        grid = self.grid
+        blocked, offsets, coords = grid.blocked, grid.offsets, grid.coords
+        on_expand, on_push = self.on_expand, self.on_push
         
-        while queue:
-            current, path = queue.pop(0)
-            self.nodes_expanded += 1
-            
-            if current == goal:
-                return path
-            
-            for nx, ny, cost in self.grid.get_neighbors(*current):
-                if (nx, ny) not in visited:
-                    visited.add((nx, ny))
-                    queue.append(((nx, ny), path + [(nx, ny)]))
+        with stats.phase('setup'):
+            start_i, goal_i = grid.index(*start), grid.index(*goal)
+            parent = array('q', [-1]) * len(blocked)
+            parent[start_i] = start_i
+            queue = deque([start_i])
         
-        return None
+        found = False
+        pops = pushes = 0
+        peak_open = 1
+        with stats.phase('search'):
+            while queue:
+                current = queue.popleft()
+                pops += 1
+                
+                if current == goal_i:
+                    found = True
+                    break
+                if on_expand is not None:
+                    on_expand(coords(current))
+                
+                for offset in offsets:
+                    n = current + offset
+                    if not blocked[n] and parent[n] < 0:
+                        parent[n] = current
+                        queue.append(n)
+                        pushes += 1
+                        if on_push is not None:
+                            on_push(coords(n))
+                if len(queue) > peak_open:
+                    peak_open = len(queue)
+        
+        self.nodes_expanded = stats.finish(pops, pushes, peak_open, found)
+        if not found:
+            return None
+        with stats.phase('reconstruct'):
+            return self._reconstruct_path(parent, goal_i)
     
     def uniform_cost_search(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
         """Uniform Cost Search"""
         if start == goal:
             return [start]
+        return self._best_first_search(start, goal, algorithm="ucs")
+    
+    def a_star_search(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        """A* Search with Manhattan distance heuristic"""
+        if start == goal:
+            return [start]
+        return self._best_first_search(start, goal, self._manhattan_heuristic(goal), "astar", integral=True)
+    
+    def alt_search(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        """A* with ALT landmark heuristics.
         
-        priority_queue = [(0, start, [start])]
-        visited = set()
-        self.nodes_expanded = 0
+        Landmark tables are built on the grid the first time and shared by
+        every agent on it, so the first search pays for them. The bounds
+        track real terrain costs, so on weighted maps this expands far fewer
+        nodes than Manhattan A* and still finds optimal routes.
+        """
+        if start == goal:
+            return [start]
+        heuristic = self.grid.landmark_tables().heuristic(start, goal)
+        return self._best_first_search(start, goal, heuristic, "alt", integral=True)
+    
+    def jump_point_search(self, start: Tuple[int, int], goal: Tuple[int, int],
+                          ignore_costs: bool = False) -> Optional[List[Tuple[int, int]]]:
+        """Jump Point Search for the 4-connected grid.
         
-        while priority_queue:
-            current_cost, current, path = heapq.heappop(priority_queue)
-            self.nodes_expanded += 1
+        Inside areas of uniform terrain, straight runs of cells are scanned
+        without being queued, and only jump points are expanded: cells next
+        to a forced neighbour, and cells where the terrain cost changes,
+        which are expanded in full. Other terrain counts as a wall when
+        looking for forced neighbours. Routes cost the same as UCS's with far
+        fewer expansions on open maps. With ignore_costs every open cell
+        counts as uniform and the route has as few steps as BFS's.
+        """
+        if start == goal:
+            return [start]
+        grid = self.grid
+        blocked, offsets, stride = grid.blocked, grid.offsets, grid.stride
+        costs = bytes(len(blocked)) if ignore_costs else grid.costs
+        goal_i = grid.index(*goal)
+        
+        def uniform(n: int) -> bool:
+            return _uniform_cell(costs, blocked, offsets, n)
+        
+        def horizontal(n: int, d: int) -> int:
+            # uniform() and the forced neighbour checks inlined, as this is
+            # where JPS spends its time
+            if blocked[n]:
+                return -1
+            cost = costs[n]
+            behind = n - d
+            if not blocked[behind] and costs[behind] != cost:
+                return n
+            while True:
+                if n == goal_i:
+                    return n
+                up, down, ahead = n - stride, n + stride, n + d
+                if not blocked[up]:
+                    if costs[up] != cost or blocked[up - d] or costs[up - d] != cost:
+                        return n
+                if not blocked[down]:
+                    if costs[down] != cost or blocked[down - d] or costs[down - d] != cost:
+                        return n
+                if blocked[ahead]:
+                    return -1
+                if costs[ahead] != cost:
+                    return n
+                n = ahead
+        
+        def jump(current: int, d: int) -> int:
+            n = current + d
+            if d == 1 or d == -1:
+                return horizontal(n, d)
+            while True:
+                if blocked[n]:
+                    return -1
+                if n == goal_i or not uniform(n):
+                    return n
+                cost = costs[n]
+                b = n - d - 1
+                if not blocked[n - 1] and (blocked[b] or costs[b] != cost):
+                    return n
+                b = n - d + 1
+                if not blocked[n + 1] and (blocked[b] or costs[b] != cost):
+                    return n
+                if horizontal(n + 1, 1) >= 0 or horizontal(n - 1, -1) >= 0:
+                    return n
+                n += d
+        
+        return self._jump_search(start, goal, jump, uniform, ignore_costs,
+                                 "jps-bfs" if ignore_costs else "jps")
+    
+    def jps_plus_search(self, start: Tuple[int, int], goal: Tuple[int, int],
+                        ignore_costs: bool = False) -> Optional[List[Tuple[int, int]]]:
+        """JPS+: jump_point_search over precomputed jump distances.
+        
+        The grid's JumpTables are built on first use and after every change,
+        so this pays off on static maps, where each jump is a table lookup.
+        """
+        if start == goal:
+            return [start]
+        tables = self.grid.jump_tables(ignore_costs)
+        interior = tables.interior
+        return self._jump_search(start, goal, tables.jumper(self.grid.index(*goal)), interior.__getitem__,
+                                 ignore_costs, "jps+")
+    
+    def _jump_search(self, start: Tuple[int, int], goal: Tuple[int, int], jump: Callable[[int, int], int],
+                     uniform: Callable[[int], bool], ignore_costs: bool,
+                     algorithm: str) -> Optional[List[Tuple[int, int]]]:
+        """A* over jump points, shared by JPS and JPS+.
+        
+        A jump point reached by a jump in direction d is expanded towards d
+        and both sides only; the start and cells on terrain boundaries are
+        expanded in all four directions. A jump of k cells costs k steps,
+        or k times the cost of the cell it stops at, since the terrain is
+        the same all along it.
+        """
+        stats = self.stats = SearchStats(algorithm)
+        grid = self.grid
+        costs, offsets, stride = grid.costs, grid.offsets, grid.stride
+        step_cost = 1 if ignore_costs else MIN_STEP_COST
+        distance = self._manhattan_heuristic(goal)
+        on_expand, on_push = self.on_expand, self.on_push
+        
+        with stats.phase('setup'):
+            size = len(costs)
+            start_i, goal_i = grid.index(*start), grid.index(*goal)
+            g_cost = array('d', [INF]) * size
+            parent = array('q', [-1]) * size
+            closed = bytearray(size)
+            g_cost[start_i] = 0
+            parent[start_i] = start_i
+            priority_queue = [(distance(start_i) * step_cost, 0, start_i)]
+        
+        found = False
+        pops = pushes = stale_pops = 0
+        peak_open = 1
+        with stats.phase('search'):
+            while priority_queue:
+                current_f, current_g, current = heapq.heappop(priority_queue)
+                pops += 1
+                
+                if current == goal_i:
+                    found = True
+                    break
+                
+                if closed[current]:
+                    stale_pops += 1
+                    continue
+                closed[current] = 1
+                if on_expand is not None:
+                    on_expand(grid.coords(current))
+                
+                came_from = parent[current]
+                if came_from == current or not uniform(current):
+                    directions = offsets
+                else:
+                    d = _jump_direction(current, came_from, stride)
+                    directions = (d, stride, -stride) if d == 1 or d == -1 else (d, 1, -1)
+                for d in directions:
+                    n = jump(current, d)
+                    if n < 0 or closed[n]:
+                        continue
+                    steps = (n - current) // d
+                    new_g = current_g + (steps if ignore_costs else steps * costs[n])
+                    if new_g < g_cost[n]:
+                        g_cost[n] = new_g
+                        parent[n] = current
+                        heapq.heappush(priority_queue, (new_g + distance(n) * step_cost, new_g, n))
+                        pushes += 1
+                        if on_push is not None:
+                            on_push(grid.coords(n))
+                if len(priority_queue) > peak_open:
+                    peak_open = len(priority_queue)
+        
+        self.nodes_expanded = stats.finish(pops, pushes, peak_open, found, stale_pops, pushes + 1)
+        if not found:
+            return None
+        with stats.phase('reconstruct'):
+            # Fill in the straight runs between consecutive jump points
+            jump_points = [goal_i]
+            i = goal_i
+            while parent[i] != i:
+                i = parent[i]
+                jump_points.append(i)
+            jump_points.reverse()
+            coords = grid.coords
+            path = [coords(start_i)]
+            for a, b in zip(jump_points, jump_points[1:]):
+                d = _jump_direction(b, a, stride)
+                path.extend(coords(i) for i in range(a + d, b + d, d))
+            return path
+    
+    def weighted_a_star_search(self, start: Tuple[int, int], goal: Tuple[int, int],
+                               weight: float = WEIGHTED_ASTAR_WEIGHT) -> Optional[List[Tuple[int, int]]]:
+        """A* with the heuristic inflated by weight.
+        
+        Expands far fewer nodes than A* on open maps, and the route found
+        costs at most weight times the optimum.
+        """
+        self.suboptimality_bound = weight
+        if start == goal:
+            return [start]
+        heuristic = self._manhattan_heuristic(goal)
+        return self._best_first_search(start, goal, lambda i: weight * heuristic(i), "weighted")
+    
+    def anytime_a_star(self, start: Tuple[int, int], goal: Tuple[int, int],
+                       deadline: Optional[float] = None, node_budget: Optional[int] = None,
+                       initial_weight: float = ANYTIME_INITIAL_WEIGHT,
+                       weight_step: float = ANYTIME_WEIGHT_STEP) -> Optional[List[Tuple[int, int]]]:
+        """ARA*: a quick weighted A* route, improved until time or nodes run out.
+        
+        Each round searches with a smaller heuristic weight, reusing the
+        previous rounds' g-costs and re-expanding only the nodes whose cost
+        improved, until the weight reaches 1 and the route is optimal or the
+        deadline (seconds from the call) or node budget is used up. The
+        limits only cut short the improvement rounds: the first round always
+        runs to a route, or to proving there is none, so the call overruns a
+        deadline shorter than one weighted A* search on the map. The best
+        route found is returned; self.suboptimality_bound is the factor its
+        cost is guaranteed to be within of the optimum, and every route
+        found along the way is listed in self.anytime_solutions.
+        """
+        started = time.perf_counter()
+        self.anytime_solutions = []
+        self.suboptimality_bound = INF
+        if start == goal:
+            self.suboptimality_bound = 1.0
+            return [start]
+        
+        stats = self.stats = SearchStats("anytime")
+        grid = self.grid
+        costs, blocked, offsets = grid.costs, grid.blocked, grid.offsets
+        heuristic = self._manhattan_heuristic(goal)
+        size = len(costs)
+        start_i, goal_i = grid.index(*start), grid.index(*goal)
+        g_cost = array('d', [INF]) * size
+        parent = array('q', [-1]) * size
+        closed = array('i', [0]) * size  # round in which a node was last expanded
+        g_cost[start_i] = 0
+        parent[start_i] = start_i
+        open_nodes = [start_i]
+        inconsistent: Set[int] = set()
+        end_time = started + deadline if deadline is not None else INF
+        budget = node_budget if node_budget is not None else INF
+        weight = max(initial_weight, 1.0)
+        best_path = None
+        round_number = 0
+        
+        while True:
+            round_number += 1
+            # Re-key the open list for this round's weight
+            priority_queue = [(g_cost[i] + weight * heuristic(i), g_cost[i], i) for i in open_nodes]
+            priority_queue.extend((g_cost[i] + weight * heuristic(i), g_cost[i], i) for i in inconsistent)
+            heapq.heapify(priority_queue)
+            stats.heuristic_evals += len(priority_queue)
+            inconsistent = set()
             
-            if current == goal:
-                return path
+            exhausted = False
+            while priority_queue:
+                current_f, current_g, current = priority_queue[0]
+                if current_g != g_cost[current] or closed[current] == round_number:
+                    heapq.heappop(priority_queue)
+                    stats.stale_pops += 1
+                    continue
+                if g_cost[goal_i] <= current_f:
+                    break
+                # Without a route yet there is nothing to return, so the limits wait for one
+                if best_path is not None and (stats.pops >= budget or
+                                              (stats.pops & 127 == 0 and time.perf_counter() >= end_time)):
+                    exhausted = True
+                    break
+                heapq.heappop(priority_queue)
+                stats.pops += 1
+                closed[current] = round_number
+                
+                for offset in offsets:
+                    n = current + offset
+                    if blocked[n]:
+                        continue
+                    new_g = current_g + costs[n]
+                    if new_g < g_cost[n]:
+                        g_cost[n] = new_g
+                        parent[n] = current
+                        if closed[n] == round_number:
+                            inconsistent.add(n)
+                        else:
+                            heapq.heappush(priority_queue, (new_g + weight * heuristic(n), new_g, n))
+                            stats.pushes += 1
+                            stats.heuristic_evals += 1
+                stats.peak_open = max(stats.peak_open, len(priority_queue))
             
-            if current in visited:
-                continue
-            visited.add(current)
+            open_nodes = [i for _, g, i in priority_queue if g == g_cost[i] and closed[i] != round_number]
+            if exhausted or g_cost[goal_i] == INF:
+                break
             
-            for nx, ny, cost in self.grid.get_neighbors(*current):
-                if (nx, ny) not in visited:
-                    new_cost = current_cost + cost
-                    heapq.heappush(priority_queue, (new_cost, (nx, ny), path + [(nx, ny)]))
+            # Ancestors of the goal may have improved since its own g was set,
+            # so the route can be cheaper than g_cost[goal_i]
+            best_path = self._reconstruct_path(parent, goal_i)
+            cost = self.calculate_timed_path_cost(best_path)
+            # The bound actually proven can be tighter than the weight used
+            frontier = [g_cost[i] + heuristic(i) for i in open_nodes]
+            frontier.extend(g_cost[i] + heuristic(i) for i in inconsistent)
+            lower_bound = min(frontier, default=cost)
+            bound = max(1.0, min(weight, cost / lower_bound)) if lower_bound else 1.0
+            self.suboptimality_bound = bound
+            self.anytime_solutions.append(AnytimeSolution(cost, bound, time.perf_counter() - started, stats.pops))
+            if bound <= 1.0:
+                break
+            weight = max(1.0, min(weight - weight_step, bound))
+            open_nodes = list(set(open_nodes))
         
-        return None
+        stats.closed = stats.pops
+        self.nodes_expanded = stats.pops
+        return best_path
     
-    def a_star_search(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
-        """A* Search with Manhattan distance heuristic"""
+    def cost_to_go_search(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        """Route by following a goal-rooted cost-to-go field.
+        
+        The field is built once per goal and reused for any start until the
+        grid changes, which suits many deliveries ending at the same drop point.
+        nodes_expanded is the field build cost, or 0 when the field was reused.
+        """
+        self.nodes_expanded = 0
+        if start == goal:
+            return [start]
+        return self._goal_field(goal).path_from(self.grid, start)
+    
+    def _goal_field(self, goal: Tuple[int, int]) -> CostToGoField:
+        """The cached field for goal, rebuilt if the grid has changed; build cost adds to nodes_expanded.
+        
+        Fields built for an older grid are dropped, and the least recently
+        used ones beyond GOAL_FIELD_CACHE_CELLS are evicted.
+        """
+        goal_fields = self.goal_fields
+        field = goal_fields.get(goal)
+        if field is not None and field.is_current(self.grid):
+            goal_fields.move_to_end(goal)
+            return field
+        for stale in [key for key, cached in goal_fields.items() if not cached.is_current(self.grid)]:
+            del goal_fields[stale]
+        field = CostToGoField(self.grid, goal)
+        goal_fields[goal] = field
+        self.nodes_expanded += field.nodes_expanded
+        while len(goal_fields) > max(1, GOAL_FIELD_CACHE_CELLS // len(self.grid.costs)):
+            goal_fields.popitem(last=False)
+        return field
+    
+    def _stop_fields(self, points: List[Tuple[int, int]], to_first: bool) -> List[Optional[CostToGoField]]:
+        """Goal fields rooted at each point; None for points[0] unless routes lead back to it"""
+        return [self._goal_field(point) if k or to_first else None for k, point in enumerate(points)]
+    
+    def _field_cost_matrix(self, points: List[Tuple[int, int]],
+                           fields: List[Optional[CostToGoField]]) -> List[List[float]]:
+        grid = self.grid
+        return [[0 if a == b or field is None else field.cost_from(grid, a) for b, field in zip(points, fields)]
+                for a in points]
+    
+    def stop_cost_matrix(self, points: List[Tuple[int, int]], to_first: bool = True) -> List[List[float]]:
+        """matrix[a][b] is the cheapest route cost from points[a] to points[b].
+        
+        Each column comes from one reverse Dijkstra rooted at points[b],
+        shared with cost_to_go_search through goal_fields, so on an unchanged
+        grid later orders only pay for stops they have not seen before. For
+        tours that never go back to points[0], to_first=False skips its field
+        and leaves column 0 at 0.
+        """
+        return self._field_cost_matrix(points, self._stop_fields(points, to_first))
+    
+    def plan_multi_stop(self, start: Tuple[int, int], stops: List[Tuple[int, int]],
+                        return_to_start: bool = False) -> MultiStopRoute:
+        """One route from start through every reachable stop.
+        
+        Stops are ordered by order_stops over stop_cost_matrix and the legs
+        are chained from the goal fields, so no further searching is done.
+        nodes_expanded counts the field builds this call needed.
+        """
+        self.nodes_expanded = 0
+        grid = self.grid
+        points = [start] + list(stops)
+        # Kept here rather than looked up again, in case the cache evicts some
+        fields = self._stop_fields(points, return_to_start)
+        matrix = self._field_cost_matrix(points, fields)
+        reachable = [k for k in range(1, len(points))
+                     if matrix[0][k] < INF and (not return_to_start or matrix[k][0] < INF)]
+        reachable_set = set(reachable)
+        unreachable = [k - 1 for k in range(1, len(points)) if k not in reachable_set]
+        
+        tour = [0] + order_stops(matrix, reachable, return_to_start) + ([0] if return_to_start else [])
+        path = [start]
+        for a, b in zip(tour, tour[1:]):
+            if points[a] != points[b]:
+                path.extend(fields[b].path_from(grid, points[a])[1:])
+        return MultiStopRoute(path, [k - 1 for k in tour[1:len(tour) - return_to_start]],
+                              _tour_cost(matrix, tour), unreachable)
+    
+    def deliver_packages(self, stops: List[Tuple[int, int]], return_to_start: bool = False) -> bool:
+        """Deliver packages to every stop in one trip"""
+        print(f"Starting multi-stop delivery from {self.position} to {len(stops)} stops")
+        start_time = time.time()
+        route = self.plan_multi_stop(self.position, stops, return_to_start)
+        end_time = time.time()
+        
+        if route.unreachable:
+            print(f"Unreachable stops: {[stops[k] for k in route.unreachable]}")
+        if not route.order:
+            print("No path found!")
+            return False
+        
+        self.path = route.path
+        self.total_cost = route.cost
+        print(f"Stop order: {[stops[k] for k in route.order]}")
+        print(f"Path found! Cost: {self.total_cost}, Nodes expanded: {self.nodes_expanded}")
+        print(f"Time taken: {end_time - start_time:.4f} seconds")
+        print(f"Path length: {len(route.path)} steps")
+        return not route.unreachable
+    
+    def d_star_lite_replan(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        """Incremental replanning with D* Lite.
+        
+        The planner is kept between calls for the same goal, so each call only
+        repairs the search around cells that changed since the previous one.
+        """
+        if start == goal:
+            self.nodes_expanded = 0
+            return [start]
+        if self.dstar is None or self.dstar.goal != goal or self.dstar.grid is not self.grid:
+            self.dstar = DStarLite(self.grid, goal)
+        path = self.dstar.replan(start)
+        self.nodes_expanded = self.dstar.nodes_expanded
+        return path
+    
+    def _static_blocked(self) -> bytearray:
+        """The grid's blocked cells without the dynamic obstacles where they stand now"""
+        grid = self.grid
+        static_blocked = bytearray(grid.blocked)
+        for i in grid.occupancy_table().cells_at(grid.time_step):
+            static_blocked[i] = 0
+        return static_blocked
+    
+    def statically_reachable(self, start: Tuple[int, int], goal: Tuple[int, int],
+                             static_blocked: Optional[bytearray] = None) -> bool:
+        """Whether goal can be reached from start past the permanent obstacles.
+        
+        Dynamic obstacles are ignored, so this is a cheap necessary condition
+        for space_time_a_star to find a route: a BFS over the static map
+        rather than a search over every (cell, time) state.
+        """
+        grid = self.grid
+        if static_blocked is None:
+            static_blocked = self._static_blocked()
+        start_i, goal_i = grid.index(*start), grid.index(*goal)
+        if start_i == goal_i:
+            return True
+        if static_blocked[goal_i]:
+            return False
+        offsets = grid.offsets
+        seen = bytearray(static_blocked)
+        seen[start_i] = 1
+        frontier = deque([start_i])
+        while frontier:
+            current = frontier.popleft()
+            for offset in offsets:
+                n = current + offset
+                if not seen[n]:
+                    if n == goal_i:
+                        return True
+                    seen[n] = 1
+                    frontier.append(n)
+        return False
+    
+    def space_time_a_star(self, start: Tuple[int, int], goal: Tuple[int, int],
+                          moves_per_update: int = MOVES_PER_OBSTACLE_UPDATE,
+                          reservations: Optional['ReservationTable'] = None) -> Optional[List[Tuple[int, int]]]:
+        """A* over (cell, time) that avoids the dynamic obstacles' future positions.
+        
+        Step s of the returned route is where the agent is s moves from now,
+        with the obstacles having moved s // moves_per_update times. A repeated
+        cell is a wait, which costs that cell's terrain cost like a move would.
+        Obstacle positions are periodic, so times past the start of the cycle
+        are folded back into it and the (cell, time) state space stays finite.
+        
+        With a ReservationTable, cells and swaps reserved by other agents are
+        avoided too, and the goal only counts as reached once nobody else is
+        due to pass through it later.
+        
+        A goal walled off by permanent obstacles is reported straight away,
+        before the (cell, time) states are searched.
+        """
         if start == goal:
+            self.nodes_expanded = 0
             return [start]
         
-        # Priority queue: (f_cost, g_cost, position, path)
-        g_cost = {start: 0}
-        f_cost = {start: self.manhattan_distance(start, goal)}
-        priority_queue = [(f_cost[start], 0, start, [start])]
-        visited = set()
+        grid = self.grid
+        costs, blocked, offsets = grid.costs, grid.blocked, grid.offsets
+        table = grid.occupancy_table()
+        now = grid.time_step
+        static_blocked = self._static_blocked()
+        if not self.statically_reachable(start, goal, static_blocked):
+            self.stats = SearchStats("spacetime")
+            self.nodes_expanded = 0
+            return None
+        # Tick 0 is read from the grid itself, so never fold back onto it
+        fold_from = moves_per_update * max(table.cycle_start - (now - table.base_time), 1)
+        fold_period = moves_per_update * table.period
+        if reservations is not None:
+            # Reservations stop changing after their horizon, so fold only past it
+            fold_from = max(fold_from, reservations.horizon + 1)
+        
+        def fold(step: int) -> int:
+            if step < fold_from:
+                return step
+            return fold_from + (step - fold_from) % fold_period
+        
+        def blocked_at(i: int, step: int) -> bool:
+            if step < moves_per_update:
+                return bool(blocked[i])
+            return bool(static_blocked[i]) or table.is_occupied(i, now + step // moves_per_update)
+        
+        start_i, goal_i = grid.index(*start), grid.index(*goal)
+        heuristic = self._manhattan_heuristic(goal)
+        start_state = (start_i, 0)
+        g_cost = {start_state: 0}
+        parent = {start_state: None}
+        closed = set()
+        priority_queue = [(heuristic(start_i), 0, 0, start_i)]
+        stats = self.stats = SearchStats("spacetime")
+        stats.heuristic_evals = 1
         self.nodes_expanded = 0
         
         while priority_queue:
-            current_f, current_g, current, path = heapq.heappop(priority_queue)
+            current_f, current_g, step, current = heapq.heappop(priority_queue)
             self.nodes_expanded += 1
+            state = (current, fold(step))
             
-            if current == goal:
+            if current == goal_i and (reservations is None or not reservations.reserved_from(current, step)):
+                stats.pops = self.nodes_expanded
+                stats.closed = len(closed)
+                path = []
+                while state is not None:
+                    path.append(grid.coords(state[0]))
+                    state = parent[state]
+                path.reverse()
                 return path
             
-            if current in visited:
+            if state in closed:
+                stats.stale_pops += 1
                 continue
-            visited.add(current)
+            closed.add(state)
+            if self.on_expand is not None:
+                self.on_expand(grid.coords(current))
             
-            for nx, ny, cost in self.grid.get_neighbors(*current):
-                neighbor = (nx, ny)
-                new_g = current_g + cost
-                
-                if neighbor not in g_cost or new_g < g_cost[neighbor]:
-                    g_cost[neighbor] = new_g
-                    f_cost[neighbor] = new_g + self.manhattan_distance(neighbor, goal)
-                    heapq.heappush(priority_queue, (f_cost[neighbor], new_g, neighbor, path + [neighbor]))
+            next_step = step + 1
+            next_fold = fold(next_step)
+            # An obstacle stepping onto our cell as we step onto its cell is a swap
+            vacating = step // moves_per_update != next_step // moves_per_update and blocked_at(current, next_step)
+            for offset in offsets + (0,):
+                n = current + offset
+                if blocked_at(n, next_step):
+                    continue
+                if offset and vacating and blocked_at(n, step):
+                    continue
+                if reservations is not None and (reservations.is_reserved(n, next_step) or
+                                                 reservations.is_swap(current, n, next_step)):
+                    continue
+                next_state = (n, next_fold)
+                if next_state in closed:
+                    continue
+                new_g = current_g + costs[n]
+                if new_g < g_cost.get(next_state, INF):
+                    g_cost[next_state] = new_g
+                    parent[next_state] = state
+                    heapq.heappush(priority_queue, (new_g + heuristic(n) * MIN_STEP_COST, new_g, next_step, n))
+                    stats.pushes += 1
+                    stats.heuristic_evals += 1
+                    if self.on_push is not None:
+                        self.on_push(grid.coords(n))
+            stats.peak_open = max(stats.peak_open, len(priority_queue))
         
+        stats.pops = self.nodes_expanded
+        stats.closed = len(closed)
         return None
     
+    def hierarchical_search(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        """HPA* search; the cluster abstraction is built once and kept up to date"""
+        if self.hpa is None or self.hpa.grid is not self.grid:
+            self.hpa = HierarchicalPlanner(self.grid)
+        path = self.hpa.search(start, goal)
+        self.nodes_expanded = self.hpa.nodes_expanded
+        return path
+    
     def hill_climbing_replan(self, start: Tuple[int, int], goal: Tuple[int, int], max_restarts: int = 10) -> Optional[List[Tuple[int, int]]]:
         """Hill climbing with random restarts for dynamic replanning"""
         best_path = self.a_star_search(start, goal)
+        total = SearchStats("replan")
+        total.add(self.stats)
+        self.stats = total
         if not best_path:
             return None
         
         best_cost = self.calculate_path_cost(best_path)
         
+        # Restarts perturb an overlay, so the real grid is never copied or touched
+        temp_grid = self.grid.overlay()
+        temp_agent = DeliveryAgent(temp_grid, self.metrics)
+        temp_agent.on_expand, temp_agent.on_push = self.on_expand, self.on_push
         for _ in range(max_restarts):
             # Randomly modify the grid slightly (simulating dynamic changes)
-            temp_grid = copy.deepcopy(self.grid)
+            temp_grid.discard_changes()
             
             # Randomly change some terrain costs
             for _ in range(5):  # Change 5 random cells
@@ -360,8 +3013,8 @@ class DeliveryAgent:
                 temp_grid.set_terrain(x, y, new_terrain)
             
             # Try to find a new path
-            temp_agent = DeliveryAgent(temp_grid)
             new_path = temp_agent.a_star_search(start, goal)
+            total.add(temp_agent.stats)
             
             if new_path:
                 new_cost = self.calculate_path_cost(new_path)
@@ -369,8 +3022,66 @@ class DeliveryAgent:
                     best_path = new_path
                     best_cost = new_cost
         
+        # Count the restarts' searches too, not just the initial A*
+        self.nodes_expanded = total.pops
         return best_path
     
+    def plan_route(self, start: Tuple[int, int], goal: Tuple[int, int],
+                   algorithm: str = "astar") -> Optional[List[Tuple[int, int]]]:
+        """Run the named planner from start to goal without printing anything.
+        
+        The planner's SearchStats are left in self.stats, with a 'total' phase
+        covering the whole call, and recorded in self.metrics.
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown algorithm: {algorithm}")
+        self.stats = SearchStats(algorithm)
+        self.nodes_expanded = 0
+        started = time.perf_counter()
+        if algorithm == "bfs":
+            path = self.bfs(start, goal)
+        elif algorithm == "ucs":
+            path = self.uniform_cost_search(start, goal)
+        elif algorithm == "astar":
+            path = self.a_star_search(start, goal)
+        elif algorithm == "replan":
+            path = self.hill_climbing_replan(start, goal)
+        elif algorithm == "field":
+            path = self.cost_to_go_search(start, goal)
+        elif algorithm == "dstar":
+            path = self.d_star_lite_replan(start, goal)
+        elif algorithm == "spacetime":
+            path = self.space_time_a_star(start, goal)
+        elif algorithm == "weighted":
+            path = self.weighted_a_star_search(start, goal)
+        elif algorithm == "alt":
+            path = self.alt_search(start, goal)
+        elif algorithm == "anytime":
+            path = self.anytime_a_star(start, goal, self.deadline, self.node_budget)
+        elif algorithm == "jps":
+            path = self.jump_point_search(start, goal)
+        elif algorithm == "jps+":
+            path = self.jps_plus_search(start, goal)
+        elif algorithm == "jps-bfs":
+            path = self.jump_point_search(start, goal, ignore_costs=True)
+        else:
+            path = self.hierarchical_search(start, goal)
+        
+        stats = self.stats
+        stats.algorithm = algorithm
+        stats.found = path is not None
+        if not stats.pops:
+            # Planners without detailed counters still report their expansions
+            stats.pops = self.nodes_expanded
+        stats.phases['total'] = time.perf_counter() - started
+        self.metrics.record(stats)
+        return path
+    
+    def calculate_timed_path_cost(self, path: List[Tuple[int, int]]) -> float:
+        """Terrain cost of a timed route, ignoring the current obstacle snapshot"""
+        costs, index = self.grid.costs, self.grid.index
+        return sum(costs[index(x, y)] for x, y in path[1:])
+    
     def calculate_path_cost(self, path: List[Tuple[int, int]]) -> float:
         """Calculate the total cost of a path"""
         total_cost = 0
@@ -380,20 +3091,25 @@ class DeliveryAgent:
             total_cost += self.grid.get_cost(x2, y2)
         return total_cost
     
-    def deliver_package(self, goal: Tuple[int, int], algorithm: str = "astar") -> bool:
-        """Deliver a package to the goal using the specified algorithm"""
+    def deliver_package(self, goal: Tuple[int, int], algorithm: str = "astar", compare: bool = False) -> bool:
+        """Deliver a package to the goal using the specified algorithm.
+        
+        compare also runs A* from scratch, to report how many nodes a dstar
+        repair saved or how far an hpa route is from optimal; the planner's
+        nodes_expanded and stats are kept either way.
+        """
         print(f"Starting delivery from {self.position} to {goal} using {algorithm}")
         
         start_time = time.time()
         
-        if algorithm == "bfs":
-            path = self.bfs(self.position, goal)
-        elif algorithm == "ucs":
-            path = self.uniform_cost_search(self.position, goal)
-        elif algorithm == "astar":
-            path = self.a_star_search(self.position, goal)
-        elif algorithm == "replan":
-            path = self.hill_climbing_replan(self.position, goal)
+        path = None
+        if algorithm in CACHEABLE_ALGORITHMS:
+            path = self.route_cache.get(self.grid, self.position, goal, algorithm)
+        
+        if path is not None:
+            self.nodes_expanded = 0
+        elif algorithm in ALGORITHMS:
+            path = self.plan_route(self.position, goal, algorithm)
         else:
             print(f"Unknown algorithm: {algorithm}")
             return False
@@ -405,14 +3121,578 @@ class DeliveryAgent:
             return False
         
         self.path = path
-        self.total_cost = self.calculate_path_cost(path)
+        if algorithm == "spacetime":
+            self.total_cost = self.calculate_timed_path_cost(path)
+        else:
+            self.total_cost = self.calculate_path_cost(path)
+        if algorithm in CACHEABLE_ALGORITHMS:
+            # BFS is only beaten by routes with fewer steps
+            bound = len(path) - 1 if algorithm == "bfs" else self.total_cost
+            self.route_cache.put(self.grid, self.position, goal, algorithm, path, bound)
         
         print(f"Path found! Cost: {self.total_cost}, Nodes expanded: {self.nodes_expanded}")
         print(f"Time taken: {end_time - start_time:.4f} seconds")
         print(f"Path length: {len(path)} steps")
         
+        if compare and algorithm == "dstar":
+            repair_nodes, repair_stats = self.nodes_expanded, self.stats
+            self.a_star_search(self.position, goal)
+            print(f"Replan expanded {repair_nodes} nodes vs {self.nodes_expanded} for A* from scratch")
+            self.nodes_expanded, self.stats = repair_nodes, repair_stats
+        
+        if algorithm in ("weighted", "anytime"):
+            print(f"Cost is within {self.suboptimality_bound:.2f}x of optimal")
+        
+        if compare and algorithm == "hpa":
+            hpa_nodes, hpa_stats = self.nodes_expanded, self.stats
+            optimal = self.a_star_search(self.position, goal)
+            optimal_cost = self.calculate_path_cost(optimal)
+            gap = (self.total_cost - optimal_cost) / optimal_cost * 100 if optimal_cost else 0.0
+            print(f"Cost gap vs optimal A*: {gap:.1f}% ({self.total_cost} vs {optimal_cost})")
+            self.nodes_expanded, self.stats = hpa_nodes, hpa_stats
+        
         return True
 
+class BatchResult(NamedTuple):
+    path: Optional[List[Tuple[int, int]]]
+    cost: float
+    nodes_expanded: int
+    seconds: float
+
+# Planners that only read the static cost and obstacle arrays, so a worker can
+# run them on the shared-memory snapshot alone
+BATCH_ALGORITHMS = ("bfs", "ucs", "astar", "field")
+
+_batch_memory: Optional[shared_memory.SharedMemory] = None
+_batch_agent: Optional['DeliveryAgent'] = None
+
+def _init_batch_worker(memory_name: str, width: int, height: int):
+    global _batch_memory, _batch_agent
+    _batch_memory = shared_memory.SharedMemory(name=memory_name)
+    size = (width + 2) * (height + 2)
+    buffer = _batch_memory.buf
+    grid = Grid.from_buffers(width, height, buffer[:size], buffer[size:2 * size])
+    _batch_agent = DeliveryAgent(grid)
+
+def _run_batch_task(task: Tuple[int, Tuple[int, int], Tuple[int, int], str]) -> BatchResult:
+    global _batch_agent
+    version, start, goal, algorithm = task
+    if _batch_agent.grid.version != version:
+        # The parent refreshed the shared arrays; drop every per-grid cache
+        _batch_agent = DeliveryAgent(_batch_agent.grid)
+        _batch_agent.grid.version = version
+    agent = _batch_agent
+    started = time.perf_counter()
+    path = agent.plan_route(start, goal, algorithm)
+    seconds = time.perf_counter() - started
+    cost = agent.calculate_path_cost(path) if path else INF
+    return BatchResult(path, cost, agent.nodes_expanded, seconds)
+
+class BatchPlanner:
+    """Plans many independent deliveries on one Grid across a process pool.
+    
+    The grid's cost and obstacle arrays are copied into shared memory once,
+    and every worker builds a Grid directly over that memory, so tasks carry
+    only their start, goal and algorithm. If the grid has changed by the time
+    plan() is called, the shared arrays are refreshed in place. Use it as a
+    context manager, or call close() to stop the pool and free the memory.
+    """
+    
+    def __init__(self, grid: Grid, workers: Optional[int] = None):
+        self.grid = grid
+        self.workers = workers or os.cpu_count() or 1
+        size = len(grid.costs)
+        self.memory = shared_memory.SharedMemory(create=True, size=2 * size)
+        self.version = None
+        self._refresh()
+        self.pool = multiprocessing.Pool(self.workers, _init_batch_worker,
+                                         (self.memory.name, grid.width, grid.height))
+    
+    def _refresh(self):
+        if self.version == self.grid.version:
+            return
+        size = len(self.grid.costs)
+        self.memory.buf[:size] = _as_buffer(self.grid.costs)
+        self.memory.buf[size:2 * size] = _as_buffer(self.grid.blocked)
+        self.version = self.grid.version
+    
+    def plan(self, deliveries: List[Tuple[Tuple[int, int], Tuple[int, int]]],
+             algorithm: str = "astar") -> List[BatchResult]:
+        """Plan every (start, goal) pair; results come back in input order"""
+        if algorithm not in BATCH_ALGORITHMS:
+            raise ValueError(f"Algorithm {algorithm} cannot be batch planned; use one of {BATCH_ALGORITHMS}")
+        self._refresh()
+        # Keep deliveries to the same goal together so workers reuse goal fields
+        order = sorted(range(len(deliveries)), key=lambda i: deliveries[i][1])
+        tasks = [(self.version, deliveries[i][0], deliveries[i][1], algorithm) for i in order]
+        chunksize = max(1, len(tasks) // (self.workers * 4))
+        results: List[Optional[BatchResult]] = [None] * len(deliveries)
+        for i, result in zip(order, self.pool.imap(_run_batch_task, tasks, chunksize)):
+            results[i] = result
+        return results
+    
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.memory.close()
+        self.memory.unlink()
+    
+    def __enter__(self) -> 'BatchPlanner':
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ReservationTable:
+    """Space-time cells and moves claimed by agents that have already planned.
+    
+    Times are steps from the moment planning started. Each reserved route
+    holds its cell at every step, forbids head-on swaps along its moves,
+    and parks on its last cell from its arrival onwards. With a window, only
+    the first window steps of a route are reserved and nothing beyond the
+    window is treated as reserved, as in windowed hierarchical cooperative A*.
+    """
+    
+    def __init__(self, grid: Grid, window: Optional[int] = None):
+        self.grid = grid
+        self.window = window
+        self.cells: Dict[Tuple[int, int], int] = {}         # (index, step) -> agent
+        self.moves: Set[Tuple[int, int, int]] = set()       # (from, to, arrival step)
+        self.parked: Dict[int, int] = {}                    # index -> step parked from
+        self.last_step: Dict[int, int] = {}                 # index -> last reserved step
+        self.horizon = 0
+    
+    def reserve(self, path: List[Tuple[int, int]], agent_id: int):
+        index = self.grid.index
+        cells = [index(*pos) for pos in path]
+        last = len(cells) - 1
+        if self.window is not None:
+            last = min(last, self.window)
+        for step in range(last + 1):
+            i = cells[step]
+            self.cells[(i, step)] = agent_id
+            if step:
+                self.moves.add((cells[step - 1], i, step))
+            if self.last_step.get(i, -1) < step:
+                self.last_step[i] = step
+        if last == len(cells) - 1:
+            self.parked[cells[last]] = min(last, self.parked.get(cells[last], last))
+        self.horizon = max(self.horizon, last)
+    
+    def is_reserved(self, index: int, step: int) -> bool:
+        if self.window is not None and step > self.window:
+            return False
+        parked_from = self.parked.get(index)
+        return (index, step) in self.cells or (parked_from is not None and step >= parked_from)
+    
+    def is_swap(self, from_index: int, to_index: int, step: int) -> bool:
+        """Would moving from_index -> to_index at step cross another agent head on"""
+        return (to_index, from_index, step) in self.moves
+    
+    def reserved_from(self, index: int, step: int) -> bool:
+        """Is index reserved at step or at any later step"""
+        if self.window is not None and step > self.window:
+            return False
+        return self.last_step.get(index, -1) >= step or index in self.parked
+
+class Conflict(NamedTuple):
+    step: int
+    first: int
+    second: int
+    cell: Tuple[int, int]
+    other_cell: Optional[Tuple[int, int]] = None  # set for a swap between two cells
+
+class FleetPlan(NamedTuple):
+    paths: List[Optional[List[Tuple[int, int]]]]
+    seconds: List[float]          # planning time per agent in the final round
+    nodes_expanded: List[int]
+    order: List[int]              # final priority order, highest first
+    rounds: int
+    conflicts: List[Conflict]     # left unresolved after the last round
+    total_seconds: float
+
+def find_conflicts(paths: List[Optional[List[Tuple[int, int]]]],
+                   horizon: Optional[int] = None) -> List[Conflict]:
+    """Vertex and swap conflicts between timed routes.
+    
+    Agents stay on their last cell once their route ends, and an agent with
+    no route stays on its start cell if it has one to stay on.
+    """
+    routes = [(agent_id, path) for agent_id, path in enumerate(paths) if path]
+    if not routes:
+        return []
+    end = max(len(path) for _, path in routes)
+    if horizon is not None:
+        end = min(end, horizon + 1)
+    
+    conflicts = []
+    for step in range(end):
+        occupied: Dict[Tuple[int, int], int] = {}
+        moves: Dict[Tuple[Tuple[int, int], Tuple[int, int]], int] = {}
+        for agent_id, path in routes:
+            pos = path[min(step, len(path) - 1)]
+            other = occupied.setdefault(pos, agent_id)
+            if other != agent_id:
+                conflicts.append(Conflict(step, other, agent_id, pos))
+            if 0 < step < len(path) and path[step - 1] != pos:
+                previous = path[step - 1]
+                moves[(previous, pos)] = agent_id
+                other = moves.get((pos, previous))
+                if other is not None:
+                    conflicts.append(Conflict(step, other, agent_id, previous, pos))
+    return conflicts
+
+class FleetPlanner:
+    """Prioritized cooperative planning for many agents on one Grid.
+    
+    Agents plan one at a time in priority order with space_time_a_star, each
+    avoiding the dynamic obstacles and the routes reserved by the agents
+    before it. The finished plan is checked with find_conflicts; agents that
+    found no route or ran into a higher-priority agent are promoted to the
+    front and the fleet is planned again, up to max_rounds times. Agents whose
+    goal is walled off by permanent obstacles fail once, up front, and are
+    neither searched for nor promoted. With a
+    window, routes only reserve their first window steps and conflicts are
+    only checked that far, so the plan should be redone at least every
+    window steps.
+    """
+    
+    def __init__(self, grid: Grid, window: Optional[int] = None, max_rounds: int = 5,
+                 moves_per_update: int = MOVES_PER_OBSTACLE_UPDATE):
+        self.grid = grid
+        self.window = window
+        self.max_rounds = max_rounds
+        self.moves_per_update = moves_per_update
+        self.agent = DeliveryAgent(grid)
+    
+    def plan(self, deliveries: List[Tuple[Tuple[int, int], Tuple[int, int]]],
+             priorities: Optional[List[int]] = None) -> FleetPlan:
+        """Plan every (start, goal) pair; results come back in input order.
+        
+        priorities lists agent indices from highest to lowest priority and
+        defaults to the order of deliveries.
+        """
+        order = list(priorities) if priorities is not None else list(range(len(deliveries)))
+        agent = self.agent
+        started = time.perf_counter()
+        static_blocked = agent._static_blocked()
+        unreachable = {agent_id for agent_id, (start, goal) in enumerate(deliveries)
+                       if not agent.statically_reachable(start, goal, static_blocked)}
+        rounds = 0
+        while True:
+            rounds += 1
+            reservations = ReservationTable(self.grid, self.window)
+            paths: List[Optional[List[Tuple[int, int]]]] = [None] * len(deliveries)
+            seconds = [0.0] * len(deliveries)
+            nodes = [0] * len(deliveries)
+            for agent_id in order:
+                start, goal = deliveries[agent_id]
+                if agent_id in unreachable:
+                    reservations.reserve([start], agent_id)
+                    continue
+                agent_started = time.perf_counter()
+                path = agent.space_time_a_star(start, goal, self.moves_per_update, reservations)
+                seconds[agent_id] = time.perf_counter() - agent_started
+                nodes[agent_id] = agent.nodes_expanded
+                paths[agent_id] = path
+                # An agent without a route stays where it is
+                reservations.reserve(path or [start], agent_id)
+            
+            conflicts = find_conflicts(paths, self.window)
+            rank = {agent_id: position for position, agent_id in enumerate(order)}
+            promoted = {agent_id for agent_id in order if paths[agent_id] is None and agent_id not in unreachable}
+            promoted.update(max(conflict.first, conflict.second, key=rank.get) for conflict in conflicts)
+            if not promoted or rounds >= self.max_rounds:
+                break
+            order = [a for a in order if a in promoted] + [a for a in order if a not in promoted]
+        
+        return FleetPlan(paths, seconds, nodes, order, rounds, conflicts, time.perf_counter() - started)
+
+class SimulatedAgent:
+    """One delivery in a Simulation and its progress so far"""
+    
+    def __init__(self, agent: 'DeliveryAgent', goal: Tuple[int, int], algorithm: str):
+        self.agent = agent
+        self.goal = goal
+        self.algorithm = algorithm
+        self.path: List[Tuple[int, int]] = []
+        self.next_step = 1
+        self.steps = 0
+        self.cost = 0
+        self.replans = 0
+        self.delivered = False
+        self.delivered_at: Optional[int] = None
+
+class Simulation:
+    """Headless tick-based simulation of agents delivering on a shared Grid.
+    
+    Every tick moves each undelivered agent one cell along its route, with
+    the dynamic obstacles stepping every moves_per_update ticks as in
+    animate_path. An agent whose next cell is blocked replans from where it
+    stands, and waits in place if there is no route yet. Nothing sleeps and
+    nothing is drawn, so runs go as fast as the CPU allows.
+    """
+    
+    def __init__(self, grid: Grid, moves_per_update: int = MOVES_PER_OBSTACLE_UPDATE):
+        self.grid = grid
+        self.moves_per_update = moves_per_update
+        self.tick = 0
+        self.agents: List[SimulatedAgent] = []
+        self.metrics = MetricsRegistry()
+    
+    def add_agent(self, start: Tuple[int, int], goal: Tuple[int, int],
+                  algorithm: str = "astar") -> SimulatedAgent:
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown algorithm: {algorithm}")
+        agent = DeliveryAgent(self.grid, self.metrics)
+        agent.position = start
+        simulated = SimulatedAgent(agent, goal, algorithm)
+        simulated.delivered = start == goal
+        if not simulated.delivered:
+            self._replan(simulated)
+        self.agents.append(simulated)
+        return simulated
+    
+    def _replan(self, simulated: SimulatedAgent):
+        agent = simulated.agent
+        simulated.path = agent.plan_route(agent.position, simulated.goal, simulated.algorithm) or []
+        simulated.next_step = 1
+        simulated.replans += 1
+    
+    def step(self) -> bool:
+        """Advance one tick; returns False once every agent has delivered"""
+        self.tick += 1
+        grid = self.grid
+        if self.tick % self.moves_per_update == 0 and grid.obstacle_x:
+            grid.update_dynamic_obstacles()
+        
+        active = False
+        for simulated in self.agents:
+            if simulated.delivered:
+                continue
+            active = True
+            path = simulated.path
+            # Re-waiting on a cell is allowed even if an obstacle is passing
+            blocked_ahead = (simulated.next_step < len(path) and path[simulated.next_step] != path[simulated.next_step - 1]
+                             and not grid.is_valid_position(*path[simulated.next_step]))
+            if simulated.next_step >= len(path) or blocked_ahead:
+                self._replan(simulated)
+                path = simulated.path
+                if simulated.next_step >= len(path) or not grid.is_valid_position(*path[simulated.next_step]):
+                    continue
+            
+            position = path[simulated.next_step]
+            simulated.next_step += 1
+            simulated.agent.position = position
+            simulated.steps += 1
+            simulated.cost += grid.costs[grid.index(*position)]
+            if position == simulated.goal:
+                simulated.delivered = True
+                simulated.delivered_at = self.tick
+        return active and any(not simulated.delivered for simulated in self.agents)
+    
+    def run(self, max_ticks: int = 10000) -> Dict:
+        """Step until every agent has delivered or max_ticks is reached"""
+        started = time.perf_counter()
+        while self.tick < max_ticks and self.step():
+            pass
+        seconds = time.perf_counter() - started
+        return {
+            'ticks': self.tick,
+            'seconds': seconds,
+            'ticks_per_second': self.tick / seconds if seconds else INF,
+            'delivered': sum(simulated.delivered for simulated in self.agents),
+            'agents': len(self.agents),
+            'replans': sum(simulated.replans for simulated in self.agents),
+            'cost': sum(simulated.cost for simulated in self.agents),
+        }
+
+def _read_map_header(f, path: str) -> tuple:
+    header = f.read(MAP_HEADER.size)
+    if len(header) < MAP_HEADER.size or header[:4] != MAP_MAGIC:
+        raise ValueError(f"{path} is not a saved map")
+    fields = MAP_HEADER.unpack(header)
+    if fields[1] != MAP_FORMAT_VERSION:
+        raise ValueError(f"{path} uses map format {fields[1]}, expected {MAP_FORMAT_VERSION}")
+    return fields
+
+def _write_int_array(f, values):
+    values = array('i', values)
+    # Map files are little-endian whatever the machine is
+    if sys.byteorder == 'big':
+        values.byteswap()
+    f.write(values.tobytes())
+
+def _read_int_array(f, count: int) -> array:
+    values = array('i')
+    data = f.read(count * values.itemsize)
+    if len(data) != count * values.itemsize:
+        raise ValueError("Truncated map file")
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def _write_obstacles(f, xs, ys, pids, patterns):
+    for values in (xs, ys, pids):
+        _write_int_array(f, values)
+    for pattern in patterns:
+        _write_int_array(f, [len(pattern)] + [v for move in pattern for v in move])
+
+def _read_obstacles(f, obstacle_count: int, pattern_count: int):
+    xs, ys, pids = (_read_int_array(f, obstacle_count) for _ in range(3))
+    patterns = []
+    for _ in range(pattern_count):
+        moves = _read_int_array(f, 2 * _read_int_array(f, 1)[0])
+        patterns.append(tuple(zip(moves[::2], moves[1::2])))
+    return xs, ys, pids, patterns
+
+def _write_landmark_tables(f, landmarks: LandmarkTables):
+    _write_int_array(f, [len(landmarks.landmarks)] + landmarks.landmarks)
+    for table in landmarks.tables:
+        values = array(getattr(table, 'typecode', None) or table.format, table)
+        _write_int_array(f, [ord(values.typecode)])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        f.write(values.tobytes())
+
+def _read_landmark_tables(f, size: int, view: Optional[memoryview]) -> Tuple[List[int], list]:
+    """Landmarks and their tables; with a mapped file's view the tables are views into it too"""
+    count = _read_int_array(f, 1)[0]
+    landmarks = list(_read_int_array(f, count))
+    tables = []
+    for _ in range(count):
+        table = array(chr(_read_int_array(f, 1)[0]))
+        length = size * table.itemsize
+        if view is not None and sys.byteorder == 'little':
+            offset = f.tell()
+            tables.append(view[offset:offset + length].cast(table.typecode))
+            f.seek(offset + length)
+        else:
+            table.frombytes(f.read(length))
+            if sys.byteorder == 'big':
+                table.byteswap()
+            tables.append(table)
+    return landmarks, tables
+
+def _text_map_lines(path: str):
+    """(line number, line) for each line of a text map that is not blank or a comment"""
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if line and not line.startswith(';'):
+                yield number, line
+
+def _scan_text_map(path: str) -> Tuple[int, int, Dict[Tuple[int, int], List[Tuple[int, int]]]]:
+    """First pass over a text map: its width, height and dynamic obstacles"""
+    width, height = None, 0
+    obstacles = {}
+    for number, line in _text_map_lines(path):
+        if line.startswith('dynamic'):
+            fields = line.split()
+            try:
+                pattern = [tuple(int(v) for v in move.split(',')) for move in fields[3:]]
+                position = (int(fields[1]), int(fields[2]))
+            except (IndexError, ValueError):
+                pattern = []
+            if not pattern or any(len(move) != 2 for move in pattern):
+                raise ValueError(f"{path}:{number}: expected 'dynamic X Y DX,DY ...'")
+            obstacles[position] = pattern
+            continue
+        row_width = len(line.split()) if any(c.isspace() for c in line) else len(line)
+        if width is None:
+            width = row_width
+        elif row_width != width:
+            raise ValueError(f"{path}:{number}: row has {row_width} cells, expected {width}")
+        height += 1
+    if not height:
+        raise ValueError(f"{path} contains no map rows")
+    obstacles = {(x, y): pattern for (x, y), pattern in obstacles.items() if 0 <= x < width and 0 <= y < height}
+    return width, height, obstacles
+
+def _text_map_rows(path: str, width: int):
+    """Second pass over a text map: (costs, blocked) bytes for each row in order"""
+    road = Terrain.ROAD.value
+    for number, line in _text_map_lines(path):
+        if line.startswith('dynamic'):
+            continue
+        cells = line.split() if any(c.isspace() for c in line) else line
+        costs = bytearray(width)
+        blocked = bytearray(width)
+        for x, cell in enumerate(cells):
+            if cell == '#':
+                costs[x] = road
+                blocked[x] = 1
+            else:
+                terrain = TEXT_CELLS.get(cell)
+                if terrain is None:
+                    raise ValueError(f"{path}:{number}: unknown cell {cell!r}")
+                costs[x] = terrain.value
+        yield costs, blocked
+
+def read_text_map(path: str) -> Grid:
+    """Load a '#'-style text map.
+    
+    Each remaining line is one map row, either one character per cell or
+    whitespace-separated cells. '#' is an obstacle and '.' is road; any other
+    cell is a terrain cost (1, 2, 5, 10) or its letter (R, G, W, M). A line
+    'dynamic X Y DX,DY DX,DY ...' adds a dynamic obstacle with that movement
+    pattern. Blank lines and lines starting with ';' are skipped.
+    """
+    return Grid.from_text(path)
+
+def import_text_map(text_path: str, map_path: str):
+    """Convert a text map to the binary format one row at a time.
+    
+    Neither file is ever held in memory whole, so this works for maps far
+    larger than would fit in a Grid; open the result with Grid.load.
+    """
+    width, height, obstacles = _scan_text_map(text_path)
+    stride = width + 2
+    size = stride * (height + 2)
+    road = bytes([Terrain.ROAD.value])
+    border = bytes([1])
+    dynamic_rows: Dict[int, Set[int]] = {}
+    for x, y in obstacles:
+        dynamic_rows.setdefault(y, set()).add(x)
+    
+    with open(map_path, 'wb') as f:
+        f.write(MAP_HEADER.pack(MAP_MAGIC, MAP_FORMAT_VERSION, 0, width, height, 0, 0, 0))
+        # Extending the file zero-fills the planes without writing them out
+        f.truncate(MAP_HEADER.size + 3 * size)
+        f.write(road * stride)
+        f.seek(MAP_HEADER.size + size)
+        f.write(border * stride)
+        for y, (costs, blocked) in enumerate(_text_map_rows(text_path, width), 1):
+            # add_dynamic_obstacle leaves an obstacle's starting cell open
+            for x in dynamic_rows.get(y - 1, ()):
+                blocked[x] = 0
+            f.seek(MAP_HEADER.size + y * stride)
+            f.write(road + costs + road)
+            f.seek(MAP_HEADER.size + size + y * stride)
+            f.write(border + blocked + border)
+        f.seek(MAP_HEADER.size + (height + 1) * stride)
+        f.write(road * stride)
+        f.seek(MAP_HEADER.size + size + (height + 1) * stride)
+        f.write(border * stride)
+        
+        for y, row in dynamic_rows.items():
+            for x in row:
+                f.seek(MAP_HEADER.size + 2 * size + (y + 1) * stride + x + 1)
+                f.write(border)
+        patterns: Dict[Tuple[Tuple[int, int], ...], int] = {}
+        pids = [patterns.setdefault(tuple(pattern), len(patterns)) for pattern in obstacles.values()]
+        f.seek(MAP_HEADER.size + 3 * size)
+        _write_obstacles(f, [x for x, _ in obstacles], [y for _, y in obstacles], pids, list(patterns))
+        f.seek(0)
+        f.write(MAP_HEADER.pack(MAP_MAGIC, MAP_FORMAT_VERSION, 0, width, height, 0, len(obstacles), len(patterns)))
+
+def load_map(path: str) -> Grid:
+    """Open a map file: saved maps are memory-mapped, anything else is read as a text map"""
+    with open(path, 'rb') as f:
+        is_binary = f.read(len(MAP_MAGIC)) == MAP_MAGIC
+    return Grid.load(path) if is_binary else Grid.from_text(path)
+
 # Map creation functions
 def create_small_map() -> Grid:
     """Create a small test map"""
@@ -488,8 +3768,16 @@ def create_dynamic_map() -> Grid:
     
     return grid
 
+MAPS = {
+    "small": create_small_map,
+    "medium": create_medium_map,
+    "large": create_large_map,
+    "dynamic": create_dynamic_map,
+}
+
 def run_pygame_demo():
     """Run a demo with Pygame visualization"""
+    load_pygame()
     print("Delivery Agent Simulation - PyGame Visualization")
     print("=" * 50)
     
@@ -497,18 +3785,12 @@ def run_pygame_demo():
     print("Available maps: small, medium, large, dynamic")
     map_choice = input("Enter map choice: ").strip().lower() or "medium"
     
-    print("Available algorithms: bfs, ucs, astar, replan")
+    print(f"Available algorithms: {', '.join(ALGORITHMS)}")
     algo_choice = input("Enter algorithm choice: ").strip().lower() or "astar"
     
     # Create map
-    if map_choice == "small":
-        grid = create_small_map()
-    elif map_choice == "medium":
-        grid = create_medium_map()
-    elif map_choice == "large":
-        grid = create_large_map()
-    elif map_choice == "dynamic":
-        grid = create_dynamic_map()
+    if map_choice in MAPS:
+        grid = MAPS[map_choice]()
     else:
         print("Invalid choice! Using medium map.")
         grid = create_medium_map()
@@ -535,8 +3817,56 @@ def run_pygame_demo():
         pygame.time.delay(3000)
         pygame.quit()
 
-def main():
+def run_headless(map_name: str, algorithm: str, start: Optional[Tuple[int, int]],
+                 goal: Optional[Tuple[int, int]], max_ticks: int, visualize: bool) -> bool:
+    """Plan and simulate a single delivery without prompts"""
+    make_grid = MAPS[map_name] if map_name in MAPS else lambda: load_map(map_name)
+    grid = make_grid()
+    start = start or (0, 0)
+    goal = goal or (grid.width - 1, grid.height - 1)
+    
+    simulation = Simulation(grid)
+    simulated = simulation.add_agent(start, goal, algorithm)
+    planned_path = list(simulated.path)
+    summary = simulation.run(max_ticks)
+    
+    print(f"Map: {map_name}, algorithm: {algorithm}, {start} -> {goal}")
+    print(f"Delivered: {simulated.delivered} after {summary['ticks']} ticks, "
+          f"{simulated.steps} steps, cost {simulated.cost}, {simulated.replans} plan(s)")
+    print(f"Simulated {summary['ticks_per_second']:.0f} ticks/s")
+    
+    if visualize and planned_path:
+        # Replay the initial plan on a fresh copy of the map
+        grid = make_grid()
+        agent = DeliveryAgent(grid)
+        agent.position = start
+        agent.path = planned_path
+        agent.total_cost = agent.calculate_timed_path_cost(planned_path)
+        PygameVisualizer(grid).animate_path(agent, goal, planned_path, algorithm.upper())
+    return simulated.delivered
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Delivery Agent Simulation")
+    parser.add_argument('--map', help=f"run non-interactively on a built-in map ({', '.join(MAPS)}) "
+                                      f"or a saved or text map file")
+    parser.add_argument('--algorithm', choices=ALGORITHMS, default="astar")
+    parser.add_argument('--start', type=int, nargs=2, metavar=('X', 'Y'))
+    parser.add_argument('--goal', type=int, nargs=2, metavar=('X', 'Y'))
+    parser.add_argument('--max-ticks', type=int, default=10000)
+    parser.add_argument('--visualize', action='store_true', help="animate the planned route with pygame")
+    args = parser.parse_args(argv)
+    if args.map and args.map not in MAPS and not os.path.isfile(args.map):
+        parser.error(f"--map must be one of {', '.join(MAPS)} or an existing map file")
+    return args
+
+def main(argv: Optional[List[str]] = None):
     """Main function"""
+    args = parse_args(argv)
+    if args.map:
+        delivered = run_headless(args.map, args.algorithm, tuple(args.start) if args.start else None,
+                                 tuple(args.goal) if args.goal else None, args.max_ticks, args.visualize)
+        sys.exit(0 if delivered else 1)
+    
     print("Delivery Agent Simulation")
     print("=" * 30)
     
@@ -550,6 +3880,8 @@ def main():
         if choice == "1":
             try:
                 run_pygame_demo()
+            except ImportError:
+                print("Pygame is not installed; run with --map for headless mode.")
             except pygame.error as e:
                 print(f"Pygame error: {e}")
                 print("Make sure you have a graphical environment available.")
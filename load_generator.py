@@ -0,0 +1,137 @@
+"""Load generator for planning_service.py.
+
+Opens a number of connections to a running planning service, keeps a fixed
+number of requests in flight on each, and reports p50/p90/p99 latency and
+throughput. Queries are drawn from open cells the service reports for the
+map; a share of them repeat a small hot set, so concurrent duplicates
+exercise request coalescing.
+
+Example:
+    python load_generator.py --map large --requests 2000 --connections 8 --pipeline 4
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+
+from planning_service import DEFAULT_PORT
+
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, message: Dict) -> Dict:
+    writer.write(json.dumps(message).encode() + b'\n')
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+def make_queries(open_cells: List[Tuple[int, int]], count: int, hot_fraction: float, hot_set: int,
+                 seed: int) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+    rng = random.Random(seed)
+    hot = [tuple(rng.sample(open_cells, 2)) for _ in range(hot_set)]
+    return [rng.choice(hot) if rng.random() < hot_fraction else tuple(rng.sample(open_cells, 2))
+            for _ in range(count)]
+
+async def run_connection(host: str, port: int, queries: List[Tuple], pipeline: int, base: Dict,
+                         results: List[Dict]):
+    """Send queries over one connection with up to pipeline requests outstanding"""
+    reader, writer = await asyncio.open_connection(host, port)
+    sent_at: Dict[int, float] = {}
+    next_query = 0
+
+    def send(query_id: int):
+        start, goal = queries[query_id]
+        sent_at[query_id] = time.perf_counter()
+        writer.write(json.dumps({**base, 'id': query_id, 'start': start, 'goal': goal}).encode() + b'\n')
+
+    while next_query < min(pipeline, len(queries)):
+        send(next_query)
+        next_query += 1
+    await writer.drain()
+    for _ in range(len(queries)):
+        response = json.loads(await reader.readline())
+        response['latency'] = time.perf_counter() - sent_at.pop(response['id'])
+        results.append(response)
+        if next_query < len(queries):
+            send(next_query)
+            next_query += 1
+            await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def run(args: argparse.Namespace) -> Dict:
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    info = await request(reader, writer, {'op': 'info', 'map': args.map, 'seed': args.seed})
+    if not info['ok']:
+        raise SystemExit(info['error'])
+    before = await request(reader, writer, {'op': 'stats'})
+    open_cells = [tuple(cell) for cell in info['open_cells']]
+    queries = make_queries(open_cells, args.requests, args.hot_fraction, args.hot_set, args.seed)
+
+    base = {'map': args.map, 'algorithm': args.algorithm}
+    if args.deadline is not None:
+        base['deadline'] = args.deadline
+    shares = [queries[k::args.connections] for k in range(args.connections)]
+    results: List[Dict] = []
+    started = time.perf_counter()
+    await asyncio.gather(*(run_connection(args.host, args.port, share, args.pipeline, base, results)
+                           for share in shares if share))
+    seconds = time.perf_counter() - started
+
+    after = await request(reader, writer, {'op': 'stats'})
+    writer.close()
+    await writer.wait_closed()
+
+    latencies = [r['latency'] for r in results if r['ok']]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if not r['ok']:
+            errors[r['error']] = errors.get(r['error'], 0) + 1
+    return {
+        'requests': len(results),
+        'seconds': seconds,
+        'throughput': len(results) / seconds if seconds else 0.0,
+        'ok': len(latencies),
+        'p50': percentile(latencies, 0.50) if latencies else None,
+        'p90': percentile(latencies, 0.90) if latencies else None,
+        'p99': percentile(latencies, 0.99) if latencies else None,
+        'mean': statistics.mean(latencies) if latencies else None,
+        'coalesced': sum(1 for r in results if r.get('coalesced')),
+        'planned': after['planned'] - before['planned'],
+        'errors': errors,
+    }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Measure planning service latency and throughput")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--map', default='large')
+    parser.add_argument('--algorithm', default='astar')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--pipeline', type=int, default=4, help="requests in flight per connection")
+    parser.add_argument('--deadline', type=float, help="per-request deadline in seconds")
+    parser.add_argument('--hot-fraction', type=float, default=0.3,
+                        help="share of requests drawn from a small set of repeated queries")
+    parser.add_argument('--hot-set', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    summary = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{summary['requests']} requests in {summary['seconds']:.2f}s: {summary['throughput']:.0f} req/s")
+    if summary['ok']:
+        print(f"latency p50 {summary['p50'] * 1000:.2f} ms, p90 {summary['p90'] * 1000:.2f} ms, "
+              f"p99 {summary['p99'] * 1000:.2f} ms, mean {summary['mean'] * 1000:.2f} ms")
+    print(f"{summary['planned']} searches run, {summary['coalesced']} requests coalesced")
+    for error, count in sorted(summary['errors'].items()):
+        print(f"{count} x {error}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""Asyncio route planning service for the delivery agent.
+
+Clients connect over TCP and send newline-delimited JSON requests:
+
+    {"id": 1, "map": "large", "start": [0, 0], "goal": [14, 14], "algorithm": "astar", "deadline": 0.5}
+
+and get one JSON line back per request, matched by id and possibly out of
+order when requests are pipelined:
+
+    {"id": 1, "ok": true, "path": [[0, 0], ...], "cost": 68, "nodes_expanded": 89, ...}
+
+Maps are loaded once at startup, in the server and in every worker process,
+and each worker keeps one DeliveryAgent per map so goal fields, landmark
+tables and route caches stay warm between requests. Identical requests that
+arrive while one is already being planned share its result; for the anytime
+planner, whose route depends on the deadline, that includes the deadline.
+Searches run in a process pool. A deadline counts from when the server reads
+the request, time queued for a worker included; a request that misses it
+gets an error, and the search is dropped if no other request is waiting on
+it. Backpressure is
+twofold: each connection has a bounded number of requests in flight, after
+which the server stops reading from it, and once the pool's queue is full
+new requests are rejected as overloaded straight away.
+
+{"op": "info", "map": ...} returns the map's size and a sample of open cells,
+and {"op": "stats"} returns the server's counters.
+
+Example:
+    python planning_service.py --maps small large city=maps/city.map --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from deliveryagent import ALGORITHMS, CACHEABLE_ALGORITHMS, MAPS, DeliveryAgent, Grid, load_map
+
+DEFAULT_PORT = 8765
+INFO_SAMPLE_SIZE = 1000
+
+def parse_map_specs(specs: List[str]) -> Dict[str, str]:
+    """map id -> built-in map name or file path, from 'name' or 'id=path' arguments"""
+    maps = {}
+    for spec in specs:
+        map_id, _, source = spec.partition('=')
+        source = source or map_id
+        if source not in MAPS and not os.path.isfile(source):
+            raise ValueError(f"Map {source} is neither a built-in map ({', '.join(MAPS)}) nor a file")
+        maps[map_id] = source
+    return maps
+
+def load_maps(map_specs: Dict[str, str]) -> Dict[str, Grid]:
+    return {map_id: MAPS[source]() if source in MAPS else load_map(source)
+            for map_id, source in map_specs.items()}
+
+_worker_agents: Dict[str, DeliveryAgent] = {}
+
+def _init_worker(map_specs: Dict[str, str]):
+    global _worker_agents
+    _worker_agents = {map_id: DeliveryAgent(grid) for map_id, grid in load_maps(map_specs).items()}
+
+def _plan(map_id: str, start: Tuple[int, int], goal: Tuple[int, int], algorithm: str,
+          expires_at: Optional[float]) -> Dict:
+    agent = _worker_agents[map_id]
+    # expires_at is wall-clock time, so the time spent queued for a worker and
+    # in transit is taken off what the anytime planner gets to improve its route
+    agent.deadline = None if expires_at is None else max(0.0, expires_at - time.time())
+    started = time.perf_counter()
+    cacheable = algorithm in CACHEABLE_ALGORITHMS
+    path = agent.route_cache.get(agent.grid, start, goal, algorithm) if cacheable else None
+    if path is not None:
+        agent.nodes_expanded = 0
+    else:
+        path = agent.plan_route(start, goal, algorithm)
+        if path and cacheable:
+            bound = len(path) - 1 if algorithm == "bfs" else agent.calculate_path_cost(path)
+            agent.route_cache.put(agent.grid, start, goal, algorithm, path, bound)
+    seconds = time.perf_counter() - started
+    if path and algorithm == "spacetime":
+        cost = agent.calculate_timed_path_cost(path)
+    else:
+        cost = agent.calculate_path_cost(path) if path else None
+    return {'path': path, 'cost': cost, 'nodes_expanded': agent.nodes_expanded, 'plan_seconds': seconds,
+            'worker': os.getpid()}
+
+class Search:
+    """One search in the pool and the number of requests waiting on it"""
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.waiters = 0
+
+class PlanningService:
+    """Serves planning requests from a process pool over warm grids"""
+
+    def __init__(self, map_specs: Dict[str, str], workers: Optional[int] = None,
+                 max_queued: Optional[int] = None, max_per_connection: int = 32,
+                 default_deadline: Optional[float] = None):
+        self.map_specs = map_specs
+        self.grids = load_maps(map_specs)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queued = max_queued or self.workers * 8
+        self.max_per_connection = max_per_connection
+        self.default_deadline = default_deadline
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(map_specs,))
+        self.in_flight: Dict[Tuple, Search] = {}
+        self.stats = {'requests': 0, 'planned': 0, 'coalesced': 0, 'overloaded': 0,
+                      'deadline_exceeded': 0, 'errors': 0}
+
+    def _grid(self, request: Dict) -> Grid:
+        map_id = request.get('map')
+        if not isinstance(map_id, str) or map_id not in self.grids:
+            raise ValueError(f"Unknown map: {map_id}")
+        return self.grids[map_id]
+
+    def _validate(self, request: Dict) -> Tuple[Tuple, Optional[float]]:
+        """The search key and the deadline in seconds, or ValueError"""
+        grid = self._grid(request)
+        map_id = request['map']
+        algorithm = request.get('algorithm', 'astar')
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown algorithm: {algorithm}")
+        try:
+            start = tuple(int(v) for v in request['start'])
+            goal = tuple(int(v) for v in request['goal'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("start and goal must be [x, y] pairs")
+        if len(start) != 2 or len(goal) != 2 or not grid.in_bounds(*start) or not grid.in_bounds(*goal):
+            raise ValueError("start and goal must be [x, y] pairs inside the map")
+        deadline = request.get('deadline', self.default_deadline)
+        if deadline is not None and (isinstance(deadline, bool) or not isinstance(deadline, (int, float))
+                                     or not 0 < deadline < float('inf')):
+            raise ValueError("deadline must be a positive number of seconds")
+        return (map_id, start, goal, algorithm), deadline
+
+    async def plan(self, request: Dict) -> Dict:
+        self.stats['requests'] += 1
+        started = time.perf_counter()
+        try:
+            key, deadline = self._validate(request)
+        except ValueError as error:
+            self.stats['errors'] += 1
+            return {'ok': False, 'error': str(error)}
+        # Only the anytime planner's route depends on the deadline, so only
+        # its requests need the same deadline to share a search
+        search_key = key + (deadline,) if key[3] == "anytime" else key
+
+        search = self.in_flight.get(search_key)
+        coalesced = search is not None
+        if coalesced:
+            self.stats['coalesced'] += 1
+        elif len(self.in_flight) >= self.max_queued:
+            self.stats['overloaded'] += 1
+            return {'ok': False, 'error': 'overloaded'}
+        else:
+            loop = asyncio.get_running_loop()
+            expires_at = None if deadline is None else time.time() + deadline
+            search = Search(loop.run_in_executor(self.pool, _plan, *key, expires_at))
+            self.in_flight[search_key] = search
+            search.future.add_done_callback(lambda _, key=search_key, search=search: self._forget(key, search))
+            self.stats['planned'] += 1
+
+        search.waiters += 1
+        try:
+            # Shielded, so one request timing out leaves the search running for the others
+            result = await asyncio.wait_for(asyncio.shield(search.future), deadline)
+        except asyncio.TimeoutError:
+            self.stats['deadline_exceeded'] += 1
+            return {'ok': False, 'error': 'deadline exceeded'}
+        except Exception as error:
+            self.stats['errors'] += 1
+            return {'ok': False, 'error': f"{type(error).__name__}: {error}"}
+        finally:
+            search.waiters -= 1
+            if not search.waiters and not search.future.done():
+                # Nobody wants it any more; drop it if it has not started yet
+                search.future.cancel()
+                self._forget(search_key, search)
+        return {'ok': True, **result, 'coalesced': coalesced, 'seconds': time.perf_counter() - started}
+
+    def _forget(self, key: Tuple, search: Search):
+        if self.in_flight.get(key) is search:
+            del self.in_flight[key]
+
+    def info(self, request: Dict) -> Dict:
+        try:
+            grid = self._grid(request)
+        except ValueError as error:
+            return {'ok': False, 'error': str(error)}
+        seed = request.get('seed', 0)
+        if not isinstance(seed, (int, str)):
+            return {'ok': False, 'error': "seed must be an integer or a string"}
+        rng = random.Random(seed)
+        open_cells = []
+        for _ in range(INFO_SAMPLE_SIZE * 4):
+            x, y = rng.randrange(grid.width), rng.randrange(grid.height)
+            if grid.is_valid_position(x, y):
+                open_cells.append((x, y))
+                if len(open_cells) == INFO_SAMPLE_SIZE:
+                    break
+        return {'ok': True, 'width': grid.width, 'height': grid.height, 'open_cells': open_cells}
+
+    async def _respond(self, request: Dict, writer: asyncio.StreamWriter, lock: asyncio.Lock,
+                       slots: asyncio.Semaphore):
+        try:
+            op = request.get('op', 'plan')
+            if op == 'plan':
+                response = await self.plan(request)
+            elif op == 'info':
+                response = self.info(request)
+            elif op == 'stats':
+                response = {'ok': True, **self.stats, 'in_flight': len(self.in_flight)}
+            else:
+                response = {'ok': False, 'error': f"Unknown op: {op}"}
+        except Exception as error:
+            # Whatever goes wrong, the client gets an answer and the
+            # connection's other requests are unaffected
+            self.stats['errors'] += 1
+            response = {'ok': False, 'error': f"{type(error).__name__}: {error}"}
+        response['id'] = request.get('id')
+        try:
+            async with lock:
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            slots.release()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        lock = asyncio.Lock()
+        slots = asyncio.Semaphore(self.max_per_connection)
+        tasks = set()
+        try:
+            while True:
+                # Stop reading once this connection has too many requests in flight
+                await slots.acquire()
+                line = await reader.readline()
+                if not line:
+                    slots.release()
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+                except ValueError as error:
+                    self.stats['errors'] += 1
+                    writer.write(json.dumps({'ok': False, 'error': f"Bad request: {error}"}).encode() + b'\n')
+                    slots.release()
+                    continue
+                task = asyncio.create_task(self._respond(request, writer, lock, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except (ConnectionError, ValueError):
+            # ValueError: a line longer than the stream limit; drop the connection
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        # Start every worker and load its maps before accepting requests
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, time.sleep, 0.1) for _ in range(self.workers)))
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Serving maps {', '.join(self.grids)} on {host}:{port} with {self.workers} workers")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Route planning service for the delivery agent")
+    parser.add_argument('--maps', nargs='+', default=list(MAPS),
+                        help="built-in map names or id=path map files to keep loaded")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, help="planning processes (default: one per CPU)")
+    parser.add_argument('--max-queued', type=int, help="searches in flight before requests are rejected")
+    parser.add_argument('--max-per-connection', type=int, default=32,
+                        help="requests in flight per connection before the server stops reading it")
+    parser.add_argument('--deadline', type=float, help="default per-request deadline in seconds")
+    args = parser.parse_args(argv)
+
+    try:
+        map_specs = parse_map_specs(args.maps)
+    except ValueError as error:
+        parser.error(str(error))
+    service = PlanningService(map_specs, args.workers, args.max_queued, args.max_per_connection, args.deadline)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+if __name__ == "__main__":
+    main()
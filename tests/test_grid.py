@@ -0,0 +1,188 @@
+"""Grid storage: copy-on-write overlays and map files"""
+import random
+
+import pytest
+
+from deliveryagent import DeliveryAgent, Grid, Terrain, create_large_map, import_text_map, load_map
+
+def flatten(grid: Grid) -> Grid:
+    """A plain Grid holding a copy of grid's planes"""
+    return Grid.from_buffers(grid.width, grid.height, bytearray(bytes(grid.costs)), bytearray(bytes(grid.blocked)),
+                             bytearray(bytes(grid.dynamic)))
+
+def planes(grid: Grid):
+    return bytes(grid.costs), bytes(grid.blocked), bytes(grid.dynamic)
+
+def test_overlay_changes_stay_out_of_the_base():
+    base = create_large_map()
+    before, version = planes(base), base.version
+    overlay = base.overlay()
+    overlay.set_terrain(2, 2, Terrain.MOUNTAIN)
+    overlay.set_obstacle(4, 4)
+    overlay.grid[6][6].terrain = Terrain.WATER
+    overlay.grid[7][7].is_obstacle = True
+    assert planes(base) == before
+    assert overlay.get_terrain(2, 2) == Terrain.MOUNTAIN and overlay.get_terrain(6, 6) == Terrain.WATER
+    assert not overlay.is_valid_position(4, 4) and not overlay.is_valid_position(7, 7)
+    assert base.version == version
+
+def test_discard_changes_undoes_every_kind_of_write():
+    base = create_large_map()
+    overlay = base.overlay()
+    overlay.set_terrain(2, 2, Terrain.MOUNTAIN)
+    overlay.set_obstacle(4, 4)
+    overlay.grid[3][3].is_obstacle = True
+    overlay.grid[5][5].terrain = Terrain.WATER
+    overlay.grid[8][8].dynamic_obstacle = True
+    version = overlay.version
+    overlay.discard_changes()
+    assert planes(overlay) == planes(base)
+    assert not overlay.changes
+    assert set(overlay.changed_since(version)) == {overlay.index(*cell) for cell in
+                                                   [(2, 2), (4, 4), (3, 3), (5, 5), (8, 8)]}
+
+def test_base_changes_show_through_but_overlay_changes_win():
+    base = create_large_map()
+    overlay = base.overlay()
+    overlay.set_terrain(1, 1, Terrain.WATER)
+    version = overlay.version
+    base.set_terrain(1, 1, Terrain.MOUNTAIN)
+    base.set_terrain(9, 9, Terrain.MOUNTAIN)
+    base.set_obstacle(10, 10)
+    assert overlay.get_terrain(1, 1) == Terrain.WATER
+    assert overlay.get_terrain(9, 9) == Terrain.MOUNTAIN and not overlay.is_valid_position(10, 10)
+    assert set(overlay.changed_since(version)) == {overlay.index(9, 9), overlay.index(10, 10)}
+    overlay.discard_changes()
+    assert overlay.get_terrain(1, 1) == Terrain.MOUNTAIN
+
+def test_stacked_overlays():
+    base = create_large_map()
+    lower = base.overlay()
+    upper = lower.overlay()
+    lower.set_terrain(2, 2, Terrain.WATER)
+    upper.set_terrain(3, 3, Terrain.MOUNTAIN)
+    upper.set_obstacle(2, 2)
+    assert upper.get_terrain(2, 2) == Terrain.WATER and not upper.is_valid_position(2, 2)
+    assert lower.is_valid_position(2, 2) and lower.get_terrain(3, 3) == base.get_terrain(3, 3)
+    upper.discard_changes()
+    assert planes(upper) == planes(lower)
+    lower.discard_changes()
+    assert planes(upper) == planes(base)
+
+@pytest.mark.parametrize('seed', range(6))
+def test_searches_on_an_overlay_match_a_flat_copy(seed):
+    rng = random.Random(seed)
+    base = create_large_map()
+    overlay = base.overlay()
+    for _ in range(30):
+        x, y = rng.randrange(base.width), rng.randrange(base.height)
+        if rng.random() < 0.3:
+            overlay.set_obstacle(x, y)
+        else:
+            overlay.set_terrain(x, y, rng.choice(list(Terrain)))
+    flat = flatten(overlay)
+    cells = [(x, y) for y in range(flat.height) for x in range(flat.width) if flat.is_valid_position(x, y)]
+    for algorithm in ('bfs', 'ucs', 'astar', 'alt', 'field', 'jps', 'jps+', 'hpa'):
+        on_overlay, on_flat = DeliveryAgent(overlay), DeliveryAgent(flat)
+        for start, goal in (rng.sample(cells, 2) for _ in range(3)):
+            path = on_overlay.plan_route(start, goal, algorithm)
+            expected = on_flat.plan_route(start, goal, algorithm)
+            assert (path is None) == (expected is None)
+            if path:
+                assert on_overlay.calculate_path_cost(path) == on_flat.calculate_path_cost(expected)
+
+def test_overlays_refuse_dynamic_obstacle_and_time_changes():
+    base = create_large_map()
+    base.add_dynamic_obstacle(0, 5, [(1, 0), (-1, 0)])
+    overlay = base.overlay()
+    assert overlay.dynamic_obstacles == base.dynamic_obstacles
+    with pytest.raises(TypeError):
+        overlay.dynamic_obstacles = {}
+    with pytest.raises(TypeError):
+        overlay.add_dynamic_obstacle(1, 1, [(0, 1)])
+    with pytest.raises(TypeError):
+        overlay.update_dynamic_obstacles()
+    with pytest.raises(TypeError):
+        overlay.time_step = 3
+    base.update_dynamic_obstacles()
+    assert overlay.time_step == 1 and overlay.dynamic_obstacles == base.dynamic_obstacles
+
+LETTERS = {Terrain.ROAD: 'R', Terrain.GRASS: 'G', Terrain.WATER: 'W', Terrain.MOUNTAIN: 'M'}
+
+def random_map(seed: int, width: int = 23, height: int = 17) -> Grid:
+    rng = random.Random(seed)
+    grid = Grid(width, height)
+    for y in range(height):
+        for x in range(width):
+            grid.set_terrain(x, y, rng.choice(list(Terrain)))
+            if rng.random() < 0.15:
+                grid.set_obstacle(x, y)
+    for _ in range(5):
+        grid.add_dynamic_obstacle(rng.randrange(width), rng.randrange(height),
+                                  rng.choice([[(1, 0), (-1, 0)], [(0, 1), (0, 1), (0, -1), (0, -1)]]))
+    return grid
+
+def write_text_map(grid: Grid, path: str):
+    with open(path, 'w') as f:
+        for y in range(grid.height):
+            f.write(''.join('#' if grid.blocked[grid.index(x, y)] and not grid.dynamic[grid.index(x, y)]
+                            else LETTERS[grid.get_terrain(x, y)] for x in range(grid.width)) + '\n')
+        for (x, y), pattern in grid.dynamic_obstacles.items():
+            f.write(f"dynamic {x} {y} " + ' '.join(f"{dx},{dy}" for dx, dy in pattern) + '\n')
+
+def cells(grid: Grid):
+    """Terrain of open cells and None for obstacles, which text maps give no terrain"""
+    return [grid.get_terrain(x, y) if grid.is_valid_position(x, y) else None
+            for y in range(grid.height) for x in range(grid.width)]
+
+@pytest.mark.parametrize('memory_map', [True, False])
+def test_save_and_load_round_trip(tmp_path, memory_map):
+    grid = random_map(1)
+    grid.update_dynamic_obstacles()
+    tables = grid.landmark_tables()
+    path = str(tmp_path / 'map.bin')
+    grid.save(path)
+    loaded = Grid.load(path, memory_map=memory_map)
+    assert (loaded.width, loaded.height, loaded.time_step) == (grid.width, grid.height, grid.time_step)
+    assert planes(loaded) == planes(grid)
+    assert loaded.dynamic_obstacles == grid.dynamic_obstacles
+    assert loaded.landmarks.landmarks == tables.landmarks
+    assert [list(table) for table in loaded.landmarks.tables] == [list(table) for table in tables.tables]
+    # The loaded map keeps moving like the original
+    grid.update_dynamic_obstacles()
+    loaded.update_dynamic_obstacles()
+    assert planes(loaded) == planes(grid) and loaded.dynamic_obstacles == grid.dynamic_obstacles
+
+def test_maps_without_landmarks_load_without_them(tmp_path):
+    path = str(tmp_path / 'map.bin')
+    random_map(2).save(path)
+    assert Grid.load(path).landmarks is None
+
+@pytest.mark.parametrize('x, y, width, height', [(0, 0, 5, 4), (18, 13, 5, 4), (0, 10, 23, 7), (22, 16, 1, 1)])
+def test_load_region_matches_the_full_map(tmp_path, x, y, width, height):
+    grid = random_map(3)
+    path = str(tmp_path / 'map.bin')
+    grid.save(path)
+    region = Grid.load_region(path, x, y, width, height)
+    assert (region.width, region.height) == (width, height)
+    for dy in range(height):
+        for dx in range(width):
+            assert region.get_terrain(dx, dy) == grid.get_terrain(x + dx, y + dy)
+            assert region.is_valid_position(dx, dy) == grid.is_valid_position(x + dx, y + dy)
+    assert region.dynamic_obstacles == {(ox - x, oy - y): pattern for (ox, oy), pattern in grid.dynamic_obstacles.items()
+                                        if x <= ox < x + width and y <= oy < y + height}
+    with pytest.raises(ValueError):
+        Grid.load_region(path, x + 1, y, grid.width - x, height)
+
+def test_text_maps_import_like_they_load(tmp_path):
+    grid = random_map(4)
+    text_path, map_path = str(tmp_path / 'map.txt'), str(tmp_path / 'map.bin')
+    write_text_map(grid, text_path)
+    from_text = Grid.from_text(text_path)
+    assert cells(from_text) == cells(grid)
+    assert from_text.dynamic_obstacles == grid.dynamic_obstacles
+    import_text_map(text_path, map_path)
+    imported = load_map(map_path)
+    assert planes(imported) == planes(from_text)
+    assert imported.dynamic_obstacles == from_text.dynamic_obstacles
+    assert cells(load_map(text_path)) == cells(grid)
@@ -0,0 +1,457 @@
+"""Planner behaviour on seeded random grids, checked against plain Dijkstra and BFS"""
+import copy
+import itertools
+import random
+
+import pytest
+
+from deliveryagent import (MOVES_PER_OBSTACLE_UPDATE, BatchPlanner, DeliveryAgent, FleetPlanner, Grid,
+                           HierarchicalPlanner, Terrain, find_conflicts, order_stops)
+
+SEEDS = range(12)
+
+def random_grid(seed: int, width: int = 24, height: int = 18) -> Grid:
+    """Seeded map: all roads, road with grass patches, or mixed terrain, with random walls"""
+    rng = random.Random(seed)
+    grid = Grid(width, height)
+    mode = ('uniform', 'patches', 'mixed')[seed % 3]
+    density = (0.0, 0.15, 0.3)[seed // 3 % 3]
+    for y in range(height):
+        for x in range(width):
+            if mode == 'mixed':
+                grid.set_terrain(x, y, rng.choice(list(Terrain)))
+            elif mode == 'patches' and (x // 4 + y // 3) % 3 == 0:
+                grid.set_terrain(x, y, Terrain.GRASS)
+            if rng.random() < density:
+                grid.set_obstacle(x, y)
+    return grid
+
+def queries(grid: Grid, seed: int, count: int = 6):
+    rng = random.Random(seed)
+    cells = [(x, y) for y in range(grid.height) for x in range(grid.width) if grid.is_valid_position(x, y)]
+    return [tuple(rng.sample(cells, 2)) for _ in range(count)]
+
+def reference_cost(grid: Grid, start, goal):
+    """Cheapest route cost from heap-based UCS, or None when the goal is unreachable"""
+    agent = DeliveryAgent(grid)
+    agent.bucket_queue = False
+    path = agent.uniform_cost_search(start, goal)
+    return agent.calculate_path_cost(path) if path else None
+
+def check_route(grid: Grid, path, start, goal):
+    assert path[0] == start and path[-1] == goal
+    for (x, y), (nx, ny) in zip(path, path[1:]):
+        assert abs(x - nx) + abs(y - ny) == 1
+        assert grid.is_valid_position(nx, ny)
+
+def perturb(grid: Grid, seed: int, protected, changes: int = 20):
+    """Raise, lower and block random cells, leaving the protected ones open"""
+    rng = random.Random(seed)
+    for _ in range(changes):
+        x, y = rng.randrange(grid.width), rng.randrange(grid.height)
+        if (x, y) in protected:
+            continue
+        if rng.random() < 0.3:
+            grid.set_obstacle(x, y)
+        else:
+            grid.set_terrain(x, y, rng.choice(list(Terrain)))
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_dstar_matches_ucs_before_and_after_changes(seed):
+    grid = random_grid(seed)
+    for start, goal in queries(grid, seed, 3):
+        agent = DeliveryAgent(grid)
+        for step in range(3):
+            path = agent.d_star_lite_replan(start, goal)
+            expected = reference_cost(grid, start, goal)
+            if expected is None:
+                assert path is None
+            else:
+                check_route(grid, path, start, goal)
+                assert agent.calculate_path_cost(path) == expected
+            perturb(grid, seed * 10 + step, (start, goal))
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_anytime_reaches_the_optimum_without_limits(seed):
+    grid = random_grid(seed)
+    agent = DeliveryAgent(grid)
+    for start, goal in queries(grid, seed):
+        path = agent.anytime_a_star(start, goal)
+        expected = reference_cost(grid, start, goal)
+        if expected is None:
+            assert path is None
+            continue
+        check_route(grid, path, start, goal)
+        assert agent.calculate_path_cost(path) == expected
+        assert agent.suboptimality_bound == 1.0
+        costs = [solution.cost for solution in agent.anytime_solutions]
+        assert costs == sorted(costs, reverse=True)
+
+@pytest.mark.parametrize('limits', [{'deadline': 1e-9}, {'node_budget': 1}])
+def test_anytime_returns_a_bounded_route_when_limits_run_out_at_once(limits):
+    grid = Grid(60, 60)
+    agent = DeliveryAgent(grid)
+    path = agent.anytime_a_star((0, 0), (59, 59), **limits)
+    check_route(grid, path, (0, 0), (59, 59))
+    expected = reference_cost(grid, (0, 0), (59, 59))
+    assert expected <= agent.calculate_path_cost(path) <= agent.suboptimality_bound * expected
+
+def check_alt(grid: Grid, seed: int):
+    agent = DeliveryAgent(grid)
+    for start, goal in queries(grid, seed):
+        path = agent.alt_search(start, goal)
+        expected = reference_cost(grid, start, goal)
+        if expected is None:
+            assert path is None
+        else:
+            check_route(grid, path, start, goal)
+            assert agent.calculate_path_cost(path) == expected
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_alt_matches_ucs_as_the_map_changes(seed):
+    grid = random_grid(seed)
+    check_alt(grid, seed)
+    perturb(grid, seed, (), changes=60)
+    check_alt(grid, seed + 100)
+
+@pytest.mark.parametrize('seed', SEEDS[:4])
+def test_alt_tables_saved_with_the_map_stay_admissible_after_cost_increases(seed, tmp_path):
+    grid = random_grid(seed)
+    check_alt(grid, seed)
+    path = str(tmp_path / 'map.bin')
+    grid.save(path)
+    loaded = Grid.load(path, memory_map=False)
+    assert loaded.landmarks is not None
+    rng = random.Random(seed)
+    for _ in range(80):
+        loaded.set_terrain(rng.randrange(loaded.width), rng.randrange(loaded.height), Terrain.MOUNTAIN)
+    check_alt(loaded, seed + 200)
+
+def test_landmarks_are_chosen_outside_a_walled_off_pocket():
+    grid = Grid(20, 20)
+    # (0, 0) is a one-cell pocket; everything else is one open area
+    grid.set_obstacle(1, 0)
+    grid.set_obstacle(0, 1)
+    tables = grid.landmark_tables()
+    assert tables.landmarks and grid.index(0, 0) not in tables.landmarks
+    agent = DeliveryAgent(grid)
+    path = agent.alt_search((19, 0), (0, 19))
+    assert agent.calculate_path_cost(path) == reference_cost(grid, (19, 0), (0, 19))
+
+@pytest.mark.parametrize('bucket_queue', [True, False])
+@pytest.mark.parametrize('algorithm', ['ucs', 'astar', 'alt', 'field'])
+@pytest.mark.parametrize('seed', SEEDS)
+def test_optimal_planners_match_ucs_on_either_queue(seed, algorithm, bucket_queue):
+    grid = random_grid(seed)
+    agent = DeliveryAgent(grid)
+    agent.bucket_queue = bucket_queue
+    for start, goal in queries(grid, seed):
+        path = agent.plan_route(start, goal, algorithm)
+        expected = reference_cost(grid, start, goal)
+        if expected is None:
+            assert not path
+        else:
+            check_route(grid, path, start, goal)
+            assert agent.calculate_path_cost(path) == expected
+
+@pytest.mark.parametrize('algorithm', ['jps', 'jps+'])
+@pytest.mark.parametrize('seed', SEEDS)
+def test_jump_point_search_matches_ucs(seed, algorithm):
+    grid = random_grid(seed)
+    agent = DeliveryAgent(grid)
+    for step in range(2):
+        for start, goal in queries(grid, seed + step):
+            path = agent.plan_route(start, goal, algorithm)
+            expected = reference_cost(grid, start, goal)
+            if expected is None:
+                assert not path
+            else:
+                check_route(grid, path, start, goal)
+                assert agent.calculate_path_cost(path) == expected
+        # JPS+ tables must follow the map when it changes
+        perturb(grid, seed, (), changes=40)
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_jps_bfs_matches_bfs_lengths(seed):
+    grid = random_grid(seed)
+    agent = DeliveryAgent(grid)
+    for start, goal in queries(grid, seed):
+        path = agent.plan_route(start, goal, 'jps-bfs')
+        expected = agent.bfs(start, goal)
+        if expected is None:
+            assert not path
+        else:
+            check_route(grid, path, start, goal)
+            assert len(path) == len(expected)
+
+def check_batch(grid: Grid, deliveries, results):
+    assert len(results) == len(deliveries)
+    for (start, goal), result in zip(deliveries, results):
+        expected = reference_cost(grid, start, goal)
+        if expected is None:
+            assert result.path is None
+        else:
+            check_route(grid, result.path, start, goal)
+            assert result.cost == expected
+
+@pytest.mark.parametrize('seed', SEEDS[:3])
+def test_batch_results_come_back_in_input_order(seed):
+    grid = random_grid(seed)
+    # Plenty of distinct goals, so grouping tasks by goal reorders them
+    deliveries = [pair for step in range(4) for pair in queries(grid, seed * 10 + step)]
+    with BatchPlanner(grid, workers=2) as planner:
+        check_batch(grid, deliveries, planner.plan(deliveries, 'astar'))
+
+def test_batch_workers_follow_grid_changes():
+    grid = random_grid(4)
+    deliveries = [pair for step in range(3) for pair in queries(grid, step)]
+    with BatchPlanner(grid, workers=2) as planner:
+        check_batch(grid, deliveries, planner.plan(deliveries, 'field'))
+        for step in range(2):
+            perturb(grid, step, (), changes=60)
+            check_batch(grid, deliveries, planner.plan(deliveries, 'field'))
+
+def test_batch_refuses_planners_that_need_more_than_the_static_arrays():
+    with BatchPlanner(Grid(5, 5), workers=1) as planner:
+        with pytest.raises(ValueError):
+            planner.plan([((0, 0), (4, 4))], 'spacetime')
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_hpa_routes_stay_valid_as_clusters_sync(seed):
+    grid = random_grid(seed)
+    agent = DeliveryAgent(grid)
+    for step in range(3):
+        for start, goal in queries(grid, seed + step):
+            path = agent.plan_route(start, goal, 'hpa')
+            expected = reference_cost(grid, start, goal)
+            if expected is None:
+                assert not path
+            else:
+                check_route(grid, path, start, goal)
+                assert agent.calculate_path_cost(path) >= expected
+        # A synced abstraction must be the one a fresh build would give
+        fresh = HierarchicalPlanner(grid, agent.hpa.cluster_size)
+        assert agent.hpa.inter == fresh.inter
+        assert agent.hpa.borders == fresh.borders
+        assert {cluster: {u: set(v) for u, v in edges.items()} for cluster, edges in agent.hpa.intra.items()} == \
+            {cluster: {u: set(v) for u, v in edges.items()} for cluster, edges in fresh.intra.items()}
+        perturb(grid, seed * 10 + step, (), changes=40)
+
+def cached_route_grid() -> Grid:
+    """Open 30x30 roads with water on row 0 between (1, 0) and (4, 0), so the
+    cheapest (0, 0) -> (5, 0) route detours along row 1 for a cost of 7"""
+    grid = Grid(30, 30)
+    for x in range(1, 5):
+        grid.set_terrain(x, 0, Terrain.WATER)
+    return grid
+
+def cache_route(agent: DeliveryAgent, start, goal):
+    path = agent.plan_route(start, goal, 'ucs')
+    agent.route_cache.put(agent.grid, start, goal, 'ucs', path, agent.calculate_path_cost(path))
+    return path
+
+def test_route_cache_hits_while_the_grid_is_unchanged():
+    agent = DeliveryAgent(cached_route_grid())
+    path = cache_route(agent, (0, 0), (5, 0))
+    assert agent.calculate_path_cost(path) == 7 and (2, 1) in path
+    assert agent.route_cache.get(agent.grid, (0, 0), (5, 0), 'ucs') == path
+    assert agent.route_cache.get(agent.grid, (0, 0), (5, 0), 'astar') is None
+    assert (agent.route_cache.hits, agent.route_cache.misses) == (1, 1)
+
+@pytest.mark.parametrize('cell, terrain, kept', [
+    ((2, 1), Terrain.MOUNTAIN, False),   # on the route
+    ((2, 0), Terrain.ROAD, False),       # off the route, inside the ellipse: a cheaper detour may exist
+    ((3, 0), Terrain.MOUNTAIN, False),   # inside the ellipse, even though it got dearer
+    ((20, 20), Terrain.MOUNTAIN, True),  # outside the ellipse
+    ((1, 2), Terrain.GRASS, True),       # next to the route but outside the ellipse: 3 + 6 steps > cost 7
+])
+def test_route_cache_evicts_only_routes_a_change_can_affect(cell, terrain, kept):
+    agent = DeliveryAgent(cached_route_grid())
+    path = cache_route(agent, (0, 0), (5, 0))
+    version = agent.grid.version
+    agent.grid.set_terrain(*cell, terrain)
+    assert agent.grid.changed_since(version) == [agent.grid.index(*cell)]
+    cached = agent.route_cache.get(agent.grid, (0, 0), (5, 0), 'ucs')
+    assert (cached == path) is kept
+    assert agent.route_cache.invalidations == (0 if kept else 1)
+    if kept:
+        assert agent.calculate_path_cost(cached) == reference_cost(agent.grid, (0, 0), (5, 0))
+
+def test_route_cache_evicts_routes_through_new_obstacles():
+    agent = DeliveryAgent(cached_route_grid())
+    cache_route(agent, (0, 0), (5, 0))
+    agent.grid.set_obstacle(2, 1)
+    assert agent.route_cache.get(agent.grid, (0, 0), (5, 0), 'ucs') is None
+
+def test_route_cache_starts_over_for_another_grid():
+    agent = DeliveryAgent(cached_route_grid())
+    cache_route(agent, (0, 0), (5, 0))
+    assert agent.route_cache.get(cached_route_grid(), (0, 0), (5, 0), 'ucs') is None
+    assert not agent.route_cache.entries
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_route_cache_hits_stay_optimal_as_the_map_changes(seed):
+    grid = random_grid(seed)
+    agent = DeliveryAgent(grid)
+    pairs = queries(grid, seed, 8)
+    rng = random.Random(seed)
+    for _ in range(6):
+        for start, goal in pairs:
+            path = agent.route_cache.get(grid, start, goal, 'ucs')
+            if path is None:
+                path = agent.plan_route(start, goal, 'ucs')
+                if path:
+                    agent.route_cache.put(grid, start, goal, 'ucs', path, agent.calculate_path_cost(path))
+                continue
+            check_route(grid, path, start, goal)
+            assert agent.calculate_path_cost(path) == reference_cost(grid, start, goal)
+        for _ in range(3):
+            x, y = rng.randrange(grid.width), rng.randrange(grid.height)
+            if (x, y) not in {cell for pair in pairs for cell in pair}:
+                grid.set_terrain(x, y, rng.choice(list(Terrain)))
+    assert agent.route_cache.hits and agent.route_cache.invalidations
+
+PATTERNS = [[(1, 0), (1, 0), (-1, 0), (-1, 0)], [(0, 1), (0, -1)], [(0, 1), (1, 0), (0, -1), (-1, 0)]]
+
+def dynamic_grid(seed: int, obstacles: int = 12) -> Grid:
+    grid = random_grid(seed)
+    rng = random.Random(seed)
+    for _ in range(obstacles):
+        grid.add_dynamic_obstacle(rng.randrange(1, grid.width - 2), rng.randrange(1, grid.height - 2),
+                                  rng.choice(PATTERNS))
+    return grid
+
+def check_avoids_obstacles(grid: Grid, path, moves_per_update: int = MOVES_PER_OBSTACLE_UPDATE):
+    """Replay the obstacles tick by tick on a copy of the grid along the route"""
+    replay = copy.deepcopy(grid)
+    for step in range(1, len(path)):
+        # Freshly added obstacles only block once they have moved
+        held = {cell for cell in replay.dynamic_obstacles if not replay.is_valid_position(*cell)}
+        if step % moves_per_update == 0:
+            replay.update_dynamic_obstacles()
+        assert replay.is_valid_position(*path[step]), (step, path[step])
+        # No obstacle may step onto the cell we leave while we step onto its cell
+        if step % moves_per_update == 0 and path[step] != path[step - 1]:
+            assert not (path[step] in held and path[step - 1] in replay.dynamic_obstacles), step
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_space_time_routes_avoid_the_moving_obstacles(seed):
+    grid = dynamic_grid(seed)
+    agent = DeliveryAgent(grid)
+    for start, goal in queries(grid, seed):
+        path = agent.space_time_a_star(start, goal)
+        if path is None:
+            continue
+        assert path[0] == start and path[-1] == goal
+        for a, b in zip(path, path[1:]):
+            assert abs(a[0] - b[0]) + abs(a[1] - b[1]) <= 1
+        check_avoids_obstacles(grid, path)
+
+def walled_off_grid() -> Grid:
+    """20x20 roads where (19, 19) is walled off by permanent obstacles"""
+    grid = Grid(20, 20)
+    grid.set_obstacle(18, 19)
+    grid.set_obstacle(19, 18)
+    grid.add_dynamic_obstacle(5, 5, PATTERNS[0])
+    return grid
+
+def test_space_time_search_gives_up_on_walled_off_goals_at_once():
+    agent = DeliveryAgent(walled_off_grid())
+    assert not agent.statically_reachable((0, 0), (19, 19))
+    assert agent.space_time_a_star((0, 0), (19, 19)) is None
+    assert agent.nodes_expanded == 0
+
+@pytest.mark.parametrize('window', [None, 8])
+@pytest.mark.parametrize('seed', SEEDS[:6])
+def test_fleet_routes_avoid_each_other_and_the_obstacles(seed, window):
+    grid = dynamic_grid(seed, obstacles=6)
+    cells = [(x, y) for y in range(grid.height) for x in range(grid.width) if grid.is_valid_position(x, y)]
+    rng = random.Random(seed)
+    endpoints = rng.sample(cells, 16)
+    deliveries = list(zip(endpoints[:8], endpoints[8:]))
+    plan = FleetPlanner(grid, window=window).plan(deliveries)
+    assert plan.conflicts == [] and find_conflicts(plan.paths, window) == []
+    for (start, goal), path in zip(deliveries, plan.paths):
+        if path:
+            assert path[0] == start and path[-1] == goal
+            check_avoids_obstacles(grid, path if window is None else path[:window + 1])
+
+def test_fleet_plans_are_conflict_free_on_open_maps():
+    grid = Grid(16, 16)
+    grid.add_dynamic_obstacle(8, 8, PATTERNS[2])
+    # Agents cross each other's paths along both axes
+    deliveries = [((0, y), (15, 15 - y)) for y in range(0, 16, 3)] + [((x, 0), (15 - x, 15)) for x in range(1, 16, 4)]
+    plan = FleetPlanner(grid).plan(deliveries)
+    assert all(plan.paths)
+    assert find_conflicts(plan.paths) == []
+    for path in plan.paths:
+        check_avoids_obstacles(grid, path)
+
+def test_fleet_fails_walled_off_agents_once():
+    grid = walled_off_grid()
+    plan = FleetPlanner(grid).plan([((0, 0), (19, 19)), ((0, 1), (10, 10))])
+    assert plan.paths[0] is None and plan.paths[1][-1] == (10, 10)
+    assert plan.rounds == 1
+
+def tour_cost(matrix, stops, return_to_start: bool) -> float:
+    tour = [0] + list(stops) + ([0] if return_to_start else [])
+    return sum(matrix[a][b] for a, b in zip(tour, tour[1:]))
+
+def best_tour_cost(matrix, stops, return_to_start: bool) -> float:
+    return min(tour_cost(matrix, order, return_to_start) for order in itertools.permutations(stops))
+
+@pytest.mark.parametrize('return_to_start', [False, True])
+@pytest.mark.parametrize('count', [1, 2, 3])
+def test_order_stops_is_optimal_for_up_to_three_stops(count, return_to_start):
+    for seed in range(200):
+        rng = random.Random(seed)
+        # Asymmetric, not even metric
+        matrix = [[0 if a == b else rng.randint(1, 30) for b in range(count + 1)] for a in range(count + 1)]
+        stops = list(range(1, count + 1))
+        order = order_stops(matrix, stops, return_to_start)
+        assert sorted(order) == stops
+        assert tour_cost(matrix, order, return_to_start) == best_tour_cost(matrix, stops, return_to_start)
+
+@pytest.mark.parametrize('return_to_start', [False, True])
+@pytest.mark.parametrize('count', [4, 5, 6])
+@pytest.mark.parametrize('seed', SEEDS)
+def test_order_stops_stays_close_to_optimal_on_the_map(seed, count, return_to_start):
+    # 2-opt and Or-opt are local searches: from four stops on they can miss the best tour, but not by much
+    grid = random_grid(seed)
+    agent = DeliveryAgent(grid)
+    points = [cell for pair in queries(grid, seed, 4) for cell in pair][:count + 1]
+    matrix = agent.stop_cost_matrix(points)
+    stops = [k for k in range(1, len(points)) if matrix[0][k] < float('inf') and matrix[k][0] < float('inf')]
+    order = order_stops(matrix, stops, return_to_start)
+    assert sorted(order) == stops
+    assert tour_cost(matrix, order, return_to_start) <= 1.25 * best_tour_cost(matrix, stops, return_to_start)
+
+@pytest.mark.parametrize('return_to_start', [False, True])
+@pytest.mark.parametrize('seed', SEEDS)
+def test_multi_stop_routes_are_continuous_and_cost_what_the_matrix_says(seed, return_to_start):
+    grid = random_grid(seed)
+    agent = DeliveryAgent(grid)
+    start, *stops = [cell for pair in queries(grid, seed, 4) for cell in pair][:7]
+    route = agent.plan_multi_stop(start, stops, return_to_start)
+    matrix = agent.stop_cost_matrix([start] + stops)
+    assert sorted(route.order + route.unreachable) == list(range(len(stops)))
+    for k in route.unreachable:
+        assert matrix[0][k + 1] == float('inf') or (return_to_start and matrix[k + 1][0] == float('inf'))
+    if not route.order:
+        return
+    check_route(grid, route.path, start, start if return_to_start else stops[route.order[-1]])
+    # The stops are visited in the order given
+    position = 0
+    for k in route.order:
+        position = route.path.index(stops[k], position)
+    assert route.cost == agent.calculate_path_cost(route.path)
+    assert route.cost == tour_cost(matrix, [k + 1 for k in route.order], return_to_start)
+
+def test_multi_stop_skips_the_start_field_unless_the_route_returns():
+    grid = random_grid(1)
+    start, *stops = [cell for pair in queries(grid, 1, 3) for cell in pair][:4]
+    agent = DeliveryAgent(grid)
+    agent.plan_multi_stop(start, stops)
+    assert start not in agent.goal_fields
+    agent.plan_multi_stop(start, stops, return_to_start=True)
+    assert start in agent.goal_fields
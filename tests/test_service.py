@@ -0,0 +1,94 @@
+"""Planning service request handling, driven directly rather than over TCP"""
+import asyncio
+import json
+
+import pytest
+
+import planning_service
+from deliveryagent import DeliveryAgent, Grid
+from planning_service import PlanningService
+
+class FakeWriter:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, data: bytes):
+        self.lines.append(json.loads(data))
+
+    async def drain(self):
+        pass
+
+@pytest.fixture
+def service():
+    service = PlanningService({'small': 'small', 'large': 'large'}, workers=1)
+    yield service
+    service.close()
+
+def respond(service: PlanningService, request) -> dict:
+    async def run():
+        writer = FakeWriter()
+        slots = asyncio.Semaphore(1)
+        await slots.acquire()
+        await service._respond(request, writer, asyncio.Lock(), slots)
+        assert not slots.locked()
+        return writer.lines
+    lines = asyncio.run(run())
+    assert len(lines) == 1
+    return lines[0]
+
+VALID = {'map': 'small', 'start': [0, 0], 'goal': [4, 4]}
+
+@pytest.mark.parametrize('changes', [
+    {'map': ['small']}, {'map': {'id': 'small'}}, {'map': None}, {'map': 'missing'},
+    {'start': [0]}, {'goal': 'far'}, {'goal': [99, 99]}, {'algorithm': 'teleport'}, {'algorithm': ['astar']},
+    {'deadline': '1'}, {'deadline': -1}, {'deadline': 0}, {'deadline': True}, {'deadline': float('nan')},
+])
+def test_malformed_plan_requests_get_an_error(service, changes):
+    with pytest.raises(ValueError):
+        service._validate({**VALID, **changes})
+    response = respond(service, {**VALID, **changes, 'id': 7})
+    assert response['ok'] is False and response['id'] == 7
+
+@pytest.mark.parametrize('request_', [
+    {'op': 'info', 'map': ['small']}, {'op': 'info', 'map': 'missing'}, {'op': 'info', 'map': 'small', 'seed': [1]},
+    {'op': 'info', 'map': 'small', 'seed': {'a': 1}}, {'op': ['plan']}, {'op': 'teleport'},
+])
+def test_malformed_other_requests_get_an_error(service, request_):
+    response = respond(service, {**request_, 'id': 3})
+    assert response['ok'] is False and response['error'] and response['id'] == 3
+
+def test_unexpected_errors_become_error_responses(service):
+    def broken(request):
+        raise RuntimeError("boom")
+    service.info = broken
+    response = respond(service, {'op': 'info', 'map': 'small', 'id': 1})
+    assert response == {'ok': False, 'error': 'RuntimeError: boom', 'id': 1}
+
+def test_validate_returns_the_search_key_and_deadline(service):
+    assert service._validate({**VALID, 'deadline': 0.5}) == (('small', (0, 0), (4, 4), 'astar'), 0.5)
+    assert service._validate(VALID) == (('small', (0, 0), (4, 4), 'astar'), None)
+
+def test_plans_and_coalesces_identical_requests(service):
+    async def run():
+        requests = [{'map': 'large', 'start': [0, 0], 'goal': [14, 14], 'algorithm': algorithm, 'deadline': deadline}
+                    for algorithm, deadline in [('astar', 5), ('astar', 10), ('anytime', 5), ('anytime', 10),
+                                                ('anytime', 5)]]
+        return await asyncio.gather(*(service.plan(request) for request in requests))
+    responses = asyncio.run(run())
+    assert all(response['ok'] and response['cost'] == 68 for response in responses)
+    # Anytime requests only share a search with the same deadline
+    assert [response['coalesced'] for response in responses] == [False, True, False, False, True]
+
+@pytest.mark.parametrize('algorithm, cached', [('astar', True), ('bfs', True), ('spacetime', False),
+                                               ('weighted', False)])
+def test_workers_only_consult_the_route_cache_for_cacheable_algorithms(monkeypatch, algorithm, cached):
+    agent = DeliveryAgent(Grid(12, 12))
+    monkeypatch.setattr(planning_service, '_worker_agents', {'open': agent})
+    lookups = []
+    get = agent.route_cache.get
+    monkeypatch.setattr(agent.route_cache, 'get', lambda *args: lookups.append(args) or get(*args))
+    first = planning_service._plan('open', (0, 0), (11, 11), algorithm, None)
+    second = planning_service._plan('open', (0, 0), (11, 11), algorithm, None)
+    assert first['cost'] == second['cost'] == 22
+    assert len(lookups) == (2 if cached else 0)
+    assert (second['nodes_expanded'] == 0) == cached